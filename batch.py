@@ -0,0 +1,152 @@
+"""
+batch.py —— 无交互的批处理入口：从 JSONL 任务文件读取任务并发执行，结果写入 JSONL。
+
+任务文件每行一个 JSON 对象：
+    id / request_id   任务编号（缺省为行号）
+    prompt            任务内容；没有 prompt 时使用 title 与 body 拼接
+    cwd               任务的工作目录（缺省为 config.json 的 work_dir）
+    env               追加到命令环境中的环境变量
+    answers           依次用于回答 ask_user 的回复列表，用完后使用 --ask-policy
+
+每个任务在独立的子进程中运行（max_tasks_per_child=1），拥有自己的 Bot、工作目录、环境变量与浏览器；
+运行时配置只保存在子进程内存中，不写回 working_config.json。
+POSIX 系统上子进程由预先导入了依赖的 forkserver 派生，不必为每个任务重新导入 openai 等模块。
+每个任务的控制台输出保存在 --log-dir/<id>.txt 中。
+
+用法:
+    python batch.py tasks.jsonl [-o results.jsonl] [-j 4] [--ask-policy 文本] [--max-turns 3]
+"""
+
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from script.agent import DEFAULT_ASK_POLICY
+
+_PRELOAD = ['config', 'script.bot', 'script.tools', 'script.agent', 'script.prompt_builder', 'openai']
+
+
+def load_tasks(path: str) -> list[dict]:
+    tasks = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for lineno, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            task = json.loads(line)
+            task['id'] = str(task.get('id') or task.get('request_id') or f'task-{lineno}')
+            if not task.get('prompt'):
+                task['prompt'] = '\n\n'.join(x for x in (task.get('title'), task.get('body')) if x)
+            tasks.append(task)
+    return tasks
+
+
+def run_task(task: dict, opts: dict) -> dict:
+    """在当前（子）进程中执行单个任务，返回结果字典。"""
+    started = time.time()
+    result = {
+        'id': task['id'], 'ok': False, 'finished': False, 'error': None, 'final_message': '',
+        'input_tokens': 0, 'output_tokens': 0, 'rounds': 0, 'asked': 0,
+        'started_at': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(started)), 'elapsed': 0.0,
+    }
+    os.makedirs(opts['log_dir'], exist_ok=True)
+    transcript = os.path.join(opts['log_dir'], f'{task["id"]}.txt')
+    with open(transcript, 'w', encoding='utf-8') as out, contextlib.redirect_stdout(out):
+        try:
+            from config import init_working_config
+            init_working_config(where=task.get('cwd'), persist=False)
+            import script.bot as bot
+            from script.agent import AskPolicy, run_turn
+            from script.prompt_builder import build_system_prompt, build_skill_hint
+            from script.system import get_cwd, update_env
+            if task.get('env'):
+                update_env(task['env'])
+            bot.Spinner._enabled = False
+            result['cwd'] = get_cwd()
+
+            policy = AskPolicy(task.get('answers'), opts['ask_policy'])
+            work_bot = bot.Bot(bot_name=f'Momoka[{task["id"]}]')
+            work_bot.set_system(build_system_prompt())
+            # Bot 以纯文本交还控制权时，按应答策略代替用户回复，最多 max_turns 次
+            turn = run_turn(work_bot, task['prompt'], hint=build_skill_hint(task['prompt']),
+                            input_func=policy, max_turns=opts['max_turns'])
+            result.update(ok=True, finished=turn['finished'], final_message=turn['reply'],
+                          input_tokens=turn['input_tokens'], output_tokens=turn['output_tokens'],
+                          rounds=turn['rounds'], asked=policy.asked)
+        except Exception as e:
+            result['error'] = f'{type(e).__name__}: {e}'
+            print(traceback.format_exc())
+        finally:
+            if 'script.jobs' in sys.modules:
+                sys.modules['script.jobs'].release_jobs()
+            if 'script.kernel' in sys.modules:
+                sys.modules['script.kernel'].release_kernel()
+            if 'script.checkpoint' in sys.modules:
+                sys.modules['script.checkpoint'].release_checkpoints()
+            if 'script.browser' in sys.modules:
+                try:
+                    sys.modules['script.browser'].browser_shutdown()
+                except Exception:
+                    pass
+    result['elapsed'] = round(time.time() - started, 3)
+    return result
+
+
+def _mp_context():
+    """POSIX 上使用预加载依赖的 forkserver（max_tasks_per_child 与 fork 不兼容），其余平台使用 spawn。"""
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        ctx = multiprocessing.get_context('forkserver')
+        ctx.set_forkserver_preload(_PRELOAD)
+        return ctx
+    return multiprocessing.get_context('spawn')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Momoka 批处理：并发执行 JSONL 任务文件')
+    parser.add_argument('tasks', help='任务文件（JSONL）')
+    parser.add_argument('-o', '--output', help='结果文件（JSONL），默认 <任务文件名>.results.jsonl')
+    parser.add_argument('-j', '--jobs', type=int, default=4, help='同时运行的任务数（默认 4）')
+    parser.add_argument('--ask-policy', default=DEFAULT_ASK_POLICY, help='ask_user 的默认回复')
+    parser.add_argument('--max-turns', type=int, default=3,
+                        help='Bot 以纯文本交还控制权时，代替用户继续回复的最多次数（默认 3）')
+    parser.add_argument('--log-dir', help='每个任务的控制台输出目录，默认 <结果文件名>.logs/')
+    args = parser.parse_args()
+
+    tasks = load_tasks(args.tasks)
+    output = args.output or os.path.splitext(args.tasks)[0] + '.results.jsonl'
+    opts = {
+        'ask_policy': args.ask_policy,
+        'max_turns': args.max_turns,
+        'log_dir': os.path.abspath(args.log_dir or os.path.splitext(output)[0] + '.logs'),
+    }
+    print(f'共 {len(tasks)} 个任务，并发 {args.jobs}，结果写入 {output}')
+
+    start = time.time()
+    done = failed = 0
+    with open(output, 'w', encoding='utf-8') as out, \
+            ProcessPoolExecutor(max_workers=args.jobs, mp_context=_mp_context(), max_tasks_per_child=1) as pool:
+        futures = {pool.submit(run_task, task, opts): task for task in tasks}
+        for future in as_completed(futures):
+            task = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:   # 子进程崩溃等
+                result = {'id': task['id'], 'ok': False, 'error': f'{type(e).__name__}: {e}'}
+            out.write(json.dumps(result, ensure_ascii=False) + '\n')
+            out.flush()
+            done += 1
+            failed += not result.get('ok')
+            status = 'OK' if result.get('ok') else f'FAIL {result.get("error")}'
+            print(f'[{done}/{len(tasks)}] {task["id"]}: {status} ({result.get("elapsed", 0)}s)')
+
+    elapsed = time.time() - start
+    print(f'完成: {done - failed} 成功，{failed} 失败，用时 {elapsed:.1f}s')
+
+
+if __name__ == '__main__':
+    main()
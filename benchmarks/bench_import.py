@@ -0,0 +1,89 @@
+"""
+bench_import.py —— 启动（导入）耗时基准测试。
+
+在全新的子进程中反复执行 `import main`（不会进入 REPL），统计墙钟耗时，
+并减去空解释器启动的基线；同时检查 openai / playwright 等重量级依赖不在启动路径上，
+列出 -X importtime 报告中累计耗时最高的模块。
+
+用法（在项目根目录执行）:
+    python benchmarks/bench_import.py [-n 运行次数] [--top 显示模块数]
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ('openai', 'playwright', 'httpx', 'pydantic')
+
+_CHECK = (
+    'import sys, main; '
+    f'print(",".join(m for m in {HEAVY_MODULES!r} if m in sys.modules))'
+)
+
+
+def _run(code: str, *flags: str) -> tuple[float, subprocess.CompletedProcess]:
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, *flags, '-c', code], cwd=PROJECT_DIR,
+                          capture_output=True, text=True)
+    return time.perf_counter() - start, proc
+
+
+def _bench(code: str, runs: int) -> list[float]:
+    times = []
+    for _ in range(runs):
+        elapsed, proc = _run(code)
+        if proc.returncode != 0:
+            sys.exit(f'执行失败:\n{proc.stderr}')
+        times.append(elapsed)
+    return times
+
+
+def _importtime_top(top: int) -> list[tuple[int, str]]:
+    """解析 -X importtime 输出（import time: self | cumulative | name），返回累计耗时（微秒）最高的模块。"""
+    _, proc = _run('import main', '-X', 'importtime')
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line.split(':', 1)[1].split('|')
+        rows.append((int(cumulative), name.rstrip()))
+    rows.sort(reverse=True)
+    return rows[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Momoka 启动耗时基准测试')
+    parser.add_argument('-n', '--runs', type=int, default=10, help='每项测试的运行次数（默认 10）')
+    parser.add_argument('--top', type=int, default=10, help='显示累计耗时最高的模块数（默认 10）')
+    args = parser.parse_args()
+
+    _, proc = _run(_CHECK)
+    if proc.returncode != 0:
+        sys.exit(f'导入 main 失败:\n{proc.stderr}')
+    loaded = proc.stdout.strip()
+
+    baseline = _bench('pass', args.runs)
+    startup = _bench('import main', args.runs)
+    base_ms = statistics.median(baseline) * 1000
+    main_ms = statistics.median(startup) * 1000
+
+    print(f'Python {sys.version.split()[0]}，运行 {args.runs} 次（中位数）')
+    print(f'  空解释器启动: {base_ms:8.1f} ms')
+    print(f'  import main : {main_ms:8.1f} ms（最快 {min(startup) * 1000:.1f} ms）')
+    print(f'  导入开销    : {main_ms - base_ms:8.1f} ms')
+    print(f'  启动路径上的重量级依赖: {loaded or "无"}')
+    print(f'\n累计导入耗时最高的 {args.top} 个模块:')
+    for cumulative, name in _importtime_top(args.top):
+        print(f'  {cumulative / 1000:8.1f} ms  {name}')
+    if loaded:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
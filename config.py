@@ -1,15 +1,32 @@
 import json
+import os
 
 CONFIG_FILE = 'config.json'
 WORKING_CONFIG_FILE = 'working_config.json'
 
+# 模块导入时不做任何文件 I/O；config.json 的解析结果按 (mtime, size) 缓存，
+# 运行时配置保存在内存中，避免每次 get_config() 都重新读取、解析文件。
+_static_cache: tuple[tuple, dict] | None = None
+_working: dict | None = None
+_persist = True   # False 时运行时配置只保存在内存中（批处理模式，各进程互不干扰）
+
 
 # ── 静态配置（config.json）────────────────────────────────────────────────────
 
+def _get_static_config() -> dict:
+    """读取 config.json，文件未变化时返回缓存的解析结果。"""
+    global _static_cache
+    st = os.stat(CONFIG_FILE)
+    key = (st.st_mtime_ns, st.st_size)
+    if _static_cache is None or _static_cache[0] != key:
+        with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
+            _static_cache = (key, json.load(f))
+    return _static_cache[1]
+
+
 def get_config() -> dict:
     """读取静态配置与运行时配置，合并后返回统一字典。"""
-    with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
-        config = json.load(f)
+    config = dict(_get_static_config())
     working = _get_working_config()
     # 运行时字段覆盖静态字段（如有同名）
     config.update(working)
@@ -21,14 +38,36 @@ def get_config() -> dict:
 
 # ── 运行时配置（working_config.json）─────────────────────────────────────────
 
+def _session():
+    from script.session import current
+    return current()
+
+
 def _get_working_config() -> dict:
-    """读取运行时配置文件，返回字典。"""
-    with open(WORKING_CONFIG_FILE, 'r', encoding='utf-8') as f:
-        return json.load(f)
+    """返回运行时配置字典。首次调用时读取文件，之后使用内存中的副本（所有修改都经由本模块写回）。
+
+    存在当前会话（服务模式，见 script/session.py）时返回该会话自己的运行时配置。
+    """
+    global _working
+    session = _session()
+    if session is not None:
+        return dict(session.working)
+    if _working is None:
+        with open(WORKING_CONFIG_FILE, 'r', encoding='utf-8') as f:
+            _working = json.load(f)
+    return dict(_working)
 
 
 def _save_working_config(working: dict):
     """将运行时配置字典写回 working_config.json。"""
+    global _working
+    session = _session()
+    if session is not None:
+        session.working = dict(working)
+        return
+    _working = dict(working)
+    if not _persist:
+        return
     with open(WORKING_CONFIG_FILE, 'w', encoding='utf-8') as f:
         json.dump(working, f, ensure_ascii=False, indent=2)
 
@@ -50,10 +89,22 @@ def set_wait(seconds: int):
     _update_working_config(wait=seconds)
 
 
-# ── 模块加载时初始化运行时状态 ────────────────────────────────────────────────
-# 将 where 重置为 work_dir，确保每次启动从工作目录开始
-_static = json.load(open(CONFIG_FILE, encoding='utf-8'))
-_update_working_config(
-    where=_static['work_dir'],
-    wait=10,
-)
+def new_working_config(where: str | None = None) -> dict:
+    """为新会话生成初始运行时配置（where 缺省为 work_dir）。"""
+    return {'where': where or _get_static_config()['work_dir'], 'wait': 10}
+
+
+# ── 启动时初始化运行时状态 ────────────────────────────────────────────────────
+
+def init_working_config(where: str | None = None, persist: bool = True):
+    """将 where 重置为 work_dir（或指定目录）、wait 重置为默认值，确保每次启动从工作目录开始。
+
+    由入口（main.py / batch.py）在启动时显式调用，导入本模块本身不产生任何副作用。
+    persist=False 时运行时配置不写回 working_config.json，只在当前进程内生效。
+    """
+    global _persist
+    _persist = persist
+    _update_working_config(
+        where=where or _get_static_config()['work_dir'],
+        wait=10,
+    )
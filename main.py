@@ -1,9 +1,14 @@
+import importlib
+import sys
+import threading
 import time
 
+from config import get_config, init_working_config
 from script.logger import log, user_log, new_log
 import script.tools as tools
+from script.agent import agent_loop
 import script.bot as bot
-from script.prompt_builder import build_system_prompt
+from script.prompt_builder import build_system_prompt, build_skill_hint
 from script.util import multiline_input, handle_slash
 
 TITLE = r"""
@@ -17,42 +22,17 @@ TITLE = r"""
 LINE = '-' * 20
 
 
-def _agent_loop(work_bot, response, file_contents: dict,
-                input_tokens: int, output_tokens: int, round_count: int) -> tuple[bool, dict, int, int, int]:
-    """执行工具调用循环，直到 finish 或 Bot 返回纯文本（等待用户输入）。"""
-    while True:
-        text_content: str = response['content']
-        tool_calls: list = response['tool_calls']
-
-        # ── 情形A：有工具调用 ──────────────────────────────────────────
-        if tool_calls:
-            if text_content:
-                user_log(text_content, role='BOT')
-
-            prev_file_contents = dict(file_contents)
-
-            is_finish, file_contents = tools.execute_tool_calls(work_bot, tool_calls)
-            if is_finish:
-                log('work DONE')
-                return True, file_contents, input_tokens, output_tokens, round_count
-
-            response = work_bot.resume(use_tools=True)
-            input_tokens += response.get('input_tokens', 0)
-            output_tokens += response.get('output_tokens', 0)
-            round_count += 1
-
-            continue
-
-        # ── 情形B：纯文本，交还控制权给用户 ───────────────────────────
-        if text_content:
-            user_log(text_content, role='BOT')
-        return False, file_contents, input_tokens, output_tokens, round_count
-
-
 if __name__ == '__main__':
     print(TITLE + '\n' + LINE + ' 欢迎回来！这里是 Momoka v0.1 ' + LINE)
+    init_working_config()
     new_log()
     log('start')
+    # 用户输入第一条消息期间在后台导入 openai，首次请求时无需再等待
+    threading.Thread(target=importlib.import_module, args=('openai',), daemon=True).start()
+
+    if get_config().get('browser_prelaunch', False):
+        from script.browser import browser_prelaunch
+        browser_prelaunch()
 
     work_bot = bot.Bot(bot_name='Momoka')
     work_bot.set_system(build_system_prompt())
@@ -74,6 +54,14 @@ if __name__ == '__main__':
             print("-" * 67)
             print(f'结束 ( {time_str} | 输入: {input_tokens} tokens | 输出: {output_tokens} tokens | {round_count}R )')
             log('end')
+            if 'script.jobs' in sys.modules:
+                sys.modules['script.jobs'].release_jobs()
+            if 'script.kernel' in sys.modules:
+                sys.modules['script.kernel'].release_kernel()
+            if 'script.checkpoint' in sys.modules:
+                sys.modules['script.checkpoint'].release_checkpoints()
+            if 'script.browser' in sys.modules:
+                sys.modules['script.browser'].browser_shutdown()
             break
 
         handled, skill_name = handle_slash(
@@ -103,13 +91,14 @@ if __name__ == '__main__':
                 role='user',
                 file_contents=file_contents,
                 use_tools=True,
+                hint=build_skill_hint(user_message),
             )
 
         input_tokens += response.get('input_tokens', 0)
         output_tokens += response.get('output_tokens', 0)
         round_count += 1
 
-        is_finish, file_contents, input_tokens, output_tokens, round_count = _agent_loop(
+        is_finish, file_contents, input_tokens, output_tokens, round_count = agent_loop(
             work_bot, response, file_contents, input_tokens, output_tokens, round_count
         )
 
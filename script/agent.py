@@ -0,0 +1,94 @@
+"""
+agent.py —— Bot 的工具调用循环，由交互式入口（main.py）、批处理入口（batch.py）与服务入口（server.py）共用。
+"""
+
+from script.logger import log, user_log
+import script.tools as tools
+
+DEFAULT_ASK_POLICY = '用户当前不在线，无法回答。请根据已有信息自行做出合理判断并继续完成任务。'
+
+
+def agent_loop(work_bot, response, file_contents: dict,
+               input_tokens: int, output_tokens: int, round_count: int,
+               input_func=input) -> tuple[bool, dict, int, int, int]:
+    """执行工具调用循环，直到 finish 或 Bot 返回纯文本（等待用户输入）。
+
+    input_func 用于回答 ask_user（交互模式下为 input，批处理模式下为应答策略）。
+    """
+    while True:
+        text_content: str = response['content']
+        tool_calls: list = response['tool_calls']
+
+        # ── 情形A：有工具调用 ──────────────────────────────────────────
+        if tool_calls:
+            if text_content:
+                user_log(text_content, role='BOT')
+
+            is_finish, file_contents = tools.execute_tool_calls(work_bot, tool_calls, input_func)
+            if is_finish:
+                log('work DONE')
+                return True, file_contents, input_tokens, output_tokens, round_count
+
+            response = work_bot.resume(use_tools=True)
+            input_tokens += response.get('input_tokens', 0)
+            output_tokens += response.get('output_tokens', 0)
+            round_count += 1
+
+            continue
+
+        # ── 情形B：纯文本，交还控制权给用户 ───────────────────────────
+        if text_content:
+            user_log(text_content, role='BOT')
+        return False, file_contents, input_tokens, output_tokens, round_count
+
+
+class AskPolicy:
+    """ask_user 的应答策略：先依次使用预先提供的 answers，之后统一使用默认回复。"""
+
+    def __init__(self, answers: list[str] | None, default: str):
+        self._answers = list(answers or [])
+        self.default = default
+        self.asked = 0
+
+    def __call__(self, _prompt: str = '') -> str:
+        self.asked += 1
+        return self._answers.pop(0) if self._answers else self.default
+
+
+def last_reply(work_bot) -> str:
+    """Bot 最后一条非空的 assistant 文本。"""
+    for msg in reversed(work_bot.history):
+        if isinstance(msg, dict) and msg.get('role') == 'assistant' and msg.get('content'):
+            return msg['content']
+    return ''
+
+
+def run_turn(work_bot, message: str, input_func=input, max_turns: int = 0,
+             file_contents: dict | None = None, hint: str | None = None) -> dict:
+    """无人值守地执行一轮对话：发送 message 并运行工具调用循环。
+
+    hint 为随 message 临时发送的相关 skill 提示（见 Bot.message）。
+    Bot 以纯文本交还控制权时，用 input_func 代替用户回复，最多 max_turns 次。
+    返回 {'finished', 'reply', 'input_tokens', 'output_tokens', 'rounds', 'file_contents'}。
+    """
+    response = work_bot.message(message, role='user', use_tools=True, hint=hint)
+    input_tokens = response.get('input_tokens', 0)
+    output_tokens = response.get('output_tokens', 0)
+    rounds, turns, file_contents = 1, 0, file_contents or {}
+    while True:
+        finished, file_contents, input_tokens, output_tokens, rounds = agent_loop(
+            work_bot, response, file_contents, input_tokens, output_tokens, rounds,
+            input_func=input_func,
+        )
+        if finished or turns >= max_turns:
+            break
+        turns += 1
+        response = work_bot.message(input_func(), role='user', use_tools=True)
+        input_tokens += response.get('input_tokens', 0)
+        output_tokens += response.get('output_tokens', 0)
+        rounds += 1
+    return {
+        'finished': finished, 'reply': last_reply(work_bot),
+        'input_tokens': input_tokens, 'output_tokens': output_tokens,
+        'rounds': rounds, 'file_contents': file_contents,
+    }
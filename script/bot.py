@@ -1,14 +1,6 @@
 from config import get_config
 from script.logger import log, chat_log, user_log
-from openai import OpenAI
-from openai import (
-    APIConnectionError,
-    APITimeoutError,
-    AuthenticationError,
-    PermissionDeniedError,
-    RateLimitError,
-    APIStatusError,
-)
+from script.history import BlobStore, FileEntry
 import sys
 import threading
 import itertools
@@ -21,6 +13,15 @@ def _openai_call(fn, *args, **kwargs):
     Returns:
         API 响应对象，出错时返回 None。
     """
+    # 延迟导入：调用到这里时 Bot.openai 已导入 openai 包，不再有额外开销
+    from openai import (
+        APIConnectionError,
+        APITimeoutError,
+        AuthenticationError,
+        PermissionDeniedError,
+        RateLimitError,
+        APIStatusError,
+    )
     try:
         return fn(*args, **kwargs)
     except AuthenticationError as e:
@@ -70,26 +71,125 @@ class Spinner:
             self._thread.join()
 
 # ── Tool 定义（JSON Function Call 格式）────────────────────────────────────
-from script.tools_def import *
+from script.tools_def import get_tools
+
+# ── 共享 OpenAI 客户端 ────────────────────────────────────────────────────
+# 同一 (api_key, base_url) 的 Bot 共用一个客户端及其 HTTP 连接池（服务模式下的多个会话、子 Bot 等）
+_clients: dict[tuple, object] = {}
+_clients_lock = threading.Lock()
+
+
+def _shared_client(api_key: str, base_url: str):
+    key = (api_key, base_url)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            from openai import OpenAI
+            client = _clients[key] = OpenAI(api_key=api_key, base_url=base_url)
+        return client
 
 
 class Bot:
-    def __init__(self, bot_name: str = 'null'):
+    def __init__(self, bot_name: str = 'null', tools: list[dict] | None = None):
         self.bot_name = bot_name
-        cfg = get_config()
-        self.openai = OpenAI(api_key=cfg['api_key'], base_url=cfg['base_url'])
+        self.tools = tools    # 固定的工具列表（子 Bot 使用受限的工具列表）；为 None 时按分组选择
+        self.tool_groups: set[str] | None = None   # 已启用的工具分组，首次请求时初始化；None 表示全部工具
+        self._groups_ready = False
+        self._openai = None   # OpenAI 客户端在第一次请求时创建，见 openai 属性
         self._base_system: str = 'You are a helpful assistant'
         self._injected_skills: dict[str, str] = {}  # {skill_name: skill_content}
-        self.history = [{'role': 'system', 'content': self._base_system}]
-        # 与 history 等长的元数据列表。
-        # 每个元素是一个字典，目前只用 'file_contents' 键：
-        #   {'file_contents': {filename: content_str, ...}}
-        # 普通消息对应的元数据为空字典 {}。
-        self._meta: list[dict] = [{}]
+        # (历史中的用户消息, 附加文本)：相关 skill 提示只在请求时拼接到该消息后，不写入历史，
+        # 新的提示替换旧的，多轮对话中不会累积
+        self._hint: tuple[dict | FileEntry, str] | None = None
+        # 普通消息为 dict；含文件内容的消息为 history.FileEntry，文件内容保存在 _blobs 中（见 history.py）
+        self.history: list[dict | FileEntry] = [{'role': 'system', 'content': self._base_system}]
+        self._blobs = BlobStore()
+        self._file_entries: dict[str, list[FileEntry]] = {}   # {文件名: 含该文件内容的消息}
+
+    def enable_tool_groups(self, groups) -> list[str]:
+        """启用工具分组，返回新启用的分组名。"""
+        from script.tools_def import TOOL_GROUPS
+        self._init_groups()
+        if self.tool_groups is None:
+            return []
+        added = [g for g in groups if g in TOOL_GROUPS and g not in self.tool_groups]
+        self.tool_groups.update(added)
+        if added:
+            log(f'{self.bot_name} | 启用工具分组: {added}')
+        return added
+
+    def _init_groups(self):
+        if not self._groups_ready:
+            from script.tools_def import initial_groups
+            self.tool_groups = initial_groups()
+            self._groups_ready = True
+
+    def _tool_list(self) -> list[dict]:
+        if self.tools is not None:
+            return self.tools
+        self._init_groups()
+        return get_tools(self.tool_groups)
+
+    def _record(self, message: dict, file_contents: dict[str, str] | None) -> dict | FileEntry:
+        """追加一条消息到历史并返回写入的条目；含文件内容时以 FileEntry 保存并登记到文件索引。"""
+        entry = FileEntry.build(self._blobs, message, file_contents) if file_contents else None
+        if entry is None:
+            self.history.append(message)
+            return message
+        self.history.append(entry)
+        for filename in entry.files:
+            self._file_entries.setdefault(filename, []).append(entry)
+        return entry
+
+    def _messages(self) -> list[dict]:
+        """请求使用的消息列表（FileEntry 在此拼接为字符串，相关 skill 提示在此附加）。"""
+        messages = [m if isinstance(m, dict) else m.as_message() for m in self.history]
+        if self._hint is not None:
+            target, hint = self._hint
+            for i, m in enumerate(self.history):
+                if m is target:
+                    messages[i] = dict(messages[i], content=messages[i]['content'] + hint)
+                    break
+        return messages
+
+    @property
+    def openai(self):
+        """OpenAI 客户端。openai 包导入耗时较长，延迟到第一次请求时导入，不在启动路径上。"""
+        if self._openai is None:
+            cfg = get_config()
+            self._openai = _shared_client(cfg['api_key'], cfg['base_url'])
+        return self._openai
+
+    def _complete(self, kwargs: dict) -> dict | None:
+        """发送请求并返回 {'content', 'tool_calls', 'input_tokens', 'output_tokens'}，出错时返回 None。
+
+        config 中 stream 为 true 时以流式接收，edit_file / append_file 的内容边生成边写入临时文件，
+        见 script/streaming.py。
+        """
+        if get_config().get('stream'):
+            from script.streaming import collect_stream
+            kwargs = dict(kwargs, stream=True, stream_options={'include_usage': True})
+            # noinspection PyTypeChecker
+            with Spinner():
+                stream = _openai_call(self.openai.chat.completions.create, **kwargs)
+                return _openai_call(collect_stream, stream) if stream is not None else None
+
+        # noinspection PyTypeChecker
+        with Spinner():
+            response = _openai_call(self.openai.chat.completions.create, **kwargs)
+        if response is None:
+            return None
+        choice = response.choices[0].message
+        return {
+            'content': choice.content or '',
+            'tool_calls': choice.tool_calls or [],
+            'input_tokens': response.usage.prompt_tokens if response.usage else 0,
+            'output_tokens': response.usage.completion_tokens if response.usage else 0,
+        }
 
     def message(self, message: str, role: str = 'user',
                 file_contents: dict[str, str] | None = None,
-                use_tools: bool = False) -> dict:
+                use_tools: bool = False, hint: str | None = None) -> dict:
         """向模型发送消息，返回响应字典。
 
         Args:
@@ -97,6 +197,8 @@ class Bot:
             role:          消息角色，默认 'user'。
             file_contents: 本条消息中包含的文件内容，格式为 {filename: content}。
             use_tools:     是否传入 TOOLS 列表启用 function calling。
+            hint:          附加在本条消息后的临时文本（相关 skill 提示，见 prompt_builder.build_skill_hint）。
+                           只随请求发送、不写入历史，替换之前的提示；为 None 时保留之前的提示。
 
         Returns:
             dict，包含：
@@ -109,25 +211,23 @@ class Bot:
 
         kwargs: dict = dict(
             model=cfg['model'],
-            messages=self.history + [{'role': role, 'content': message}],
+            messages=self._messages() + [{'role': role, 'content': message + (hint or '')}],
             stream=False,
         )
         if use_tools:
-            kwargs['tools'] = TOOLS
+            if role == 'user' and self.tools is None:
+                from script.tools_def import groups_for_message
+                self.enable_tool_groups(groups_for_message(message + (hint or '')))
+            kwargs['tools'] = self._tool_list()
             kwargs['tool_choice'] = 'auto'
 
-        # noinspection PyTypeChecker
-        with Spinner():
-            response = _openai_call(self.openai.chat.completions.create, **kwargs)
-
-        if response is None:
+        result = self._complete(kwargs)
+        if result is None:
             # 错误已由 _openai_call 通过 user_log(role='ERROR') 告知用户
             return {'content': '', 'tool_calls': [], 'input_tokens': 0, 'output_tokens': 0}
 
-        choice = response.choices[0].message
-
-        text_content: str = choice.content or ''
-        tool_calls: list = choice.tool_calls or []
+        text_content: str = result['content']
+        tool_calls: list = result['tool_calls']
 
         log(f'{log_prefix} | output text: {text_content}')
         if tool_calls:
@@ -146,35 +246,27 @@ class Bot:
                 for tc in tool_calls
             ]
 
-        self.history.extend([
-            {'role': role, 'content': message},
-            assistant_msg,
-        ])
-        self._meta.append({'file_contents': file_contents or {}})
-        self._meta.append({})  # assistant 消息无文件内容
+        recorded = self._record({'role': role, 'content': message}, file_contents)
+        if hint is not None:
+            self._hint = (recorded, hint) if hint else None
+        self.history.append(assistant_msg)
 
         chat_log(f'[{self.bot_name}] USER: {message}')
         chat_log(f'[{self.bot_name}] ASSISTANT TEXT: {text_content}')
         if tool_calls:
             chat_log(f'[{self.bot_name}] TOOL_CALLS: {[tc.function.name for tc in tool_calls]}')
-        chat_log(f'[{self.bot_name}] HISTORY SNAPSHOT: {self.history}')
+        chat_log(f'[{self.bot_name}] HISTORY SNAPSHOT: {kwargs["messages"] + [assistant_msg]}')
 
-        return {
-            'content': text_content,
-            'tool_calls': tool_calls,
-            'input_tokens': response.usage.prompt_tokens if response.usage else 0,
-            'output_tokens': response.usage.completion_tokens if response.usage else 0,
-        }
+        return result
 
     def add_tool_result(self, tool_call_id: str, result: str,
                         file_contents: dict[str, str] | None = None):
         """将工具执行结果追加到对话历史，供下一次 message() 使用。"""
-        self.history.append({
+        self._record({
             'role': 'tool',
             'tool_call_id': tool_call_id,
             'content': result,
-        })
-        self._meta.append({'file_contents': file_contents or {}})
+        }, file_contents)
 
     def resume(self, use_tools: bool = True) -> dict:
         """工具执行完毕后，直接用当前历史继续推理，不插入任何 user 消息。
@@ -185,22 +277,17 @@ class Bot:
         log_prefix = f'chat with {cfg["model"]} ({cfg["base_url"]}) as {self.bot_name}'
         log(f'{log_prefix} | resume')
 
-        kwargs: dict = dict(model=cfg['model'], messages=self.history, stream=False)
+        kwargs: dict = dict(model=cfg['model'], messages=self._messages(), stream=False)
         if use_tools:
-            kwargs['tools'] = TOOLS
+            kwargs['tools'] = self._tool_list()
             kwargs['tool_choice'] = 'auto'
 
-        # noinspection PyTypeChecker
-        with Spinner():
-            response = _openai_call(self.openai.chat.completions.create, **kwargs)
-
-        if response is None:
+        result = self._complete(kwargs)
+        if result is None:
             return {'content': '', 'tool_calls': [], 'input_tokens': 0, 'output_tokens': 0}
 
-        choice = response.choices[0].message
-
-        text_content: str = choice.content or ''
-        tool_calls: list = choice.tool_calls or []
+        text_content: str = result['content']
+        tool_calls: list = result['tool_calls']
 
         log(f'{log_prefix} | resume output text: {text_content}')
         if tool_calls:
@@ -219,18 +306,12 @@ class Bot:
             ]
 
         self.history.append(assistant_msg)
-        self._meta.append({})
 
         chat_log(f'[{self.bot_name}] RESUME ASSISTANT TEXT: {text_content}')
         if tool_calls:
             chat_log(f'[{self.bot_name}] RESUME TOOL_CALLS: {[tc.function.name for tc in tool_calls]}')
 
-        return {
-            'content': text_content,
-            'tool_calls': tool_calls,
-            'input_tokens': response.usage.prompt_tokens if response.usage else 0,
-            'output_tokens': response.usage.completion_tokens if response.usage else 0,
-        }
+        return result
 
     def set_system(self, system: str):
         """设置或替换 system 提示词（同时重置 base system）。"""
@@ -262,34 +343,23 @@ class Bot:
             self.history[0]['content'] = full_system
         else:
             self.history.insert(0, {'role': 'system', 'content': full_system})
-            self._meta.insert(0, {})
 
     def collapse_file_in_history(self, filename: str) -> int:
         """将对话历史中除最后一次之外、所有包含指定文件内容的消息折叠。
 
-        通过 _meta 中记录的原始文件内容精确定位并替换，无需正则匹配。
-        返回折叠的消息条数。
+        通过文件索引直接定位包含该文件的消息，将其中的文件内容替换为占位文本，
+        开销只与命中的消息数有关。返回折叠的消息条数。
         """
-        placeholder = f'[文件内容已折叠: {filename}]'
-        hits = [
-            i for i, m in enumerate(self._meta)
-            if filename in m.get('file_contents', {})
-        ]
-        if len(hits) <= 1:
+        entries = self._file_entries.get(filename)
+        if not entries or len(entries) <= 1:
             return 0
-
+        placeholder = f'[文件内容已折叠: {filename}]'
         collapsed_count = 0
-        for i in hits[:-1]:
-            content = self._meta[i]['file_contents'][filename]
-            original = self.history[i].get('content')
-            if original and isinstance(original, str):
-                new_content = original.replace(content, placeholder, 1)
-                if new_content != original:
-                    self.history[i]['content'] = new_content
-                    collapsed_count += 1
-                    log(f'bot.collapse_file_in_history | 折叠历史[{i}]中的文件: {filename}')
-            del self._meta[i]['file_contents'][filename]
-
+        for entry in entries[:-1]:
+            if entry.fold(self._blobs, filename, placeholder):
+                collapsed_count += 1
+        del entries[:-1]
+        log(f'bot.collapse_file_in_history | 折叠 {collapsed_count} 条历史消息中的文件: {filename}')
         return collapsed_count
 
 
@@ -2,11 +2,13 @@
 browser.py —— 基于 Playwright 的浏览器操作模块。
 
 支持的操作：
-    BROWSE_OPEN     打开网页
+    BROWSE_OPEN     打开网页（静态页面优先走 HTTP 快速通道，见 http_fetch.py）
     BROWSE_READ     读取页面内容（纯文本）
     BROWSE_EVAL     执行 JavaScript
     BROWSE_CLOSE    关闭浏览器
     BROWSE_FIND     在页面中搜索文字，返回匹配元素信息
+    BROWSE_LAYOUT   返回可见区块的包围盒、角色与截断文字（布局摘要）
+    BROWSE_EXTRACT_TABLES  提取页面表格（规范化与写入文件见 tables.py）
     BROWSE_DOWNLOAD 下载文件到工作目录
     BROWSE_UPLOAD   向文件输入框上传本地文件
     BROWSE_PDF      将当前页面打印为 PDF 并保存
@@ -17,17 +19,40 @@ browser.py —— 基于 Playwright 的浏览器操作模块。
 
 线程说明：
     Playwright sync_api 要求所有操作在同一线程执行，不支持跨线程共享 Page。
-    因此本模块所有函数均在调用方线程中直接执行，依赖 Playwright 内置 timeout 参数
-    作为超时防线，不使用 ThreadPoolExecutor 包装。
+    因此本模块的对外函数统一经 @_on_browser_thread 投递到一个专用的浏览器线程执行，
+    调用方同步等待结果；超时仍依赖 Playwright 内置 timeout 参数。
+    专用线程使得浏览器可以在启动时于后台预启动（prelaunch），而不阻塞主循环。
+    服务模式下所有会话的浏览器操作共用这一个线程，按提交顺序串行执行：一个会话的慢导航
+    会让其他会话的浏览器操作排队等待。不需要 Playwright 的 HTTP 快速通道（browser_open 的
+    fetch_static）在调用方线程执行，不占用浏览器线程，多个会话的静态页面抓取可以并发。
+
+会话：
+    Chromium 进程与 Playwright 实例在整个进程内共享；页面状态（BrowserContext、当前页面、
+    停放页面、静态页面）保存在 BrowserState 中。单会话模式使用模块级的默认状态，
+    服务模式下每个 Session 拥有自己的 BrowserState 与独立的 BrowserContext（Cookie 互不干扰）。
+    @_on_browser_thread 投递任务时携带调用方的 contextvars，浏览器线程据此找到当前会话的状态。
+    配置 browser_profile_dir 时所有会话共享同一个持久化 context，各自只操作自己打开的页面。
+
+生命周期：
+    browser_prelaunch   启动时在后台预启动 Chromium
+    browser_profile_dir 使用持久化用户数据目录，Cookie / 登录态跨会话保留
+    browser_keep_alive  browse_close 只停放页面（about:blank）而不结束浏览器进程，
+                        进程在 browser_shutdown() 时才真正关闭
 """
 
 from __future__ import annotations
 
+import contextvars
+import functools
+import importlib.util
 import os
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional
 
 from script.logger import log, user_log
+from script.session import current as current_session
 
 
 def _timeout_ms() -> int:
@@ -39,47 +64,275 @@ def _timeout_ms() -> int:
         return 10_000
 
 
-# ── 延迟导入 Playwright，避免未安装时整体崩溃 ─────────────────────────
-try:
-    from playwright.sync_api import sync_playwright, Page, Browser, Playwright
+def _browser_cfg() -> dict:
+    try:
+        from config import get_config
+        return get_config()
+    except Exception:
+        return {}
+
 
-    _PLAYWRIGHT_AVAILABLE = True
-except ImportError:
-    _PLAYWRIGHT_AVAILABLE = False
+# ── 延迟导入 Playwright：只在真正启动浏览器时导入，未安装时也不影响其他工具 ──
+_PLAYWRIGHT_AVAILABLE = importlib.util.find_spec('playwright') is not None
 
-# ── 全局单例 ─────────────────────────────────────────────────────────
+# ── 进程内共享（仅在浏览器线程中访问）────────────────────────────────────
 _pw: Optional["Playwright"] = None
-_browser: Optional["Browser"] = None
-_page: Optional["Page"] = None
+_browser: Optional["Browser"] = None          # 持久化 profile 模式下可能为 None
+_shared_context: Optional["BrowserContext"] = None   # 持久化 profile 模式下所有会话共享的 context
+
+
+class BrowserState:
+    """一个会话的浏览器状态（仅在浏览器线程中访问）。"""
+    __slots__ = ('context', 'page', 'parked_page', 'static_page', 'owned')
+
+    def __init__(self):
+        self.context: Optional["BrowserContext"] = None
+        self.page: Optional["Page"] = None
+        self.parked_page: Optional["Page"] = None     # browser_keep_alive 模式下被停放、待复用的页面
+        # 通过 HTTP 快速通道打开的静态页面：{'url', 'title', 'text'}，为 None 表示当前页面在浏览器中
+        self.static_page: Optional[dict] = None
+        self.owned: set = set()   # 共享 context 时属于本会话的页面
+
+
+_default_state = BrowserState()
+_states: list[BrowserState] = [_default_state]
+
+
+def _state() -> BrowserState:
+    """当前会话的浏览器状态；单会话模式下为默认状态。"""
+    session = current_session()
+    if session is None:
+        return _default_state
+    if session.browser is None:
+        session.browser = BrowserState()
+        _states.append(session.browser)
+    return session.browser
+
+# ── 专用浏览器线程 ───────────────────────────────────────────────────
+_BROWSER_THREAD_PREFIX = 'momoka-browser'
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=_BROWSER_THREAD_PREFIX)
+
+
+def _on_browser_thread(fn):
+    """将函数投递到浏览器线程同步执行；已在浏览器线程中时直接调用（允许嵌套）。
+
+    投递时复制调用方的 contextvars，使浏览器线程中的 current_session() 指向调用方的会话。
+    """
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if threading.current_thread().name.startswith(_BROWSER_THREAD_PREFIX):
+            return fn(*args, **kwargs)
+        ctx = contextvars.copy_context()
+        return _executor.submit(ctx.run, fn, *args, **kwargs).result()
+    return wrapper
+
+
+def _fast_path_enabled() -> bool:
+    return bool(_browser_cfg().get('http_fast_path', True))
+
+
+def _on_context_close(state: BrowserState, _):
+    """会话的 context 被关闭（或浏览器进程意外退出）时，重置该会话的页面状态。"""
+    state.context = state.page = state.parked_page = None
+    state.owned.clear()
+    log("browser | context 已关闭")
+
+
+def _on_shared_context_close(_):
+    """持久化 context 关闭意味着浏览器进程已退出，重置共享单例与所有会话的页面状态。"""
+    global _browser, _shared_context
+    _browser = _shared_context = None
+    for state in _states:
+        state.context = state.page = state.parked_page = None
+        state.owned.clear()
+    log("browser | 持久化 context 已关闭")
+
+
+def _context_alive(state: BrowserState) -> bool:
+    if state.context is None:
+        return False
+    if state.context is _shared_context:
+        return True
+    return _browser is not None and _browser.is_connected()
+
+
+def _adopt(state: BrowserState, page: "Page") -> "Page":
+    """将页面（及其打开的弹出窗口）登记为属于该会话。"""
+    state.owned.add(page)
+    page.on("popup", lambda popup: _adopt(state, popup))
+    page.on("close", lambda closed: state.owned.discard(closed))
+    return page
+
+
+def _launch(state: BrowserState, headless: bool):
+    """为会话创建 context，必要时先启动 Chromium。
+
+    配置了 browser_profile_dir 时使用持久化用户数据目录，所有会话共享该 context；
+    否则共享 Chromium 进程，每个会话一个独立的 context。
+    """
+    global _pw, _browser, _shared_context
+    if _pw is None:
+        from playwright.sync_api import sync_playwright
+        _pw = sync_playwright().start()
+    profile_dir = _browser_cfg().get('browser_profile_dir')
+    if profile_dir:
+        if _shared_context is None:
+            os.makedirs(profile_dir, exist_ok=True)
+            _shared_context = _pw.chromium.launch_persistent_context(profile_dir, headless=headless)
+            _browser = _shared_context.browser
+            _shared_context.on("close", _on_shared_context_close)
+            _install_cache_route(_shared_context)
+            log(f"browser | 启动 Chromium（持久化 profile: {profile_dir}）")
+        state.context = _shared_context
+        return
+    if _browser is None or not _browser.is_connected():
+        _browser = _pw.chromium.launch(headless=headless)
+        log("browser | 启动 Chromium")
+    state.context = _browser.new_context()
+    state.context.on("close", functools.partial(_on_context_close, state))
+    _install_cache_route(state.context)
 
 
 def _ensure_browser(headless: bool = True) -> "Page":
-    """确保浏览器已启动，返回当前 Page。"""
-    global _pw, _browser, _page
+    """确保当前会话的浏览器已就绪，返回当前 Page。优先复用被停放的页面。"""
+    state = _state()
 
     if not _PLAYWRIGHT_AVAILABLE:
         raise RuntimeError(
             "Playwright 未安装。请运行: pip install playwright && playwright install chromium"
         )
 
-    if _page is None or _page.is_closed():
-        if _browser is None or not _browser.is_connected():
-            if _pw is None:
-                _pw = sync_playwright().start()
-            _browser = _pw.chromium.launch(headless=headless)
-        _page = _browser.new_page()
-        log("browser | 新建浏览器页面")
+    if state.page is None or state.page.is_closed():
+        if not _context_alive(state):
+            _launch(state, headless)
+        if state.parked_page is not None and not state.parked_page.is_closed():
+            state.page, state.parked_page = state.parked_page, None
+            log("browser | 复用停放的浏览器页面")
+        else:
+            # 持久化 profile 启动时自带一个空白页，未被其他会话占用时直接使用
+            taken = set().union(*(s.owned for s in _states if s is not state))
+            blank = [p for p in state.context.pages if p.url == 'about:blank' and p not in taken]
+            state.page = _adopt(state, blank[0] if blank else state.context.new_page())
+            log("browser | 新建浏览器页面")
+
+    return state.page
+
+
+def _context_pages(state: BrowserState) -> list:
+    """会话的所有标签页（不含停放页面；共享 context 时只含本会话的页面）。"""
+    if state.context is None:
+        return []
+    try:
+        pages = state.context.pages
+        if state.context is _shared_context:
+            pages = [p for p in pages if p in state.owned]
+        return [p for p in pages if p is not state.parked_page]
+    except Exception:
+        return []
+
 
-    return _page
+# ── 路由级缓存：子资源与文档经 page_cache 复用 ─────────────────────────────
+_CACHEABLE_TYPES = {'document', 'stylesheet', 'script', 'image', 'font'}
+
+
+def _install_cache_route(context: "BrowserContext"):
+    """为 context 安装缓存路由（http_cache 关闭且非离线模式时不安装）。"""
+    from script import page_cache
+    if page_cache.cache_enabled() or page_cache.offline():
+        context.route("**/*", _route_cached)
+
+
+def _route_cached(route):
+    """Playwright 路由回调：新鲜的缓存直接返回，否则请求网络并写入缓存。
+
+    缓存在会话间共享：携带 Cookie / Authorization 的请求直接放行；
+    文档可能是登录后的个人化页面，只缓存显式声明 Cache-Control: public 的响应。
+    """
+    from script import page_cache
+    request = route.request
+    if request.method != 'GET' or request.resource_type not in _CACHEABLE_TYPES \
+            or not request.url.startswith(('http://', 'https://')):
+        route.continue_()
+        return
+    try:
+        request_headers = request.all_headers()   # request.headers 不含 Cookie
+    except Exception:
+        request_headers = request.headers
+    if page_cache.has_credentials(request_headers) and not page_cache.offline():
+        route.continue_()
+        return
+
+    entry = page_cache.lookup(request.url)
+    body = page_cache.read_body(request.url) if entry else None
+    if body is not None and (page_cache.offline() or page_cache.is_fresh(entry)):
+        route.fulfill(status=entry['status'], headers=entry['headers'], body=body)
+        return
+    if page_cache.offline():
+        route.abort('internetdisconnected')
+        return
+
+    try:
+        response = route.fetch()
+        data = response.body()
+    except Exception as e:
+        log(f"browser | route fetch error {request.url}: {e}")
+        if body is not None:
+            route.fulfill(status=entry['status'], headers=entry['headers'], body=body)
+        else:
+            route.abort()
+        return
+    page_cache.store(request.url, response.status, response.headers, data,
+                     request_headers=request_headers, require_public=request.resource_type == 'document')
+    route.fulfill(response=response, body=data)
+
+
+def _active_page() -> Optional["Page"]:
+    """返回可操作的浏览器 Page。
+
+    若当前页面是经 HTTP 快速通道打开的静态页面，则在此时升级：启动浏览器并重新导航，
+    以便执行 JS、查找元素、下载等需要真实 DOM 的操作。尚未打开任何页面时返回 None。
+    """
+    state = _state()
+    if state.static_page is not None:
+        url = state.static_page['url']
+        log(f"browser | 静态页面升级到浏览器: {url}")
+        page = _ensure_browser()
+        state.static_page = None
+        try:
+            page.goto(url, wait_until="domcontentloaded", timeout=_timeout_ms())
+        except Exception as e:
+            log(f"browser | 升级导航失败: {e}")
+        return page
+    if state.page is None or state.page.is_closed():
+        return None
+    return state.page
 
 
 # ── 核心操作函数 ──────────────────────────────────────────────────────
 
-def browser_open(url: str, wait_until: str = "domcontentloaded") -> str:
-    """导航到指定 URL，返回页面标题。"""
-    page = _ensure_browser()
+def browser_open(url: str, wait_until: str = "domcontentloaded", max_age: Optional[int] = None) -> str:
+    """导航到指定 URL，返回页面标题。
+
+    静态页面直接通过 HTTP 获取并解析（在调用方线程执行，不占用浏览器线程），
+    只有页面依赖 JavaScript 时才使用浏览器。
+    max_age（秒）覆盖缓存的新鲜度判断，0 表示跳过缓存重新获取。
+    """
     log(f"browser | OPEN {url}")
+    if _fast_path_enabled():
+        from script.http_fetch import fetch_static
+        static = fetch_static(url, timeout=_timeout_ms() / 1000, max_age=max_age)
+        if static is not None:
+            _state().static_page = static
+            return f"已打开页面: {url}\n标题: {static['title']}"
+    return _open_in_browser(url, wait_until)
+
+
+@_on_browser_thread
+def _open_in_browser(url: str, wait_until: str) -> str:
+    state = _state()
+    state.static_page = None
     try:
+        page = _ensure_browser()
         page.goto(url, wait_until=wait_until, timeout=_timeout_ms())
         title = page.title()
         return f"已打开页面: {url}\n标题: {title}"
@@ -91,12 +344,13 @@ def browser_open(url: str, wait_until: str = "domcontentloaded") -> str:
 def _get_tabs_info() -> str:
     """返回当前所有标签页的编号、URL、标题列表字符串。"""
     try:
-        pages = _browser.contexts[0].pages if _browser and _browser.is_connected() else []
+        state = _state()
+        pages = _context_pages(state)
         if not pages:
             return ""
         lines = []
         for i, p in enumerate(pages):
-            marker = " ◀ 当前" if p == _page else ""
+            marker = " ◀ 当前" if p == state.page else ""
             try:
                 title = p.title() or "(无标题)"
             except Exception:
@@ -107,30 +361,33 @@ def _get_tabs_info() -> str:
         return ""
 
 
+@_on_browser_thread
 def browser_read(max_chars: int = 4000) -> str:
     """返回当前页面的内容，可交互元素以 [INTERACTIVE] 标记内联嵌入文字流中。
     若检测到有新标签页打开，自动切换到最新标签页再读取。
     """
-    global _page
-    if _page is None or _page.is_closed():
+    state = _state()
+    if state.static_page is not None:
+        return _format_read(state.static_page['url'], state.static_page['text'], max_chars, "")
+    if state.page is None or state.page.is_closed():
         return "浏览器尚未打开任何页面，请先使用 BROWSE_OPEN。"
 
     # ── 检测新标签页 ──────────────────────────────────────────────────
     try:
-        pages = _browser.contexts[0].pages if _browser and _browser.is_connected() else []
+        pages = _context_pages(state)
         if len(pages) > 1:
             latest = pages[-1]
-            if latest != _page and not latest.is_closed():
-                old_url = _page.url
-                _page = latest
-                _page.bring_to_front()
-                log(f"browser | 检测到新标签页，自动切换: {old_url} → {_page.url}")
+            if latest != state.page and not latest.is_closed():
+                old_url = state.page.url
+                state.page = latest
+                state.page.bring_to_front()
+                log(f"browser | 检测到新标签页，自动切换: {old_url} → {state.page.url}")
     except Exception as e:
         log(f"browser | 新标签页检测失败: {e}")
 
     try:
         # 通过 JS 遍历 DOM，将文字节点和可交互元素按文档顺序合并输出
-        raw = _page.evaluate("""() => {
+        raw = state.page.evaluate("""() => {
             const lines = [];
             const interactive = new Set(['INPUT','BUTTON','A','SELECT','TEXTAREA']);
 
@@ -185,31 +442,35 @@ def browser_read(max_chars: int = 4000) -> str:
             return lines.join('\\n');
         }""")
 
-        # 去除空行、截断
-        text = "\n".join(line for line in raw.splitlines() if line.strip())
-        if len(text) > max_chars:
-            text = text[:max_chars] + (f"\n…（内容已截断，共 {len(text)} 字符。"
-                                       f"如需阅读更多内容，可以在调用时添加max_chars参数指定最大读取字数）")
-
-        tabs_info = _get_tabs_info()
-        return (
-                f"<当前页面: {_page.url}>\n"
-                f"<说明: [INTERACTIVE|标签|选择器|文字] 为可交互元素，可用选择器对其进行操作>\n"
-                + (f"{tabs_info}\n" if tabs_info else "")
-                + f"\n{text}"
-        )
+        return _format_read(state.page.url, raw, max_chars, _get_tabs_info())
     except Exception as e:
         log(f"browser | READ error: {e}")
         return f"读取页面内容失败: {e}"
 
 
+def _format_read(url: str, raw: str, max_chars: int, tabs_info: str) -> str:
+    """去除空行、截断，并拼装 browser_read 的返回文本。"""
+    text = "\n".join(line for line in raw.splitlines() if line.strip())
+    if len(text) > max_chars:
+        text = text[:max_chars] + (f"\n…（内容已截断，共 {len(text)} 字符。"
+                                   f"如需阅读更多内容，可以在调用时添加max_chars参数指定最大读取字数）")
+    return (
+            f"<当前页面: {url}>\n"
+            f"<说明: [INTERACTIVE|标签|选择器|文字] 为可交互元素，可用选择器对其进行操作>\n"
+            + (f"{tabs_info}\n" if tabs_info else "")
+            + f"\n{text}"
+    )
+
+
+@_on_browser_thread
 def browser_eval(script: str) -> str:
     """在当前页面执行 JavaScript，返回结果字符串。"""
-    if _page is None or _page.is_closed():
+    page = _active_page()
+    if page is None:
         return "浏览器尚未打开任何页面。"
     try:
-        result = _page.evaluate(script)
-        _page.wait_for_load_state("networkidle", timeout=_timeout_ms())
+        result = page.evaluate(script)
+        page.wait_for_load_state("networkidle", timeout=_timeout_ms())
         log(f"browser | EVAL result: {result}")
         base_msg = f"JavaScript 执行结果: {result}"
         # 检测常见的异步关键词
@@ -226,15 +487,17 @@ def browser_eval(script: str) -> str:
         return err_msg
 
 
+@_on_browser_thread
 def browser_find(text: str, max_results: int = 10) -> str:
     """
     在当前页面中搜索包含指定文字的可见元素，
     返回每个匹配元素的标签名、推断的 CSS 选择器及文字片段。
     """
-    if _page is None or _page.is_closed():
+    page = _active_page()
+    if page is None:
         return "浏览器尚未打开任何页面。"
     try:
-        results = _page.evaluate(
+        results = page.evaluate(
             """([needle, limit]) => {
                 const matches = [];
                 const walker = document.createTreeWalker(
@@ -268,17 +531,257 @@ def browser_find(text: str, max_results: int = 10) -> str:
         return f"页面搜索失败: {e}"
 
 
-def browser_download(url: str, save_dir: str = ".") -> str:
+_LAYOUT_JS = """([region, viewportOnly, limit, textChars]) => {
+    const landmark = {HEADER: 'banner', NAV: 'navigation', MAIN: 'main', ASIDE: 'complementary',
+                      FOOTER: 'contentinfo', SECTION: 'region', ARTICLE: 'article', FORM: 'form',
+                      TABLE: 'table', UL: 'list', OL: 'list', DIALOG: 'dialog', IMG: 'img',
+                      H1: 'heading', H2: 'heading', H3: 'heading', H4: 'heading', H5: 'heading', H6: 'heading',
+                      A: 'link', BUTTON: 'button', INPUT: 'textbox', SELECT: 'combobox', TEXTAREA: 'textbox',
+                      P: 'paragraph', PRE: 'code', BLOCKQUOTE: 'blockquote', FIGURE: 'figure', VIDEO: 'video'};
+    const skip = new Set(['SCRIPT', 'STYLE', 'NOSCRIPT', 'TEMPLATE', 'HEAD', 'META', 'LINK', 'BR']);
+    const sx = window.scrollX, sy = window.scrollY;
+    const area = region
+        ? {x: region[0], y: region[1], w: region[2], h: region[3]}
+        : (viewportOnly ? {x: sx, y: sy, w: window.innerWidth, h: window.innerHeight} : null);
+
+    function getSelector(el) {
+        if (el.id) return '#' + el.id;
+        if (el.className && typeof el.className === 'string') {
+            const cls = el.className.trim().split(/\\s+/)[0];
+            if (cls) return el.tagName.toLowerCase() + '.' + cls;
+        }
+        return el.tagName.toLowerCase();
+    }
+    function ownText(el) {
+        let t = '';
+        for (const c of el.childNodes) if (c.nodeType === Node.TEXT_NODE) t += c.textContent;
+        return t.trim();
+    }
+    function roleOf(el) {
+        const r = el.getAttribute('role');
+        if (r) return r;
+        if (landmark[el.tagName]) return landmark[el.tagName];
+        return ownText(el) ? 'text' : null;
+    }
+
+    const blocks = [];
+    const emitted = new Map();   // element -> depth
+    let total = 0;
+    for (const el of document.body.querySelectorAll('*')) {
+        if (skip.has(el.tagName)) continue;
+        const role = roleOf(el);
+        if (!role) continue;
+        const rect = el.getBoundingClientRect();
+        if (rect.width < 2 || rect.height < 2) continue;
+        const style = getComputedStyle(el);
+        if (style.visibility === 'hidden' || style.display === 'none' || style.opacity === '0') continue;
+        const box = {x: Math.round(rect.left + sx), y: Math.round(rect.top + sy),
+                     w: Math.round(rect.width), h: Math.round(rect.height)};
+        if (area && (box.x + box.w <= area.x || box.x >= area.x + area.w ||
+                     box.y + box.h <= area.y || box.y >= area.y + area.h)) continue;
+
+        let depth = 0;
+        for (let p = el.parentElement; p; p = p.parentElement) {
+            if (emitted.has(p)) { depth = emitted.get(p) + 1; break; }
+        }
+        // 行内文字块若已被上层同一区块完整覆盖，则不重复输出
+        if (role === 'text' && el.parentElement && emitted.has(el.parentElement)
+            && ['paragraph', 'heading', 'link', 'button'].includes(roleOf(el.parentElement))) continue;
+        total += 1;
+        if (blocks.length >= limit) continue;
+        emitted.set(el, depth);
+        let text = (role === 'img' ? (el.alt || el.title || '') : (el.innerText || el.value || el.placeholder || ''));
+        text = text.replace(/\\s+/g, ' ').trim();
+        if (text.length > textChars) text = text.slice(0, textChars) + '…';
+        blocks.push({depth, role, sel: getSelector(el), text, ...box});
+    }
+    return {blocks, total, viewport: {x: sx, y: sy, w: window.innerWidth, h: window.innerHeight},
+            page: {w: document.documentElement.scrollWidth, h: document.documentElement.scrollHeight}};
+}"""
+
+
+@_on_browser_thread
+def browser_layout(region: Optional[list] = None, viewport_only: bool = True,
+                   max_blocks: int = 60, text_chars: int = 40) -> str:
+    """一次 JS 遍历返回页面可见区块的布局摘要（角色、包围盒、截断文字），无需截图。
+
+    Args:
+        region:        可选，[x, y, width, height]（页面坐标），只返回与该区域相交的区块。
+        viewport_only: 未指定 region 时是否只返回当前视口内的区块。
     """
-    下载指定 URL 的文件到 save_dir 目录。
-    通过 Playwright 下载事件拦截，保留当前页面登录态 Cookie。
+    page = _active_page()
+    if page is None:
+        return "浏览器尚未打开任何页面。"
+    if region is not None and len(region) != 4:
+        return "region 参数格式错误，应为 [x, y, width, height]。"
+    try:
+        data = page.evaluate(_LAYOUT_JS, [region, viewport_only, max_blocks, text_chars])
+        vp, pg = data['viewport'], data['page']
+        area = (f"区域 ({region[0]},{region[1]} {region[2]}×{region[3]})" if region
+                else ("视口" if viewport_only else "整页"))
+        lines = [
+            f"<页面布局: {page.url}>",
+            f"<视口: ({vp['x']},{vp['y']} {vp['w']}×{vp['h']}) | 页面尺寸: {pg['w']}×{pg['h']} | 范围: {area}>",
+            f"<格式: 角色 (x,y 宽×高) 选择器 \"文字\">",
+        ]
+        for b in data['blocks']:
+            text = f' "{b["text"]}"' if b['text'] else ''
+            lines.append(f"{'  ' * b['depth']}{b['role']} ({b['x']},{b['y']} {b['w']}×{b['h']}) {b['sel']}{text}")
+        if data['total'] > len(data['blocks']):
+            lines.append(f"…（共 {data['total']} 个区块，仅显示前 {len(data['blocks'])} 个。"
+                         f"可通过 region 参数缩小范围或增大 max_blocks）")
+        log(f"browser | LAYOUT {area} → {len(data['blocks'])}/{data['total']} blocks")
+        return "\n".join(lines)
+    except Exception as e:
+        log(f"browser | LAYOUT error: {e}")
+        return f"获取页面布局失败: {e}"
+
+
+_TABLES_JS = """([maxTables, maxRows, maxCols]) => {
+    const clean = s => (s || '').replace(/\\s+/g, ' ').trim();
+    const visible = el => {
+        const r = el.getBoundingClientRect();
+        if (r.width < 1 || r.height < 1) return false;
+        const st = getComputedStyle(el);
+        return st.visibility !== 'hidden' && st.display !== 'none';
+    };
+    function caption(el) {
+        const cap = el.tagName === 'TABLE' && el.caption ? clean(el.caption.innerText) : '';
+        if (cap) return cap;
+        if (el.getAttribute('aria-label')) return clean(el.getAttribute('aria-label'));
+        const by = el.getAttribute('aria-labelledby');
+        if (by && document.getElementById(by)) return clean(document.getElementById(by).innerText);
+        // 向上最多 4 层、向前最多 3 个兄弟节点查找最近的标题
+        for (let p = el, up = 0; p && up < 4; p = p.parentElement, up++) {
+            for (let s = p.previousElementSibling, k = 0; s && k < 3; s = s.previousElementSibling, k++) {
+                if (/^H[1-6]$/.test(s.tagName)) return clean(s.innerText);
+                const h = s.querySelector('h1,h2,h3,h4,h5,h6');
+                if (h) return clean(h.innerText);
+            }
+        }
+        return '';
+    }
+    function selector(el) {
+        if (el.id) return '#' + el.id;
+        const cls = typeof el.className === 'string' ? el.className.trim().split(/\\s+/)[0] : '';
+        return el.tagName.toLowerCase() + (cls ? '.' + cls : '');
+    }
+    // rows: [{cells: [{text, rs, cs}], head}] → 展开 rowspan / colspan 后的二维数组
+    function expand(rows) {
+        const grid = rows.map(() => []);
+        rows.forEach((row, r) => {
+            let c = 0;
+            for (const cell of row.cells) {
+                while (grid[r][c] !== undefined) c++;
+                const rs = cell.rs > 0 ? cell.rs : rows.length - r;   // rowspan=0 表示延伸到末尾
+                for (let i = 0; i < rs && r + i < rows.length; i++)
+                    for (let j = 0; j < cell.cs && c + j < maxCols; j++) grid[r + i][c + j] = cell.text;
+                c += cell.cs;
+            }
+        });
+        return grid.map(row => Array.from(row, v => v === undefined ? '' : v));
+    }
+    function headRows(rows) {
+        let n = 0;
+        while (n < rows.length - 1 && rows[n].head) n++;
+        return n;
+    }
+
+    const found = [];
+    let total = 0;
+    for (const table of document.querySelectorAll('table')) {
+        if (table.querySelector('table') || !visible(table)) continue;   // 跳过嵌套表格的布局表
+        const rows = [];
+        for (const tr of table.rows) {
+            if (rows.length >= maxRows) break;
+            const cells = Array.from(tr.cells, td => ({
+                text: clean(td.innerText), rs: td.rowSpan, cs: Math.min(Math.max(td.colSpan, 1), maxCols)}));
+            const head = tr.parentElement.tagName === 'THEAD' || (cells.length > 0 && Array.from(tr.cells).every(td => td.tagName === 'TH'));
+            rows.push({cells, head});
+        }
+        const grid = expand(rows);
+        if (grid.length < 2 || Math.max(...grid.map(r => r.length)) < 2) continue;
+        total += 1;
+        if (found.length < maxTables)
+            found.push({kind: 'table', caption: caption(table), selector: selector(table), grid,
+                        headRows: headRows(rows), totalRows: table.rows.length});
+    }
+    for (const grid of document.querySelectorAll('[role=table],[role=grid],[role=treegrid]')) {
+        if (grid.tagName === 'TABLE' || !visible(grid)) continue;
+        const rows = [];
+        for (const row of grid.querySelectorAll('[role=row]')) {
+            if (row.closest('[role=table],[role=grid],[role=treegrid]') !== grid) continue;
+            if (rows.length >= maxRows) break;
+            const cellEls = Array.from(row.querySelectorAll('[role=cell],[role=gridcell],[role=columnheader],[role=rowheader]'))
+                .filter(c => c.closest('[role=row]') === row);
+            const cells = cellEls.map(c => ({
+                text: clean(c.innerText),
+                rs: parseInt(c.getAttribute('aria-rowspan') || '1', 10) || 1,
+                cs: Math.min(parseInt(c.getAttribute('aria-colspan') || '1', 10) || 1, maxCols)}));
+            rows.push({cells, head: cellEls.length > 0 && cellEls.every(c => c.getAttribute('role') === 'columnheader')});
+        }
+        const expanded = expand(rows);
+        if (expanded.length < 2 || Math.max(...expanded.map(r => r.length)) < 2) continue;
+        total += 1;
+        if (found.length < maxTables)
+            found.push({kind: 'grid', caption: caption(grid), selector: selector(grid), grid: expanded,
+                        headRows: headRows(rows), totalRows: rows.length});
+    }
+    return {tables: found, total, title: document.title, url: location.href};
+}"""
+
+
+@_on_browser_thread
+def browser_tables(max_tables: int = 20, max_rows: int = 5000, max_cols: int = 200) -> dict | str:
+    """一次 JS 遍历提取页面中的 <table> 与 ARIA 表格（role=table/grid），rowspan / colspan 已展开。
+
+    返回 {'tables': [{kind, caption, selector, grid, headRows, totalRows}], 'total', 'title', 'url'}，
+    出错时返回错误信息字符串。表头与数字的规范化见 tables.py。
     """
-    if _page is None or _page.is_closed():
+    page = _active_page()
+    if page is None:
+        return "浏览器尚未打开任何页面。"
+    try:
+        data = page.evaluate(_TABLES_JS, [max_tables, max_rows, max_cols])
+        log(f"browser | TABLES {page.url} → {len(data['tables'])}/{data['total']} tables")
+        return data
+    except Exception as e:
+        log(f"browser | TABLES error: {e}")
+        return f"提取表格失败: {e}"
+
+
+def _download_timeout_ms() -> int:
+    """下载使用独立的超时策略（download_timeout，秒），不受 wait 影响。"""
+    return int(_browser_cfg().get('download_timeout', 30)) * 1000
+
+
+@_on_browser_thread
+def _cookie_headers(urls: list[str]) -> list[str]:
+    """从当前 context 取出各 URL 对应的 Cookie 请求头，保留页面登录态。"""
+    context = _state().context
+    if context is None:
+        return [''] * len(urls)
+    headers = []
+    for url in urls:
+        try:
+            cookies = context.cookies(url)
+            headers.append('; '.join(f"{c['name']}={c['value']}" for c in cookies))
+        except Exception as e:
+            log(f"browser | cookies error {url}: {e}")
+            headers.append('')
+    return headers
+
+
+@_on_browser_thread
+def _download_via_page(url: str, save_dir: str) -> str:
+    """通过 Playwright 下载事件拦截下载（用于 blob:/data: 等非 HTTP 链接或直连失败时）。"""
+    page = _active_page()
+    if page is None:
         return "浏览器尚未打开任何页面。"
     try:
         os.makedirs(save_dir, exist_ok=True)
-        with _page.expect_download(timeout=_timeout_ms()) as dl_info:
-            _page.evaluate(f"() => {{ window.location.href = {url!r}; }}")
+        with page.expect_download(timeout=_download_timeout_ms()) as dl_info:
+            page.evaluate(f"() => {{ window.location.href = {url!r}; }}")
         download = dl_info.value
         suggested = download.suggested_filename or f"download_{int(time.time())}"
         save_path = os.path.join(save_dir, suggested)
@@ -291,14 +794,49 @@ def browser_download(url: str, save_dir: str = ".") -> str:
         return f"下载失败: {e}"
 
 
+def browser_download(url: str | list[str], save_dir: str = ".", checksum: Optional[str] = None) -> str:
+    """
+    下载一个或多个 URL 的文件到 save_dir 目录。
+    HTTP(S) 链接携带浏览器 context 的 Cookie 直接流式下载（支持续传、并发与哈希校验，见 downloader.py），
+    其余链接或直连被拒绝（401/403）时退回 Playwright 下载事件拦截。
+    本函数不在浏览器线程中执行，下载期间不会阻塞其他浏览器操作。
+    """
+    from script.downloader import download_many
+    from script.http_fetch import USER_AGENT
+
+    urls = [url] if isinstance(url, str) else list(url)
+    http_urls = [u for u in urls if u.startswith(('http://', 'https://'))]
+    cookies = dict(zip(http_urls, _cookie_headers(http_urls))) if http_urls else {}
+    results = download_many(
+        [{'url': u, 'cookie': cookies[u], 'checksum': checksum if len(urls) == 1 else None} for u in http_urls],
+        save_dir, user_agent=USER_AGENT,
+    ) if http_urls else []
+    by_url = {r['url']: r for r in results}
+
+    lines = []
+    for u in urls:
+        r = by_url.get(u)
+        if r is None or (not r['ok'] and r.get('status') in (401, 403)):
+            lines.append(_download_via_page(u, save_dir))
+        elif r['ok']:
+            extra = f"，{r['message']}" if r['message'] else ''
+            user_log(f"文件已下载: {r['path']}", role='BROWSER')
+            lines.append(f"文件已下载并保存至: {r['path']}（{r['size']} 字节{extra}）")
+        else:
+            lines.append(f"下载失败（{u}）: {r['message']}")
+    return "\n".join(lines)
+
+
+@_on_browser_thread
 def browser_upload(selector: str, file_path: str) -> str:
     """向 <input type="file"> 元素上传本地文件。"""
-    if _page is None or _page.is_closed():
+    page = _active_page()
+    if page is None:
         return "浏览器尚未打开任何页面。"
     if not os.path.isfile(file_path):
         return f"上传失败: 本地文件不存在: {file_path}"
     try:
-        _page.set_input_files(selector, file_path, timeout=_timeout_ms())
+        page.set_input_files(selector, file_path, timeout=_timeout_ms())
         log(f"browser | UPLOAD {file_path} → {selector}")
         return f"已将文件 {file_path} 上传至输入框 {selector}。"
     except Exception as e:
@@ -306,14 +844,16 @@ def browser_upload(selector: str, file_path: str) -> str:
         return f"上传失败（{selector}）: {e}"
 
 
+@_on_browser_thread
 def browser_pdf(save_dir: str = ".") -> str:
     """将当前页面打印为 PDF（仅 headless 模式支持）并保存到 save_dir。"""
-    if _page is None or _page.is_closed():
+    page = _active_page()
+    if page is None:
         return "浏览器尚未打开任何页面。"
     try:
         os.makedirs(save_dir, exist_ok=True)
         filename = os.path.join(save_dir, f"page_{int(time.time())}.pdf")
-        _page.pdf(path=filename, format="A4", print_background=True)
+        page.pdf(path=filename, format="A4", print_background=True)
         log(f"browser | PDF saved to {filename}")
         user_log(f"PDF 已保存: {filename}", role='BROWSER')
         return f"PDF 已保存至: {filename}"
@@ -322,13 +862,17 @@ def browser_pdf(save_dir: str = ".") -> str:
         return f"PDF 生成失败: {e}"
 
 
+@_on_browser_thread
 def browser_wait_for_navigation(timeout: int = None, state: str = "networkidle") -> str:
     """等待页面导航完成。"""
-    if _page is None or _page.is_closed():
+    if _state().static_page is not None:
+        return f"页面加载完成（状态：{state}）"
+    page = _active_page()
+    if page is None:
         return "浏览器尚未打开任何页面。"
     try:
         timeout_ms = (timeout if timeout is not None else (_timeout_ms() // 1000)) * 1000
-        _page.wait_for_load_state(state, timeout=timeout_ms)
+        page.wait_for_load_state(state, timeout=timeout_ms)
         log(f"browser | WAIT completed: state={state}")
         return f"页面加载完成（状态：{state}）"
     except Exception as e:
@@ -357,37 +901,133 @@ def browser_search(query: str, engine: str = 'google') -> str:
     return browser_open(url)
 
 
+@_on_browser_thread
 def browser_switch(index: int) -> str:
     """切换到指定编号的标签页。"""
-    global _page
+    state = _state()
     try:
-        pages = _browser.contexts[0].pages if _browser and _browser.is_connected() else []
+        pages = _context_pages(state)
         if not pages:
             return "当前没有打开的标签页。"
         if index < 0 or index >= len(pages):
             return f"编号 {index} 超出范围，当前共有 {len(pages)} 个标签页（0 ~ {len(pages) - 1}）。"
-        _page = pages[index]
-        _page.bring_to_front()
-        log(f"browser | SWITCH → [{index}] {_page.url}")
-        return f"已切换到标签页 [{index}]: {_page.title()}  {_page.url}"
+        state.page = pages[index]
+        state.static_page = None
+        state.page.bring_to_front()
+        log(f"browser | SWITCH → [{index}] {state.page.url}")
+        return f"已切换到标签页 [{index}]: {state.page.title()}  {state.page.url}"
     except Exception as e:
         log(f"browser | SWITCH error: {e}")
         return f"切换标签页失败: {e}"
 
 
+@_on_browser_thread
 def browser_close() -> str:
-    """关闭浏览器及 Playwright 实例。"""
-    global _pw, _browser, _page
+    """关闭浏览器。开启 browser_keep_alive 时只停放页面，浏览器进程保持运行以便下次秒开。
+
+    其他会话仍在使用浏览器时只关闭本会话的页面与 context，不结束共享的 Chromium 进程。
+    """
+    state = _state()
+    state.static_page = None
+    if not _browser_cfg().get('browser_keep_alive', False):
+        _close_state(state)
+        if any(_context_alive(s) for s in _states if s is not state):
+            log("browser | 已关闭本会话的页面，其他会话仍在使用浏览器")
+            return "浏览器已关闭。"
+        return _shutdown()
+    try:
+        pages = _context_pages(state)
+        keep = state.page if state.page is not None and not state.page.is_closed() else (pages[0] if pages else None)
+        for p in pages:
+            if p is not keep:
+                p.close()
+        if keep is not None:
+            keep.goto("about:blank")
+            state.parked_page = keep
+        state.page = None
+        log("browser | 页面已停放，浏览器保持运行")
+        return "浏览器已关闭。"
+    except Exception as e:
+        log(f"browser | CLOSE error: {e}")
+        return f"关闭浏览器时出错：{e}"
+
+
+def _close_state(state: BrowserState):
+    """关闭会话自己的 context（共享 context 时只关闭本会话的页面）。"""
+    context, pages = state.context, list(_context_pages(state))
+    if state.parked_page is not None:
+        pages.append(state.parked_page)
+    state.context = state.page = state.parked_page = state.static_page = None
     try:
-        if _page and not _page.is_closed():
-            _page.close()
-        if _browser and _browser.is_connected():
-            _browser.close()
-        if _pw:
-            _pw.stop()
-        _page = _browser = _pw = None
+        if context is not None and context is not _shared_context:
+            context.close()
+        else:
+            for p in pages:
+                if not p.is_closed():
+                    p.close()
+    except Exception as e:
+        log(f"browser | 关闭会话页面出错: {e}")
+    state.owned.clear()
+
+
+@_on_browser_thread
+def browser_release() -> str:
+    """结束当前会话时释放其浏览器状态（忽略 browser_keep_alive，不影响其他会话）。"""
+    session = current_session()
+    state = _state()
+    _close_state(state)
+    if session is not None and state in _states:
+        _states.remove(state)
+        session.browser = None
+    return "浏览器已关闭。"
+
+
+def _shutdown() -> str:
+    """关闭浏览器及 Playwright 实例（持久化 profile 的 Cookie 随 context 关闭写盘）。"""
+    global _pw, _browser, _shared_context
+    pw, browser = _pw, _browser
+    contexts = {s.context for s in _states if s.context is not None}
+    if _shared_context is not None:
+        contexts.add(_shared_context)
+    for state in _states:
+        state.context = state.page = state.parked_page = state.static_page = None
+        state.owned.clear()
+    _shared_context = _browser = _pw = None
+    try:
+        for context in contexts:
+            context.close()
+        if browser and browser.is_connected():
+            browser.close()
+        if pw:
+            pw.stop()
         log("browser | 浏览器已关闭")
         return "浏览器已关闭。"
     except Exception as e:
         log(f"browser | CLOSE error: {e}")
-        return f"关闭浏览器时出错：{e}"
\ No newline at end of file
+        return f"关闭浏览器时出错：{e}"
+
+
+@_on_browser_thread
+def browser_shutdown() -> str:
+    """彻底关闭浏览器进程（程序退出时调用，忽略 browser_keep_alive）。"""
+    _state().static_page = None
+    if _pw is None:
+        return "浏览器未启动。"
+    return _shutdown()
+
+
+def _prelaunch():
+    state = _state()
+    try:
+        page = _ensure_browser()
+        # 预启动的页面先停放，browser_read 等操作不会把它当作已打开的页面
+        state.page, state.parked_page = None, page
+        log("browser | 预启动完成")
+    except Exception as e:
+        log(f"browser | 预启动失败: {e}")
+
+
+def browser_prelaunch():
+    """在浏览器线程中后台预启动 Chromium，立即返回，不阻塞调用方。"""
+    if _PLAYWRIGHT_AVAILABLE:
+        _executor.submit(_prelaunch)
@@ -0,0 +1,157 @@
+"""
+bulk.py —— bulk_replace 工具：按 glob 批量进行正则查找替换。
+
+    - 文件由 ignore.walk_files 枚举（遵循 .gitignore），按 glob 过滤；
+      不含 / 的 glob（如 *.py）匹配任意层级下的文件名；
+    - 文件分批交给进程池并行处理，每个文件只读取一次，先读取 8KB 判断是否为二进制文件；
+      文件较少时直接在当前进程处理，避免进程池的启动开销；
+    - dry_run=True 时只统计匹配数并生成示例 diff，不修改文件；
+    - 实际替换时每个文件经 fileio.atomic_write 原子写入；传入 snapshot_dir 时写入前先由
+      checkpoint.snapshot_file 建立快照，快照记录随结果返回，由调用方汇总为一个检查点。
+
+本模块顶层只导入标准库与无副作用的模块，以便进程池子进程快速导入。
+"""
+
+from __future__ import annotations
+
+import difflib
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+from script.checkpoint import snapshot_file
+from script.fileio import atomic_write
+from script.ignore import glob_to_regex, walk_files
+
+MAX_FILE_BYTES = 5 * 1024 * 1024
+_BATCH_SIZE = 64
+_POOL_THRESHOLD = 32
+_DIFF_LINES = 16
+
+
+def _process_file(path: str, regex: re.Pattern, replacement: str, encoding: str,
+                  dry_run: bool, want_diff: bool, snapshot_dir: str | None = None) -> dict | None:
+    """处理单个文件，返回 {'path', 'count', 'diff', 'error', 'snapshot'}；无匹配时返回 None。"""
+    try:
+        with open(path, 'rb') as f:
+            head = f.read(8192)
+            if b'\0' in head:
+                return None
+            rest = f.read(MAX_FILE_BYTES)
+            if f.read(1):
+                return {'path': path, 'count': 0, 'diff': '', 'error': '文件过大，已跳过'}
+        text = (head + rest).decode(encoding)
+    except UnicodeDecodeError:
+        return None
+    except OSError as e:
+        return {'path': path, 'count': 0, 'diff': '', 'error': str(e)}
+
+    try:
+        new_text, count = regex.subn(replacement, text)
+    except (re.error, IndexError) as e:
+        return {'path': path, 'count': 0, 'diff': '', 'error': f'替换表达式错误: {e}'}
+    if not count:
+        return None
+
+    diff = ''
+    if want_diff:
+        lines = list(difflib.unified_diff(text.splitlines(), new_text.splitlines(),
+                                          fromfile=path, tofile=path, lineterm='', n=1))
+        diff = '\n'.join(lines[:_DIFF_LINES]) + ('\n…' if len(lines) > _DIFF_LINES else '')
+    snapshot = None
+    if not dry_run:
+        try:
+            if snapshot_dir:
+                snapshot = snapshot_file(path, snapshot_dir)
+            atomic_write(path, new_text, encoding, newline='')   # 按字节解码，换行符原样保留
+        except OSError as e:
+            return {'path': path, 'count': 0, 'diff': '', 'error': f'写入失败: {e}', 'snapshot': snapshot}
+    return {'path': path, 'count': count, 'diff': diff, 'error': '', 'snapshot': snapshot}
+
+
+def _process_batch(paths: list[str], pattern: str, flags: int, replacement: str, encoding: str,
+                   dry_run: bool, want_diff: bool, snapshot_dir: str | None = None) -> list[dict]:
+    """进程池任务：处理一批文件。"""
+    regex = re.compile(pattern, flags)
+    out = []
+    for path in paths:
+        r = _process_file(path, regex, replacement, encoding, dry_run, want_diff, snapshot_dir)
+        if r is not None:
+            out.append(r)
+    return out
+
+
+def split_glob(glob: str, cwd: str) -> tuple[str, str]:
+    """将 glob 拆分为 (遍历根目录, 相对 glob)：绝对路径 glob 以其不含通配符的前缀目录为根。"""
+    glob = glob.replace('\\', '/')
+    if not os.path.isabs(glob):
+        return cwd, glob
+    parts = glob.split('/')
+    i = next((k for k, p in enumerate(parts) if any(c in p for c in '*?[')), len(parts) - 1)
+    return '/'.join(parts[:i]) or '/', '/'.join(parts[i:])
+
+
+def match_files(root: str, glob: str) -> list[str]:
+    """返回 root 下匹配 glob 且未被忽略的文件绝对路径。"""
+    glob = glob.replace('\\', '/')
+    rx = glob_to_regex(glob)
+    by_name = '/' not in glob
+    return [
+        entry.path for rel, entry in walk_files(root)
+        if rx.match(entry.name if by_name else rel)
+    ]
+
+
+def bulk_replace(root: str, glob: str, pattern: str, replacement: str, dry_run: bool = False,
+                 ignore_case: bool = False, multiline: bool = False, encoding: str = 'utf-8',
+                 max_workers: int | None = None, snapshot_dir: str | None = None) -> dict:
+    """执行批量替换，返回 {'files': [...], 'matched_files', 'total', 'errors'}。"""
+    flags = (re.IGNORECASE if ignore_case else 0) | (re.MULTILINE if multiline else 0)
+    re.compile(pattern, flags)  # 提前暴露正则错误
+    paths = match_files(root, glob)
+
+    # dry_run 时只为前几个批次生成示例 diff，避免大量无用的 diff 计算
+    batches = [paths[i:i + _BATCH_SIZE] for i in range(0, len(paths), _BATCH_SIZE)]
+    results: list[dict] = []
+    if len(paths) < _POOL_THRESHOLD:
+        for batch in batches:
+            results.extend(_process_batch(batch, pattern, flags, replacement, encoding, dry_run, dry_run,
+                                          snapshot_dir))
+    else:
+        workers = max_workers or min(os.cpu_count() or 1, len(batches))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [
+                pool.submit(_process_batch, batch, pattern, flags, replacement, encoding,
+                            dry_run, dry_run and i < 2, snapshot_dir)
+                for i, batch in enumerate(batches)
+            ]
+            for f in futures:
+                results.extend(f.result())
+
+    files = [r for r in results if not r['error']]
+    errors = [r for r in results if r['error']]
+    return {
+        'scanned': len(paths),
+        'files': files,
+        'matched_files': len(files),
+        'total': sum(r['count'] for r in files),
+        'errors': errors,
+    }
+
+
+def format_result(result: dict, dry_run: bool, max_files: int = 50, max_diffs: int = 5) -> str:
+    """将 bulk_replace 的结果格式化为工具返回文本。"""
+    head = '预览（未修改任何文件）' if dry_run else '已替换'
+    lines = [f'{head}: 扫描 {result["scanned"]} 个文件，{result["matched_files"]} 个文件共 {result["total"]} 处匹配。']
+    for r in result['files'][:max_files]:
+        lines.append(f'  {r["path"]}: {r["count"]} 处')
+    if len(result['files']) > max_files:
+        lines.append(f'  …（其余 {len(result["files"]) - max_files} 个文件省略）')
+    for r in result['errors'][:10]:
+        lines.append(f'  [跳过] {r["path"]}: {r["error"]}')
+    if dry_run:
+        diffs = [r['diff'] for r in result['files'] if r['diff']][:max_diffs]
+        if diffs:
+            lines.append('\n示例 diff:')
+            lines.extend(diffs)
+    return '\n'.join(lines)
@@ -0,0 +1,310 @@
+"""
+checkpoint.py —— 文件检查点与回滚。
+
+会修改文件的工具（edit_file / replace_file / apply_patch / bulk_replace）在写入前为将被修改的文件
+建立检查点，之后可用 /undo [n] 或 rollback 工具撤销最近 n 次修改。
+
+快照只针对即将写入的文件（与工作区大小无关），按以下顺序选择最便宜的方式：
+    1. reflink（Linux FICLONE，btrfs / xfs 等）：写时复制，不占额外空间，内容不受之后的修改影响；
+    2. 硬链接：所有工具都经 fileio 以“临时文件 + rename”方式写入，原 inode 不会被改写，
+       硬链接即可保住旧内容。若之后有命令原地修改了该文件，回滚时通过 (size, mtime) 校验发现并跳过。
+       append_file 原地追加，其检查点以 link=False 建立，跳过这一步；已有其他硬链接的文件
+       fileio 也会原地写入，同样跳过（快照建立的链接记录在 fileio 中，不算在内）；
+    3. 复制到按 SHA-256 寻址的对象库（跨文件系统等情况），相同内容只保存一份。
+检查点目录不在同一文件系统时 1、2 不可用，自动回退到 3。
+
+snapshot_file 是只依赖标准库的纯函数，bulk_replace 的进程池子进程在写入前直接调用，
+把快照记录随结果返回，由主进程汇总为一个检查点。
+检查点按会话保存（同 jobs.py），会话结束时删除；数量超过 checkpoint_max 时丢弃最早的检查点。
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+from script.fileio import install, is_snapshot_link, note_snapshot_link
+
+_FICLONE = 0x40049409
+
+
+# ── 快照（纯函数，可在子进程中调用）──────────────────────────────────────────
+
+def _reflink(src: str, dst: str) -> bool:
+    if not sys.platform.startswith('linux'):
+        return False
+    import fcntl
+    try:
+        with open(src, 'rb') as s, open(dst, 'wb') as d:
+            fcntl.ioctl(d.fileno(), _FICLONE, s.fileno())
+        shutil.copymode(src, dst)
+        return True
+    except OSError:
+        if os.path.exists(dst):
+            os.unlink(dst)
+        return False
+
+
+def _store_object(src: str, store_dir: str) -> str:
+    """复制到对象库，返回对象的相对路径（按内容寻址，已存在时不重复写入）。"""
+    h = hashlib.sha256()
+    with open(src, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    digest = h.hexdigest()
+    rel = os.path.join('objects', digest[:2], digest)
+    dst = os.path.join(store_dir, rel)
+    if not os.path.exists(dst):
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(dst))
+        os.close(fd)
+        try:
+            shutil.copyfile(src, tmp)
+            os.replace(tmp, dst)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+    return rel
+
+
+def snapshot_file(path: str, store_dir: str, link: bool = True) -> dict:
+    """为即将被修改的文件建立快照，返回快照记录。
+
+    文件将被原地修改（如追加）时传入 link=False：不使用与原文件共享 inode 的硬链接。
+    记录字段: path, kind ('absent' | 'reflink' | 'link' | 'object'), blob（相对 store_dir）,
+    size, mtime_ns, mode。文件原先不存在时 kind 为 'absent'，回滚时删除该文件。
+    """
+    path = os.path.realpath(path)   # 与 fileio 一致：快照并回滚符号链接指向的文件
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return {'path': path, 'kind': 'absent', 'blob': None}
+    entry = {'path': path, 'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'mode': st.st_mode & 0o7777}
+    files_dir = os.path.join(store_dir, 'files')
+    os.makedirs(files_dir, exist_ok=True)
+    rel = os.path.join('files', uuid.uuid4().hex)
+    dst = os.path.join(store_dir, rel)
+    if _reflink(path, dst):
+        entry.update(kind='reflink', blob=rel)
+        return entry
+    # 已有其他硬链接的文件由 fileio 原地写入，硬链接快照会随之被改写
+    if link and (st.st_nlink == 1 or is_snapshot_link(st)):
+        try:
+            os.link(path, dst)
+            note_snapshot_link(st)
+            entry.update(kind='link', blob=rel)
+            return entry
+        except OSError:
+            pass
+    entry.update(kind='object', blob=_store_object(path, store_dir))
+    return entry
+
+
+# ── 检查点栈 ──────────────────────────────────────────────────────────────
+
+class Checkpoint:
+    __slots__ = ('id', 'label', 'created', 'entries')
+
+    def __init__(self, checkpoint_id: int, label: str, entries: list[dict]):
+        self.id = checkpoint_id
+        self.label = label
+        self.created = time.time()
+        self.entries = entries
+
+
+class CheckpointStore:
+    """一个会话的检查点栈。"""
+
+    def __init__(self, store_dir: str, max_checkpoints: int = 100):
+        self.dir = store_dir
+        self.max = max_checkpoints
+        self.stack: list[Checkpoint] = []
+        self._objects: dict[str, int] = {}   # 对象库中各对象被引用的次数
+        self._next = 1
+        self._lock = threading.Lock()
+
+    def snapshot(self, paths, label: str, link: bool = True) -> Checkpoint | None:
+        """为 paths 建立快照并压入检查点栈（同一路径只快照一次）。"""
+        entries = [snapshot_file(p, self.dir, link) for p in dict.fromkeys(os.path.abspath(p) for p in paths)]
+        return self.commit(label, entries)
+
+    def commit(self, label: str, entries: list[dict]) -> Checkpoint | None:
+        """将已建立的快照记录（如 bulk_replace 子进程返回的）压入检查点栈。"""
+        if not entries:
+            return None
+        with self._lock:
+            checkpoint = Checkpoint(self._next, label, entries)
+            self._next += 1
+            self.stack.append(checkpoint)
+            for e in entries:
+                if e['kind'] == 'object':
+                    self._objects[e['blob']] = self._objects.get(e['blob'], 0) + 1
+            dropped = self.stack[:-self.max] if len(self.stack) > self.max else []
+            del self.stack[:len(dropped)]
+        for old in dropped:
+            self._discard(old)
+        return checkpoint
+
+    def _discard(self, checkpoint: Checkpoint):
+        """删除检查点占用的快照文件（对象库中的对象在无引用后删除）。"""
+        for e in checkpoint.entries:
+            if e['kind'] in ('link', 'reflink'):
+                _unlink(os.path.join(self.dir, e['blob']))
+            elif e['kind'] == 'object':
+                with self._lock:
+                    left = self._objects.get(e['blob'], 1) - 1
+                    if left:
+                        self._objects[e['blob']] = left
+                    else:
+                        self._objects.pop(e['blob'], None)
+                if not left:
+                    _unlink(os.path.join(self.dir, e['blob']))
+
+    def _restore(self, e: dict) -> str | None:
+        """恢复单个文件，返回错误信息（成功时为 None）。"""
+        path = e['path']
+        if e['kind'] == 'absent':
+            _unlink(path)
+            return None
+        blob = os.path.join(self.dir, e['blob'])
+        if e['kind'] == 'link':
+            try:
+                st = os.stat(blob)
+            except FileNotFoundError:
+                return '快照文件丢失'
+            if (st.st_size, st.st_mtime_ns) != (e['size'], e['mtime_ns']):
+                return '快照建立后文件被原地修改过，无法恢复'
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(prefix='.' + os.path.basename(path) + '.', suffix='.tmp',
+                                   dir=os.path.dirname(path))
+        os.close(fd)
+        try:
+            if e['kind'] == 'object':
+                shutil.copyfile(blob, tmp)
+            else:
+                try:
+                    os.replace(blob, tmp)   # 快照文件只属于这个检查点，直接移回
+                except OSError:
+                    shutil.copyfile(blob, tmp)
+            install(tmp, path)   # 文件已有其他硬链接时原地写回
+            os.chmod(path, e['mode'])
+        except OSError as err:
+            _unlink(tmp)
+            return str(err)
+        return None
+
+    def rollback(self, steps: int = 1) -> tuple[list[Checkpoint], list[str], list[tuple[str, str]]]:
+        """撤销最近 steps 个检查点，返回 (撤销的检查点, 恢复的文件, [(失败的文件, 原因)])。"""
+        with self._lock:
+            steps = max(0, min(steps, len(self.stack)))
+            undone = self.stack[len(self.stack) - steps:][::-1]
+            del self.stack[len(self.stack) - steps:]
+        restored, failed = {}, []
+        for checkpoint in undone:
+            for e in checkpoint.entries:
+                error = self._restore(e)
+                if error:
+                    failed.append((e['path'], error))
+                else:
+                    restored[e['path']] = None
+            self._discard(checkpoint)
+        return undone, list(restored), failed
+
+    def clear(self):
+        with self._lock:
+            self.stack.clear()
+            self._objects.clear()
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+
+def _unlink(path: str):
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+# ── 当前会话的检查点栈 ────────────────────────────────────────────────────
+
+_default_store: CheckpointStore | None = None
+
+
+def _new_store(owner: str) -> CheckpointStore:
+    from config import get_config
+    cfg = get_config()
+    base = cfg.get('checkpoint_dir') or os.path.join(os.path.dirname(os.path.abspath(__file__)), '..',
+                                                     'cache', 'checkpoints')
+    store_dir = os.path.abspath(os.path.join(base, f'{owner}-{os.getpid()}'))
+    return CheckpointStore(store_dir, int(cfg.get('checkpoint_max', 100)))
+
+
+def current_store() -> CheckpointStore:
+    global _default_store
+    from script.session import current
+    session = current()
+    if session is None:
+        if _default_store is None:
+            _default_store = _new_store('main')
+        return _default_store
+    if session.checkpoints is None:
+        session.checkpoints = _new_store(session.id)
+    return session.checkpoints
+
+
+def checkpoint(paths, label: str, link: bool = True):
+    """写入 paths 之前调用：为这些文件建立检查点。快照失败不影响写入本身。
+
+    将原地修改文件（而非临时文件 + rename）时传入 link=False。
+    """
+    try:
+        current_store().snapshot(paths, label, link)
+    except OSError as e:
+        from script.logger import log
+        log(f'checkpoint | 建立检查点失败: {e}')
+
+
+def release_checkpoints():
+    """删除当前会话的检查点（会话结束时调用）。"""
+    from script.session import current
+    session = current()
+    store = _default_store if session is None else session.checkpoints
+    if store is not None:
+        store.clear()
+
+
+def rollback(steps: int = 1, max_files: int = 30) -> str:
+    from script.workspace_index import notify_changed
+    store = current_store()
+    if not store.stack:
+        return '没有可撤销的修改。'
+    undone, restored, failed = store.rollback(steps)
+    for path in restored:
+        notify_changed(path)
+    lines = [f'已撤销 {len(undone)} 次修改（剩余 {len(store.stack)} 个检查点）:']
+    lines.extend(f'  #{c.id} {c.label}' for c in undone)
+    if restored:
+        lines.append(f'已恢复 {len(restored)} 个文件:')
+        lines.extend(f'  {p}' for p in restored[:max_files])
+        if len(restored) > max_files:
+            lines.append(f'  …（其余 {len(restored) - max_files} 个文件省略）')
+    for path, error in failed:
+        lines.append(f'  [失败] {path}: {error}')
+    return '\n'.join(lines)
+
+
+def list_checkpoints(limit: int = 20) -> str:
+    store = current_store()
+    if not store.stack:
+        return '没有可撤销的修改。'
+    lines = [f'共 {len(store.stack)} 个检查点（最新在前）:']
+    for c in store.stack[::-1][:limit]:
+        when = time.strftime('%H:%M:%S', time.localtime(c.created))
+        lines.append(f'  #{c.id} {when} {c.label}（{len(c.entries)} 个文件）')
+    return '\n'.join(lines)
@@ -0,0 +1,464 @@
+"""
+command_cache.py —— 只读终端命令的结果缓存（config: command_cache，默认关闭）。
+
+助手常在同一会话、甚至不同会话中重复执行相同的只读命令（pip list、git log、python --version、du、
+pytest --collect-only 等），每次都要完整地启动子进程。开启后，system_command 对这类命令：
+    - 以 (命令, 工作目录, 相关环境变量) 为键查找缓存，命中且仍有效时直接返回，输出开头标注 [缓存结果]；
+    - 未命中时照常执行，退出码为 0 的结果写入缓存（cache/commands.json，跨会话保留，见下）。
+
+只读判定（is_read_only）：按 shell 语法拆分为管道 / && / ; 连接的各段，每段都必须是已知的只读命令
+（ls、cat、grep、find、du、git log/status/diff…、pip list/show/freeze…、任意程序的 --version 等），
+且不含输出重定向（>/dev/null 与 2>&1 除外）、命令替换与后台执行。
+
+缓存条目在以下情况失效：
+    - 超过 command_cache_ttl 秒（默认 600）；
+    - 监视路径的指纹（mtime / 大小）变化：工作目录、命令参数中的路径、git 仓库的 HEAD / index / refs 日志、
+      包管理命令所用解释器的 site-packages、package.json / Cargo.lock / go.mod 等；
+      结果依赖目录下文件内容的命令（grep -r、find、du、tree、git status / diff、pytest --collect-only 等）
+      还比较目录树中每个文件的 mtime / 大小（文件数超过 MAX_TREE_FILES 时不缓存）；
+    - 工作区代数（generation）变化：工具写入文件（workspace_index.notify_changed）、
+      执行非只读命令、启动后台任务或执行 python_exec 时递增，本进程之前的条目全部失效。
+只有不依赖目录树、不含通配符参数的命令写入磁盘、跨会话复用；从磁盘载入的条目同样受本进程的
+代数约束（视为代数 0），并在使用前校验指纹。
+后台任务运行期间不使用缓存。条目数超过 MAX_ENTRIES 时按最近访问时间（LRU）淘汰。
+"""
+
+from __future__ import annotations
+
+import glob
+import hashlib
+import json
+import os
+import re
+import shlex
+import shutil
+import sys
+import threading
+import time
+
+from script.logger import log
+from script.workspace_index import add_change_listener, change_count
+
+MAX_ENTRIES = 256
+MAX_OUTPUT_CHARS = 200_000
+MAX_TREE_FILES = 20_000
+DEFAULT_TTL = 600
+
+_BASE = os.path.dirname(os.path.abspath(__file__))
+_CACHE_FILE = os.path.join(_BASE, '..', 'cache', 'commands.json')
+
+# 参与缓存键的环境变量（另加命令中以 $VAR 引用的变量）
+_ENV_KEYS = ('PATH', 'VIRTUAL_ENV', 'CONDA_PREFIX', 'PYTHONPATH', 'PYTHONHOME', 'HOME', 'LANG', 'LC_ALL',
+             'GIT_DIR', 'GIT_WORK_TREE', 'NODE_ENV', 'GOPATH', 'GOFLAGS', 'CARGO_HOME')
+
+# 任意参数下都只读的程序
+_SAFE_PROGRAMS = frozenset({
+    'ls', 'dir', 'cat', 'head', 'tail', 'wc', 'du', 'df', 'find', 'grep', 'egrep', 'fgrep', 'rg', 'ag',
+    'which', 'where', 'whereis', 'uname', 'whoami', 'hostname', 'pwd', 'file', 'stat', 'tree', 'printenv',
+    'nproc', 'lscpu', 'sort', 'uniq', 'cut', 'tr', 'diff', 'cmp', 'md5sum', 'sha1sum', 'sha256sum',
+    'realpath', 'readlink', 'dirname', 'basename', 'echo', 'cloc', 'tokei', 'nl', 'column', 'jq',
+})
+# 以上程序中会写文件的选项
+_UNSAFE_OPTIONS = {
+    'find': ('-delete', '-exec', '-execdir', '-ok', '-okdir', '-fprint', '-fprint0', '-fprintf', '-fls'),
+    'sort': ('-o', '--output'),
+    'tree': ('-o',),
+}
+# 按子命令判断的程序
+_SUBCOMMANDS = {
+    'git': {'log', 'status', 'diff', 'show', 'rev-parse', 'ls-files', 'ls-tree', 'blame', 'describe',
+            'shortlog', 'cat-file', 'grep', 'branch', 'tag', 'remote', 'config', 'stash', 'rev-list', 'count-objects'},
+    'pip': {'list', 'show', 'freeze', 'check', 'index'},
+    'conda': {'list', 'info'},
+    'npm': {'ls', 'list', 'view', 'outdated', 'root', 'prefix'},
+    'yarn': {'list', 'info', 'why'},
+    'pnpm': {'ls', 'list', 'why'},
+    'cargo': {'tree', 'metadata', 'search'},
+    'go': {'version', 'env', 'list'},
+    'docker': {'images', 'version', 'info'},
+}
+_SUBCOMMANDS['pip3'] = _SUBCOMMANDS['pip']
+# 结果依赖目录下文件内容的命令：整棵目录树加入指纹，且不跨会话复用
+_TREE_PROGRAMS = frozenset({'find', 'du', 'tree', 'rg', 'ag', 'cloc', 'tokei', 'pytest', 'py.test'})
+_RECURSIVE_OPTION_PROGRAMS = frozenset({'grep', 'egrep', 'fgrep', 'ls', 'dir', 'diff'})
+_RECURSIVE_FLAG = re.compile(r'^(?:-[a-zA-Z]*[rR][a-zA-Z]*|--recursive|--dereference-recursive)$')
+_GLOB = re.compile(r'[*?\[]')
+_GIT_WORKTREE = frozenset({'status', 'diff', 'grep', 'ls-files', 'describe', 'stash', 'blame'})
+_VERSION_FLAGS = ('--version', '-V', '-version')
+_PYTHONS = re.compile(r'^(?:python[\d.]*|py)(?:\.exe)?$')
+_ASSIGNMENT = re.compile(r'^[A-Za-z_]\w*=')
+_SEPARATORS = {'|', '&&', '||', ';'}
+
+
+# ── 只读判定 ──────────────────────────────────────────────────────────────
+
+def _tokens(command: str) -> list[str] | None:
+    if '`' in command or '$(' in command or '\n' in command:
+        return None
+    lexer = shlex.shlex(command, posix=True, punctuation_chars=True)
+    lexer.whitespace_split = True
+    try:
+        return list(lexer)
+    except ValueError:
+        return None
+
+
+def _segments(tokens: list[str]) -> list[list[str]] | None:
+    """按管道 / && / ; 拆分；含重定向（>/dev/null、2>&1 除外）或后台执行时返回 None。"""
+    segments, current, i = [], [], 0
+    while i < len(tokens):
+        tok = tokens[i]
+        if tok in _SEPARATORS:
+            segments.append(current)
+            current = []
+        elif set(tok) <= set('();<>|&'):
+            target = tokens[i + 1] if i + 1 < len(tokens) else ''
+            if (tok in ('>', '>&') and target in ('/dev/null', 'nul', 'NUL')) or (tok == '>&' and target in ('1', '2')):
+                if current and current[-1] in ('1', '2'):
+                    current.pop()   # 文件描述符编号，如 2>&1
+                i += 2
+                continue
+            return None
+        else:
+            current.append(tok)
+        i += 1
+    segments.append(current)
+    return segments if all(segments) else None
+
+
+def _git_read_only(args: list[str]) -> bool:
+    while args and args[0] in ('-C', '--no-pager', '-P'):
+        args = args[2:] if args[0] == '-C' else args[1:]
+    if not args or args[0] not in _SUBCOMMANDS['git']:
+        return False
+    sub, rest = args[0], args[1:]
+    flags = [a for a in rest if a.startswith('-')]
+    match sub:
+        case 'branch':
+            return len(flags) == len(rest) and not any(
+                f in ('-d', '-D', '-m', '-M', '-c', '-C', '-f', '-u', '--delete', '--move', '--copy', '--force',
+                      '--edit-description', '--unset-upstream') or f.startswith('--set-upstream') for f in flags)
+        case 'tag':
+            return not rest or rest[0] in ('-l', '--list') or (len(flags) == len(rest) and
+                                                              not any(f in ('-d', '--delete', '-f', '-a', '-s', '-m') for f in flags))
+        case 'remote':
+            return not rest or rest == ['-v'] or rest[0] in ('show', 'get-url')
+        case 'config':
+            return any(f in ('--get', '--get-all', '--get-regexp', '--list', '-l') for f in flags)
+        case 'stash':
+            return bool(rest) and rest[0] in ('list', 'show')
+    return True
+
+
+def _segment_read_only(words: list[str]) -> bool:
+    while words and _ASSIGNMENT.match(words[0]):
+        words = words[1:]
+    if not words:
+        return False
+    prog = os.path.basename(words[0]).lower()
+    if prog.endswith('.exe'):
+        prog = prog[:-4]
+    args = words[1:]
+    if len(args) == 1 and args[0] in _VERSION_FLAGS:
+        return True
+    if prog in _SAFE_PROGRAMS:
+        unsafe = _UNSAFE_OPTIONS.get(prog, ())
+        return not any(a in unsafe or a.split('=')[0] in unsafe for a in args)
+    if prog == 'sed':
+        return not any(a.startswith('-i') or a.startswith('--in-place') for a in args) and bool(args)
+    if prog == 'git':
+        return _git_read_only(args)
+    if _PYTHONS.match(prog):
+        if len(args) >= 2 and args[0] == '-m' and args[1] in ('pip', 'pytest'):
+            return _segment_read_only(args[1:])
+        return False
+    if prog in ('pytest', 'py.test'):
+        return any(a in ('--collect-only', '--co') for a in args)
+    subcommands = _SUBCOMMANDS.get(prog)
+    return bool(subcommands) and bool(args) and args[0] in subcommands
+
+
+def is_read_only(command: str) -> bool:
+    """判断命令是否为可缓存的只读命令。"""
+    tokens = _tokens(command.strip())
+    if not tokens:
+        return False
+    segments = _segments(tokens)
+    return segments is not None and all(_segment_read_only(s) for s in segments)
+
+
+# ── 缓存键与监视路径指纹 ──────────────────────────────────────────────────
+
+def _key(command: str, cwd: str, env: dict[str, str]) -> str:
+    names = set(_ENV_KEYS) | set(re.findall(r'\$\{?(\w+)', command))
+    subset = {k: env.get(k) for k in sorted(names) if env.get(k) is not None}
+    raw = json.dumps([command.strip(), os.path.abspath(cwd), subset], ensure_ascii=False)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def _git_dir(start: str) -> tuple[str, str] | None:
+    """返回 (工作树根目录, git 目录)；不在 git 仓库中时返回 None。"""
+    path = start
+    while True:
+        candidate = os.path.join(path, '.git')
+        if os.path.isdir(candidate):
+            return path, candidate
+        if os.path.isfile(candidate):
+            try:
+                with open(candidate, encoding='utf-8') as f:
+                    line = f.read().strip()
+            except OSError:
+                return None
+            if line.startswith('gitdir:'):
+                return path, os.path.normpath(os.path.join(path, line[7:].strip()))
+            return None
+        parent = os.path.dirname(path)
+        if parent == path:
+            return None
+        path = parent
+
+
+def _site_packages(prog: str, env: dict[str, str]) -> list[str]:
+    """程序所在环境的 site-packages 与 conda-meta（安装 / 卸载包时其目录 mtime 变化）。"""
+    exe = shutil.which(prog, path=env.get('PATH'))
+    if not exe:
+        return []
+    prefix = os.path.dirname(os.path.dirname(os.path.abspath(exe)))
+    paths = [exe, os.path.join(prefix, 'conda-meta'), os.path.join(prefix, 'Lib', 'site-packages')]
+    paths += glob.glob(os.path.join(prefix, 'lib', 'python*', 'site-packages'))
+    return paths
+
+
+def _tree_roots(args: list[str], cwd: str) -> list[str]:
+    """递归命令遍历的目录：参数中存在的目录，没有时为工作目录。"""
+    roots = [os.path.join(cwd, os.path.expanduser(a)) for a in args if not a.startswith('-')]
+    return [r for r in roots if os.path.isdir(r)] or [cwd]
+
+
+def _watched_paths(command: str, cwd: str, env: dict[str, str]) -> tuple[list[str], list[str], bool]:
+    """返回 (比较 mtime / 大小的路径, 需要逐文件比较的目录树, 是否含通配符参数)。
+
+    目录的 mtime 只在增删文件时变化，原地修改文件不会反映出来；结果依赖目录下文件内容的命令
+    （grep -r、find、du、git status / diff、pytest --collect-only 等）把目录树整体加入指纹。
+    通配符参数（*.txt）由 shell 展开，这里监视当前匹配到的文件及其所在目录。
+    """
+    paths, trees, globbed = [cwd], [], False
+    for words in _segments(_tokens(command) or []) or []:
+        while words and _ASSIGNMENT.match(words[0]):
+            words = words[1:]
+        prog = os.path.basename(words[0]).lower()
+        args = words[1:]
+        if _PYTHONS.match(prog) and len(args) >= 2 and args[0] == '-m':
+            paths += _site_packages(words[0], env)
+            prog, args = args[1], args[2:]
+        if prog == 'git':
+            base = args[args.index('-C') + 1] if '-C' in args[:-1] else '.'
+            repo = _git_dir(os.path.join(cwd, base))
+            if repo:
+                worktree, git_dir = repo
+                paths += [os.path.join(git_dir, name)
+                          for name in ('HEAD', 'index', 'packed-refs', 'FETCH_HEAD', os.path.join('logs', 'HEAD'))]
+                if _GIT_WORKTREE & set(args):
+                    trees.append(worktree)
+        elif prog in ('pip', 'pip3', 'conda', 'pytest', 'py.test') or _PYTHONS.match(prog):
+            paths += _site_packages(words[0], env)
+        elif prog in ('npm', 'yarn', 'pnpm'):
+            paths += [os.path.join(cwd, n) for n in ('package.json', 'package-lock.json', 'yarn.lock',
+                                                     'pnpm-lock.yaml', 'node_modules')]
+        elif prog == 'cargo':
+            paths += [os.path.join(cwd, n) for n in ('Cargo.toml', 'Cargo.lock')]
+        elif prog == 'go':
+            paths += [os.path.join(cwd, n) for n in ('go.mod', 'go.sum')]
+        if prog in _TREE_PROGRAMS or (prog in _RECURSIVE_OPTION_PROGRAMS and any(_RECURSIVE_FLAG.match(a) for a in args)):
+            trees += _tree_roots(args, cwd)
+        for arg in args:
+            if arg.startswith('-') or arg in paths:
+                continue
+            path = os.path.join(cwd, os.path.expanduser(arg))
+            if _GLOB.search(arg):
+                globbed = True
+                paths.append(os.path.dirname(path))
+                paths += sorted(glob.glob(path))
+            elif os.path.exists(path):
+                paths.append(path)
+    return paths, list(dict.fromkeys(trees)), globbed
+
+
+def _hash_tree(root: str, h) -> bool:
+    """把目录树中每个文件的相对路径、mtime 与大小加入 h；文件数超过 MAX_TREE_FILES 时返回 False。"""
+    count = 0
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        try:
+            with os.scandir(directory) as it:
+                entries = sorted(it, key=lambda e: e.name)
+        except OSError:
+            continue
+        for entry in entries:
+            if entry.name == '.git':
+                continue
+            try:
+                st = entry.stat(follow_symlinks=False)
+            except OSError:
+                continue
+            h.update(f'{entry.path}:{st.st_mtime_ns}:{st.st_size}\n'.encode('utf-8', 'surrogatepass'))
+            if entry.is_dir(follow_symlinks=False):
+                stack.append(entry.path)
+            else:
+                count += 1
+                if count > MAX_TREE_FILES:
+                    return False
+    return True
+
+
+def _fingerprint(command: str, cwd: str, env: dict[str, str]) -> tuple[str | None, bool]:
+    """返回 (指纹, 是否只能在本进程内复用)；目录树过大无法比较时指纹为 None（不缓存）。
+
+    依赖目录树或含通配符参数的命令只在本进程内复用，不写入磁盘。
+    """
+    paths, trees, globbed = _watched_paths(command, cwd, env)
+    h = hashlib.sha1()
+    for path in paths:
+        try:
+            st = os.stat(path)
+            h.update(f'{path}:{st.st_mtime_ns}:{st.st_size}\n'.encode('utf-8', 'surrogatepass'))
+        except OSError:
+            h.update(f'{path}:-\n'.encode('utf-8', 'surrogatepass'))
+    for root in trees:
+        h.update(f'[{root}]\n'.encode('utf-8', 'surrogatepass'))
+        if not _hash_tree(root, h):
+            return None, True
+    return h.hexdigest(), bool(trees) or globbed
+
+
+# ── 缓存表 ────────────────────────────────────────────────────────────────
+
+_lock = threading.Lock()
+_entries: dict[str, dict] | None = None
+# 本模块按需导入：导入之前工具已写入过文件时，磁盘上的条目（代数 0）一开始就无效
+_generation = 1 if change_count() else 0
+
+
+def _cfg() -> dict:
+    try:
+        from config import get_config
+        return get_config()
+    except Exception:
+        return {}
+
+
+def cache_enabled() -> bool:
+    return bool(_cfg().get('command_cache', False))
+
+
+def _load() -> dict[str, dict]:
+    """调用方需持有 _lock。
+
+    从磁盘载入的条目归入进程启动时的代数 0（无论何时载入），本进程之后任何一次失效都会使其作废。
+    """
+    global _entries
+    if _entries is None:
+        try:
+            with open(_CACHE_FILE, 'r', encoding='utf-8') as f:
+                _entries = json.load(f)
+        except (OSError, ValueError):
+            _entries = {}
+        for entry in _entries.values():
+            entry['generation'] = 0
+    return _entries
+
+
+def _save():
+    """只持久化可跨会话复用的条目（不依赖目录树、不含通配符参数的命令）。"""
+    from script.fileio import atomic_write
+    data = {k: {f: v for f, v in e.items() if f != 'generation'} for k, e in _entries.items() if e.get('shared')}
+    try:
+        atomic_write(_CACHE_FILE, json.dumps(data, ensure_ascii=False))
+    except OSError as e:
+        log(f'command_cache | 保存失败: {e}')
+
+
+def invalidate(reason: str = ''):
+    """工作区可能已变化：递增代数，使之前的缓存条目全部失效。"""
+    global _generation
+    with _lock:
+        _generation += 1
+    if reason:
+        log(f'command_cache | 失效（{reason}）')
+
+
+def _on_changed(abs_path: str):
+    invalidate()
+
+
+def _lookup(key: str, command: str, cwd: str, env: dict[str, str]) -> dict | None:
+    ttl = float(_cfg().get('command_cache_ttl', DEFAULT_TTL))
+    with _lock:
+        entry = _load().get(key)
+        if entry is None:
+            return None
+        valid = time.time() - entry['created'] <= ttl and entry.get('generation') == _generation
+    if valid:
+        valid = entry['fingerprint'] == _fingerprint(command, cwd, env)[0]
+    with _lock:
+        if not valid:
+            _entries.pop(key, None)
+            return None
+        entry['last_access'] = time.time()
+        return entry
+
+
+def _store(key: str, command: str, cwd: str, env: dict[str, str], output: str, generation: int):
+    if len(output) > MAX_OUTPUT_CHARS:
+        return
+    fingerprint, local = _fingerprint(command, cwd, env)
+    if fingerprint is None:
+        return   # 目录树过大
+    with _lock:
+        if generation != _generation:
+            return   # 执行期间工作区发生了变化
+        entries = _load()
+        now = time.time()
+        entries[key] = {'command': command, 'cwd': cwd, 'output': output, 'created': now, 'last_access': now,
+                        'fingerprint': fingerprint, 'shared': not local, 'generation': generation}
+        if len(entries) > MAX_ENTRIES:
+            for old, _ in sorted(entries.items(), key=lambda kv: kv[1]['last_access'])[:len(entries) - MAX_ENTRIES]:
+                del entries[old]
+        if not local:
+            _save()
+
+
+def _succeeded(output: str) -> bool:
+    return output.rsplit('\n', 1)[-1].startswith('[资源] 退出码 0')
+
+
+def run_command(command: str, inputs=None) -> str:
+    """system_command 的缓存入口：只读命令优先使用缓存，其余命令照常执行并使缓存失效。"""
+    from script.system import get_cwd, get_env, system_command
+
+    if not cache_enabled():
+        return system_command(command, inputs=inputs)
+    if inputs is not None or not is_read_only(command):
+        invalidate()
+        output = system_command(command, inputs=inputs)
+        invalidate()
+        return output
+    if 'script.jobs' in sys.modules and sys.modules['script.jobs'].has_running_jobs():
+        return system_command(command, inputs=inputs)
+
+    cwd, env = get_cwd(), get_env()
+    key = _key(command, cwd, env)
+    entry = _lookup(key, command, cwd, env)
+    if entry is not None:
+        age = int(time.time() - entry['created'])
+        log(f'command_cache | 命中: {command}（{age} 秒前）')
+        return f'[缓存结果] {age} 秒前的执行结果（只读命令，相关文件未变化，未重新执行）\n{entry["output"]}'
+    generation = _generation
+    output = system_command(command, inputs=inputs)
+    if _succeeded(output):
+        _store(key, command, cwd, env, output, generation)
+    return output
+
+
+add_change_listener(_on_changed)
@@ -0,0 +1,123 @@
+"""
+delegate.py —— 子任务委派：主 Bot 将相互独立的子任务交给子 Bot 并发执行。
+
+每个子 Bot：
+    - 运行在有界线程池中（config: delegate_workers，默认 4）；
+    - 拥有独立的对话历史，以及从父会话复制的 Session（工作目录、超时、环境变量），
+      切换目录等操作不影响父会话；浏览器使用自己的 BrowserContext 与页面；
+    - 只能使用受限的工具集（不含 delegate 与 ask_user，不会递归委派或阻塞等待用户；
+      工具列表固定，不做分组，列表之外的工具调用会被拒绝）。
+
+子 Bot 的中间工具调用不进入父 Bot 的历史，父 Bot 只收到每个子任务的结果摘要
+（最后一条文本回复，截断到 delegate_result_chars 字符）。
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+from config import get_config, new_working_config
+from script.logger import log, user_log
+from script.session import Session, current, use_session
+
+# 子 Bot 不可使用的工具
+CHILD_EXCLUDED_TOOLS = frozenset({'delegate', 'ask_user', 'enable_tools'})
+
+_CHILD_PROMPT = (
+    '\n\n你是主助手派出的子助手，只负责完成下面这一个子任务，不能向用户提问。'
+    '完成后用简洁的文字汇报结果（关键数据、结论、生成的文件路径），然后调用 finish。'
+    '汇报内容会直接交给主助手，不要复述过程。'
+)
+
+
+def _child_session(parent: Session | None, child_id: str) -> Session:
+    """复制父会话（单会话模式下复制模块全局状态）的工作目录、超时与环境变量。
+
+    子会话与父会话共用检查点栈，子助手做出的文件修改可由父会话撤销。
+    """
+    from script.checkpoint import current_store
+    if parent is not None:
+        session = parent.copy(session_id=child_id)
+    else:
+        from script.system import get_cwd, get_env
+        working = new_working_config(get_cwd())
+        working['wait'] = get_config().get('wait', working['wait'])
+        session = Session(working, session_id=child_id)
+        session.env = get_env()
+    session.checkpoints = current_store()
+    return session
+
+
+def _child_tools(names: list[str] | None) -> tuple[list[dict], list[str]]:
+    """返回 (子 Bot 的工具列表, 被拒绝的工具名)。finish 总是可用。"""
+    from script.tools_def import get_tools, select_tools
+    allowed = [t['function']['name'] for t in get_tools()
+               if t['function']['name'] not in CHILD_EXCLUDED_TOOLS]
+    if not names:
+        return select_tools(allowed), []
+    rejected = [n for n in names if n not in allowed]
+    return select_tools({n for n in names if n in allowed} | {'finish'}), rejected
+
+
+def _run_child(index: int, spec: dict, session: Session, max_chars: int) -> dict:
+    from script.agent import AskPolicy, DEFAULT_ASK_POLICY, run_turn
+    from script.bot import Bot
+    from script.prompt_builder import build_system_prompt
+
+    tools, rejected = _child_tools(spec.get('tools'))
+    result = {'index': index, 'task': spec['task'], 'ok': False, 'reply': '',
+              'input_tokens': 0, 'output_tokens': 0, 'rounds': 0, 'rejected': rejected}
+    with use_session(session):
+        try:
+            user_log(f'子任务 {index} 开始: {spec["task"]}', role='DELEGATE')
+            child = Bot(bot_name=f'Momoka[{session.id}]', tools=tools)
+            child.set_system(build_system_prompt(grouped=False) + _CHILD_PROMPT)
+            turn = run_turn(child, spec['task'], input_func=AskPolicy(None, DEFAULT_ASK_POLICY))
+            reply = turn['reply'].strip() or '（子助手没有给出文字结果）'
+            if len(reply) > max_chars:
+                reply = reply[:max_chars] + f'…（已截断，共 {len(reply)} 字符）'
+            result.update(ok=turn['finished'], reply=reply, input_tokens=turn['input_tokens'],
+                          output_tokens=turn['output_tokens'], rounds=turn['rounds'])
+            user_log(f'子任务 {index} {"完成" if turn["finished"] else "未完成"}', role='DELEGATE')
+        except Exception as e:
+            result['reply'] = f'子任务执行出错: {type(e).__name__}: {e}'
+            log(f'delegate | 子任务 {index} 出错: {e}')
+        finally:
+            if session.jobs is not None:
+                from script.jobs import release_jobs
+                release_jobs()
+            if session.kernel is not None:
+                from script.kernel import release_kernel
+                release_kernel()
+            if session.browser is not None:
+                from script.browser import browser_release
+                browser_release()
+    return result
+
+
+def delegate(tasks: list[dict]) -> str:
+    """并发执行子任务，返回按顺序排列的结果摘要。"""
+    specs = [t if isinstance(t, dict) else {'task': str(t)} for t in tasks or []]
+    specs = [s for s in specs if str(s.get('task', '')).strip()]
+    if not specs:
+        return '没有可执行的子任务。'
+    cfg = get_config()
+    workers = max(1, min(int(cfg.get('delegate_workers', 4)), len(specs)))
+    max_chars = int(cfg.get('delegate_result_chars', 2000))
+
+    parent = current()
+    prefix = parent.id if parent is not None else 'sub'
+    sessions = [_child_session(parent, f'{prefix}.{i}') for i in range(1, len(specs) + 1)]
+    log(f'delegate | {len(specs)} 个子任务，并发 {workers}')
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='delegate') as pool:
+        results = list(pool.map(_run_child, range(1, len(specs) + 1), specs, sessions,
+                                [max_chars] * len(specs)))
+
+    lines = []
+    for r in results:
+        status = '完成' if r['ok'] else '未完成'
+        lines.append(f'[子任务 {r["index"]}] {status}（{r["rounds"]} 轮，'
+                     f'输入 {r["input_tokens"]} / 输出 {r["output_tokens"]} tokens）: {r["task"]}')
+        if r['rejected']:
+            lines.append(f'  不可用的工具已忽略: {", ".join(r["rejected"])}')
+        lines.append(r['reply'])
+        lines.append('')
+    return '\n'.join(lines).rstrip()
@@ -0,0 +1,302 @@
+"""
+downloader.py —— 流式下载管理。
+
+browse_download 的实际下载在此完成，不经过浏览器页面：
+    - 分块流式写入 <文件名>.part，不在内存中缓存整个文件；
+    - 中断后再次下载同一 URL 时，通过 Range 请求从 .part 的末尾续传
+      （携带 If-Range 校验，服务端文件变化时自动从头下载）；
+    - 多个 URL 在线程池中并发下载，Cookie 由调用方从浏览器 context 中取出传入，
+      重定向到其他主机时不再携带；
+    - 文件名在下载开始时预留：与进行中的下载、已存在的文件或其他 URL 的 .part 重名时
+      依次改用 "file (1).zip"、"file (2).zip"……，收尾时也不会覆盖已存在的文件；
+    - 通过 user_log 汇报进度，可选校验 sha256 / md5 等哈希；
+    - 超时策略独立于 wait：download_timeout 为单次读取的空闲超时（秒），
+      网络错误时最多续传重试 download_retries 次。
+"""
+
+from __future__ import annotations
+
+import hashlib
+import itertools
+import json
+import os
+import re
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import unquote, urlsplit
+
+from script.logger import log, user_log
+
+CHUNK_SIZE = 256 * 1024
+_PROGRESS_INTERVAL = 2.0
+
+_names_lock = threading.Lock()
+_active: set[str] = set()   # 进行中的下载预留的目标路径
+
+
+def _cfg() -> dict:
+    try:
+        from config import get_config
+        return get_config()
+    except Exception:
+        return {}
+
+
+def _filename_from(url: str, headers) -> str:
+    """优先使用 Content-Disposition 中的文件名，否则取 URL 路径末段。"""
+    cd = headers.get('Content-Disposition', '') if headers else ''
+    m = re.search(r"filename\*=(?:UTF-8'')?([^;]+)", cd, re.I) or re.search(r'filename="?([^";]+)"?', cd, re.I)
+    name = unquote(m.group(1).strip()) if m else unquote(os.path.basename(urlsplit(url).path))
+    name = re.sub(r'[\\/:*?"<>|]', '_', name).strip()
+    return name or f'download_{int(time.time())}'
+
+
+def _candidates(name: str):
+    """name, "name (1).ext", "name (2).ext", ……"""
+    yield name
+    stem, ext = os.path.splitext(name)
+    for i in itertools.count(1):
+        yield f'{stem} ({i}){ext}'
+
+
+def _taken(path: str, url: str) -> bool:
+    """目标路径是否已被占用：进行中的下载、已存在的文件，或属于其他 URL 的 .part。"""
+    if path in _active or os.path.exists(path):
+        return True
+    try:
+        with open(path + '.part.json', 'r', encoding='utf-8') as f:
+            return json.load(f).get('url') != url
+    except FileNotFoundError:
+        return os.path.exists(path + '.part')
+    except (OSError, ValueError):
+        return True
+
+
+def _reserve(save_dir: str, name: str, url: str) -> str:
+    """为本次下载预留一个不冲突的文件名。"""
+    with _names_lock:
+        for candidate in _candidates(name):
+            path = os.path.join(save_dir, candidate)
+            if not _taken(path, url):
+                _active.add(path)
+                return candidate
+
+
+def _resumable(save_dir: str, url: str) -> str | None:
+    """查找同一 URL 未完成的 .part（且没有其他下载正在使用），找到时预留并返回其文件名。"""
+    with _names_lock:
+        for sf in os.listdir(save_dir):
+            if not sf.endswith('.part.json'):
+                continue
+            path = os.path.join(save_dir, sf[:-len('.part.json')])
+            if path in _active:
+                continue
+            try:
+                with open(path + '.part.json', 'r', encoding='utf-8') as f:
+                    if json.load(f).get('url') != url:
+                        continue
+            except (OSError, ValueError):
+                continue
+            _active.add(path)
+            return os.path.basename(path)
+    return None
+
+
+def _finalize(part_path: str, save_dir: str, name: str) -> str:
+    """把 .part 重命名为最终文件；同名文件已存在（下载期间新出现）时加序号，不覆盖。"""
+    with _names_lock:
+        for candidate in _candidates(name):
+            path = os.path.join(save_dir, candidate)
+            if not os.path.exists(path) and (candidate == name or path not in _active):
+                os.replace(part_path, path)
+                return path
+
+
+def _parse_checksum(checksum: str | None) -> tuple[str, str] | None:
+    """'sha256:<hex>' / 'md5:<hex>' / 裸 hex（按长度推断算法）。"""
+    if not checksum:
+        return None
+    if ':' in checksum:
+        algo, digest = checksum.split(':', 1)
+        return algo.strip().lower(), digest.strip().lower()
+    digest = checksum.strip().lower()
+    algo = {32: 'md5', 40: 'sha1', 64: 'sha256', 128: 'sha512'}.get(len(digest), 'sha256')
+    return algo, digest
+
+
+def _fmt_size(n: float) -> str:
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if n < 1024 or unit == 'GB':
+            return f'{n:.1f} {unit}' if unit != 'B' else f'{int(n)} B'
+        n /= 1024
+    return f'{n:.1f} GB'
+
+
+# 跨主机重定向时不转发的请求头（Cookie 取自原 URL 所在站点）
+_CREDENTIAL_HEADERS = ('Cookie', 'Authorization')
+
+
+class _RedirectHandler(urllib.request.HTTPRedirectHandler):
+    """重定向到其他主机时去掉 Cookie / Authorization，避免凭据泄露给第三方站点。"""
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        new = super().redirect_request(req, fp, code, msg, headers, newurl)
+        if new is not None and urlsplit(newurl).hostname != urlsplit(req.full_url).hostname:
+            for name in _CREDENTIAL_HEADERS:
+                new.remove_header(name)
+        return new
+
+
+_opener = urllib.request.build_opener(_RedirectHandler)
+
+
+def _open(url: str, headers: dict, timeout: float):
+    req = urllib.request.Request(url, headers=headers)
+    return _opener.open(req, timeout=timeout)
+
+
+def download_one(url: str, save_dir: str, cookie: str = '', checksum: str | None = None,
+                 user_agent: str = '') -> dict:
+    """下载单个 URL，返回结果字典 {'url', 'ok', 'path', 'size', 'message'}。"""
+    cfg = _cfg()
+    idle_timeout = float(cfg.get('download_timeout', 30))
+    retries = int(cfg.get('download_retries', 3))
+    expected = _parse_checksum(checksum)
+
+    save_dir = os.path.abspath(save_dir)
+    os.makedirs(save_dir, exist_ok=True)
+    base_headers = {'User-Agent': user_agent or 'Mozilla/5.0', 'Accept-Encoding': 'identity'}
+    if cookie:
+        base_headers['Cookie'] = cookie
+
+    # .part 文件名依赖响应头，先不带 Range 探测一次；续传时复用记录的文件名
+    name = _resumable(save_dir, url)
+
+    try:
+        attempt = 0
+        while True:
+            attempt += 1
+            part_path = os.path.join(save_dir, name + '.part') if name else None
+            state_path = part_path + '.json' if part_path else None
+            offset = os.path.getsize(part_path) if part_path and os.path.exists(part_path) else 0
+            validator = ''
+            if offset and state_path and os.path.exists(state_path):
+                try:
+                    with open(state_path, 'r', encoding='utf-8') as f:
+                        validator = json.load(f).get('validator', '')
+                except (OSError, ValueError):
+                    validator = ''
+
+            headers = dict(base_headers)
+            if offset:
+                headers['Range'] = f'bytes={offset}-'
+                if validator:
+                    headers['If-Range'] = validator
+
+            try:
+                resp = _open(url, headers, idle_timeout)
+            except urllib.error.HTTPError as e:
+                if e.code == 416 and offset:
+                    # 已下载完整，直接收尾
+                    resp = None
+                else:
+                    return {'url': url, 'ok': False, 'path': None, 'size': 0,
+                            'message': f'HTTP {e.code} {e.reason}', 'status': e.code}
+            except Exception as e:
+                if attempt <= retries:
+                    log(f'downloader | {url} connect error ({e}), retry {attempt}/{retries}')
+                    time.sleep(min(2 ** attempt, 10))
+                    continue
+                return {'url': url, 'ok': False, 'path': None, 'size': 0, 'message': str(e)}
+
+            if resp is not None:
+                if name is None:
+                    name = _reserve(save_dir, _filename_from(resp.geturl(), resp.headers), url)
+                    part_path = os.path.join(save_dir, name + '.part')
+                    state_path = part_path + '.json'
+                resumed = resp.status == 206 and offset > 0
+                if not resumed:
+                    offset = 0
+                total = resp.headers.get('Content-Length')
+                total = int(total) + offset if total and total.isdigit() else None
+                with open(state_path, 'w', encoding='utf-8') as f:
+                    json.dump({'url': url, 'validator': resp.headers.get('ETag') or resp.headers.get('Last-Modified') or ''}, f)
+                if resumed:
+                    log(f'downloader | resume {url} from {offset}')
+                    user_log(f'续传 {name}: 已有 {_fmt_size(offset)}', role='BROWSER')
+
+                done = offset
+                last_report = time.time()
+                last_done = done
+                try:
+                    with resp, open(part_path, 'ab' if resumed else 'wb') as out:
+                        for chunk in iter(lambda: resp.read(CHUNK_SIZE), b''):
+                            out.write(chunk)
+                            done += len(chunk)
+                            now = time.time()
+                            if now - last_report >= _PROGRESS_INTERVAL:
+                                speed = (done - last_done) / (now - last_report)
+                                pct = f'{done * 100 // total}% ' if total else ''
+                                of_total = f'/{_fmt_size(total)}' if total else ''
+                                user_log(f'下载中 {name}: {pct}({_fmt_size(done)}{of_total}, {_fmt_size(speed)}/s)',
+                                         role='BROWSER')
+                                last_report, last_done = now, done
+                except Exception as e:
+                    if attempt <= retries:
+                        log(f'downloader | {url} interrupted at {done} ({e}), retry {attempt}/{retries}')
+                        continue
+                    return {'url': url, 'ok': False, 'path': None, 'size': done,
+                            'message': f'下载中断（已保存 {_fmt_size(done)}，再次下载可续传）: {e}'}
+                if total is not None and done < total:
+                    if attempt <= retries:
+                        continue
+                    return {'url': url, 'ok': False, 'path': None, 'size': done,
+                            'message': f'下载不完整（{_fmt_size(done)}/{_fmt_size(total)}，再次下载可续传）'}
+
+            # ── 收尾：校验哈希并重命名 ──
+            message = ''
+            if expected:
+                algo, digest = expected
+                try:
+                    h = hashlib.new(algo)
+                except ValueError:
+                    return {'url': url, 'ok': False, 'path': None, 'size': 0, 'message': f'不支持的哈希算法: {algo}'}
+                with open(part_path, 'rb') as f:
+                    for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                        h.update(chunk)
+                if h.hexdigest() != digest:
+                    os.remove(part_path)
+                    os.remove(state_path)
+                    return {'url': url, 'ok': False, 'path': None, 'size': 0,
+                            'message': f'{algo} 校验失败（期望 {digest}，实际 {h.hexdigest()}），已删除下载文件'}
+                message = f'{algo} 校验通过'
+            final_path = _finalize(part_path, save_dir, name)
+            if os.path.basename(final_path) != name:
+                message = f'{message}；' if message else ''
+                message += f'同名文件已存在，保存为 {os.path.basename(final_path)}'
+            if os.path.exists(state_path):
+                os.remove(state_path)
+            size = os.path.getsize(final_path)
+            log(f'downloader | saved {url} → {final_path} ({size} bytes)')
+            return {'url': url, 'ok': True, 'path': final_path, 'size': size, 'message': message}
+    finally:
+        if name is not None:
+            with _names_lock:
+                _active.discard(os.path.join(save_dir, name))
+
+
+def download_many(items: list[dict], save_dir: str, user_agent: str = '') -> list[dict]:
+    """并发下载多个文件。items 中每项为 {'url', 'cookie', 'checksum'}，结果顺序与输入一致。"""
+    workers = max(1, int(_cfg().get('download_workers', 4)))
+    if len(items) == 1:
+        it = items[0]
+        return [download_one(it['url'], save_dir, it.get('cookie', ''), it.get('checksum'), user_agent)]
+    with ThreadPoolExecutor(max_workers=min(workers, len(items))) as pool:
+        futures = [
+            pool.submit(download_one, it['url'], save_dir, it.get('cookie', ''), it.get('checksum'), user_agent)
+            for it in items
+        ]
+        return [f.result() for f in futures]
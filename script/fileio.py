@@ -0,0 +1,207 @@
+"""
+fileio.py —— 原子文件写入。
+
+所有会修改文件的工具都通过这里落盘：先写入同目录下的临时文件并 fsync，
+再用 os.replace 原子替换目标文件，写入过程中崩溃不会留下被截断的文件。
+目标为符号链接时写入其指向的文件（链接本身保留），并尽量保留原文件的属主与权限位；
+目标还有其他硬链接时改为把临时文件的内容原地写回，保持各链接共享同一份内容。
+追加（atomic_append）例外：原地追加，失败时截断回原长度。
+atomic_write_many 在多个文件间提供“全部成功或全部回滚”的语义。
+本模块只依赖标准库，可在子进程（如 bulk_replace 的进程池）中直接导入。
+"""
+
+from __future__ import annotations
+
+import codecs
+import os
+import shutil
+import tempfile
+
+# 检查点以硬链接方式快照过的 inode (st_dev, st_ino)：这些额外链接属于快照，写入时仍须 rename
+_snapshot_links: set[tuple[int, int]] = set()
+
+
+def note_snapshot_link(st: os.stat_result):
+    """记录检查点为该文件建立了硬链接快照（见 checkpoint.snapshot_file）。"""
+    _snapshot_links.add((st.st_dev, st.st_ino))
+
+
+def is_snapshot_link(st: os.stat_result) -> bool:
+    return (st.st_dev, st.st_ino) in _snapshot_links
+
+
+def _shared(st: os.stat_result | None) -> bool:
+    """目标文件还有其他硬链接（检查点快照除外）：rename 会使其脱离，须原地写入。"""
+    return st is not None and st.st_nlink > 1 and not is_snapshot_link(st)
+
+
+def _stat(path: str) -> os.stat_result | None:
+    try:
+        return os.stat(path)
+    except FileNotFoundError:
+        return None
+
+
+def _copy_into(src: str, path: str):
+    """把 src 的内容原地写入 path（保留 inode、属主与权限）并 fsync。"""
+    with open(src, 'rb') as f, open(path, 'r+b') as out:
+        shutil.copyfileobj(f, out, 1 << 20)
+        out.truncate()
+        out.flush()
+        os.fsync(out.fileno())
+
+
+def _copy_metadata(tmp: str, st: os.stat_result):
+    """让临时文件继承原文件的属主（权限允许时）与权限位。chown 会清除 setuid 位，须先于 chmod。"""
+    if hasattr(os, 'chown') and (st.st_uid, st.st_gid) != (os.getuid(), os.getgid()):
+        try:
+            os.chown(tmp, st.st_uid, st.st_gid)
+        except OSError:
+            pass
+    os.chmod(tmp, st.st_mode & 0o7777)
+
+
+def _write_temp(path: str, text: str, encoding: str, newline: str | None = None) -> str:
+    """在目标文件同目录写入临时文件，返回临时文件路径。newline 同内置 open。"""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(prefix='.' + os.path.basename(path) + '.', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'w', encoding=encoding, newline=newline) as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    return tmp
+
+
+def install(tmp: str, path: str):
+    """用写好并 fsync 过的临时文件 tmp（与 path 同目录）替换 path，path 须已解析符号链接。
+
+    path 不存在或只有一个链接时继承其属主、权限后 rename；还有其他硬链接时原地写回并删除 tmp
+    （此时不是原子的，但各链接保持一致）。失败时 tmp 已被删除。
+    """
+    try:
+        st = _stat(path)
+        if _shared(st):
+            _copy_into(tmp, path)
+            os.unlink(tmp)
+            return
+        if st is not None:
+            _copy_metadata(tmp, st)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+
+def atomic_write(path: str, text: str, encoding: str = 'utf-8', newline: str | None = None):
+    """原子地将 text 写入 path（创建或覆盖）。
+
+    newline 同内置 open：默认把 '\\n' 转换为系统换行符；传入 '' 时原样写入
+    （text 保留了原文件的 '\\r\\n' 时使用，避免在 Windows 上变成 '\\r\\r\\n'）。
+    """
+    path = os.path.realpath(path)
+    install(_write_temp(path, text, encoding, newline), path)
+
+
+def append_encoder(encoding: str, size: int):
+    """追加写入用的增量编码器：目标文件非空时不再写入 BOM（utf-16、utf-8-sig 等），同文本模式 'a'。"""
+    encoder = codecs.getincrementalencoder(encoding)()
+    if size:
+        encoder.setstate(0)
+    return encoder
+
+
+def atomic_append(path: str, text: str, encoding: str = 'utf-8'):
+    """将 text 追加到 path 末尾（文件不存在时创建）。
+
+    原地追加并 fsync，开销与原文件大小无关；写入失败时截断回原长度。
+    原地修改会改写硬链接快照共享的 inode，因此追加前的检查点须以复制 / reflink 方式建立
+    （checkpoint(..., link=False)）。
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    if os.linesep != '\n':
+        text = text.replace('\n', os.linesep)   # 与文本模式写入的换行一致
+    with open(path, 'ab') as f:
+        size = f.tell()
+        data = append_encoder(encoding, size).encode(text, final=True)
+        try:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        except BaseException:
+            f.truncate(size)
+            raise
+
+
+def atomic_write_many(writes: dict[str, str | None], encoding: str = 'utf-8'):
+    """原子地写入多个文件：值为 None 表示删除该文件（删除的是链接本身）。
+
+    先为所有文件写好临时文件，再逐个替换；任何一步失败都会把已替换的文件恢复原状。
+    写入符号链接时写入其指向的文件；还有其他硬链接的文件原地写入，回滚时从备份副本写回。
+    """
+    writes = {(os.path.realpath(p) if t is not None else os.path.abspath(p)): t for p, t in writes.items()}
+    temps: dict[str, str] = {}
+    backups: dict[str, str | None] = {}   # path -> 备份文件路径（None 表示原先不存在）
+    in_place: set[str] = set()            # 原地写入的文件，备份是副本
+    done: list[str] = []
+    try:
+        for path, text in writes.items():
+            if text is not None:
+                temps[path] = _write_temp(path, text, encoding)
+        for path in writes:
+            st = _stat(path)
+            if st is not None:
+                directory = os.path.dirname(path)
+                fd, bak = tempfile.mkstemp(prefix='.' + os.path.basename(path) + '.', suffix='.bak', dir=directory)
+                os.close(fd)
+                try:
+                    if path in temps and _shared(st):
+                        shutil.copyfile(path, bak)
+                        in_place.add(path)
+                    else:
+                        os.replace(path, bak)
+                except BaseException:
+                    os.unlink(bak)
+                    raise
+                backups[path] = bak
+                if path in temps and path not in in_place:
+                    _copy_metadata(temps[path], st)
+            else:
+                backups[path] = None
+            if path in in_place:
+                _copy_into(temps[path], path)
+                os.unlink(temps.pop(path))
+            elif path in temps:
+                os.replace(temps.pop(path), path)
+            done.append(path)
+    except BaseException:
+        for path in reversed(done):
+            bak = backups.get(path)
+            if path in in_place:
+                _copy_into(bak, path)
+                os.unlink(bak)
+            elif bak is not None:
+                os.replace(bak, path)
+            elif os.path.exists(path):
+                os.unlink(path)
+        for path, bak in backups.items():
+            if path in done or bak is None:
+                continue
+            if path in in_place:
+                # 原地写入途中失败：从副本写回
+                _copy_into(bak, path)
+                os.unlink(bak)
+            else:
+                os.replace(bak, path)
+        for tmp in temps.values():
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+        raise
+    for bak in backups.values():
+        if bak is not None:
+            os.unlink(bak)
@@ -0,0 +1,105 @@
+"""
+history.py —— 对话历史中文件内容的去重存储。
+
+read_file / get_skill 返回的文件内容会嵌入工具结果消息。为避免同一内容在内存中保存多份：
+    - BlobStore 按内容散列寻址并引用计数，同一文件的同一版本只保存一份文本；
+    - 含文件内容的消息以 FileEntry 记录保存：消息文本拆成 (文本片段 | Blob) 序列，
+      只在发送请求时拼接成字符串（见 Bot._messages），请求结束后即释放；
+    - Bot 维护 {文件名: [FileEntry]} 索引，折叠旧的文件内容只需访问这些记录，
+      并把其中的 Blob 替换为占位文本、释放引用。
+"""
+
+from __future__ import annotations
+
+import hashlib
+
+
+class Blob:
+    __slots__ = ('digest', 'text', 'refs')
+
+    def __init__(self, digest: bytes, text: str):
+        self.digest = digest
+        self.text = text
+        self.refs = 0
+
+
+class BlobStore:
+    """按内容散列寻址、引用计数的文本存储。"""
+
+    def __init__(self):
+        self._blobs: dict[bytes, Blob] = {}
+
+    def put(self, text: str) -> Blob:
+        """存入文本并增加引用；内容已存在时复用已有的 Blob（调用方持有的副本随之可被回收）。"""
+        digest = hashlib.blake2b(text.encode('utf-8', 'surrogatepass'), digest_size=16).digest()
+        blob = self._blobs.get(digest)
+        if blob is None:
+            blob = self._blobs[digest] = Blob(digest, text)
+        blob.refs += 1
+        return blob
+
+    def release(self, blob: Blob):
+        blob.refs -= 1
+        if blob.refs <= 0:
+            self._blobs.pop(blob.digest, None)
+
+    def __len__(self) -> int:
+        return len(self._blobs)
+
+    def total_chars(self) -> int:
+        return sum(len(b.text) for b in self._blobs.values())
+
+
+class FileEntry:
+    """含文件内容的历史消息。segments 为文本片段与 Blob 的序列，files 为 {文件名: segments 中的下标}。"""
+    __slots__ = ('role', 'tool_call_id', 'segments', 'files')
+
+    def __init__(self, role: str, tool_call_id: str | None, segments: list, files: dict[str, int]):
+        self.role = role
+        self.tool_call_id = tool_call_id
+        self.segments = segments
+        self.files = files
+
+    @classmethod
+    def build(cls, store: BlobStore, message: dict, file_contents: dict[str, str]) -> FileEntry | None:
+        """在消息文本中定位各文件内容并存入 store；一个都找不到时返回 None（按普通消息保存）。"""
+        text = message['content']
+        found = []
+        for filename, content in file_contents.items():
+            pos = text.find(content) if content else -1
+            if pos >= 0:
+                found.append((pos, filename, content))
+        found.sort()
+        segments, files, cursor = [], {}, 0
+        for pos, filename, content in found:
+            if pos < cursor:
+                continue   # 与前一个文件内容重叠（如同一内容以两个文件名出现）
+            if pos > cursor:
+                segments.append(text[cursor:pos])
+            files[filename] = len(segments)
+            segments.append(store.put(content))
+            cursor = pos + len(content)
+        if not files:
+            return None
+        if cursor < len(text):
+            segments.append(text[cursor:])
+        return cls(message['role'], message.get('tool_call_id'), segments, files)
+
+    @property
+    def content(self) -> str:
+        return ''.join(s if isinstance(s, str) else s.text for s in self.segments)
+
+    def as_message(self) -> dict:
+        msg = {'role': self.role, 'content': self.content}
+        if self.tool_call_id is not None:
+            msg['tool_call_id'] = self.tool_call_id
+        return msg
+
+    def fold(self, store: BlobStore, filename: str, placeholder: str) -> bool:
+        """将指定文件的内容替换为占位文本并释放 Blob，返回是否发生了替换。"""
+        index = self.files.pop(filename, None)
+        if index is None:
+            return False
+        store.release(self.segments[index])
+        self.segments[index] = placeholder
+        return True
@@ -0,0 +1,454 @@
+"""
+http_fetch.py —— 不经过浏览器的 HTTP 快速通道。
+
+browse_open 会先用本模块对目标 URL 发起一次普通 GET：
+    - 静态 HTML / 纯文本页面直接解析为与 browser_read 相同的
+      [INTERACTIVE|标签|选择器|文字] 文本格式，无需启动 Chromium；
+    - 若判断页面依赖 JavaScript 渲染（正文为空、noscript 提示、SPA 挂载点等），
+      则交由 Playwright 处理。
+
+连接池：
+    按 (scheme, host, port) 复用 http.client 长连接（keep-alive），
+    同一站点的后续请求无需重新握手。连接池以锁保护，可在多线程中共享。
+"""
+
+from __future__ import annotations
+
+import gzip
+import http.client
+import re
+import threading
+import zlib
+from html.parser import HTMLParser
+from urllib.parse import urljoin, urlsplit
+
+from script.logger import log
+
+USER_AGENT = (
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+    '(KHTML, like Gecko) Chrome/124.0 Safari/537.36'
+)
+MAX_BODY_BYTES = 5 * 1024 * 1024
+MAX_REDIRECTS = 5
+_POOL_SIZE_PER_HOST = 4
+
+_HTML_TYPES = ('text/html', 'application/xhtml+xml')
+_TEXT_TYPES = ('text/plain', 'application/json', 'text/markdown', 'text/csv', 'application/xml', 'text/xml')
+
+
+# ── 长连接池 ──────────────────────────────────────────────────────────────
+
+_pool: dict[tuple[str, str, int], list[http.client.HTTPConnection]] = {}
+_pool_lock = threading.Lock()
+
+
+def _acquire(scheme: str, host: str, port: int, timeout: float) -> http.client.HTTPConnection:
+    """从连接池取出一个空闲连接，没有则新建。"""
+    key = (scheme, host, port)
+    with _pool_lock:
+        idle = _pool.get(key)
+        if idle:
+            conn = idle.pop()
+            conn.timeout = timeout
+            return conn
+    if scheme == 'https':
+        return http.client.HTTPSConnection(host, port, timeout=timeout)
+    return http.client.HTTPConnection(host, port, timeout=timeout)
+
+
+def _release(scheme: str, host: str, port: int, conn: http.client.HTTPConnection):
+    """将可复用的连接放回连接池。"""
+    key = (scheme, host, port)
+    with _pool_lock:
+        idle = _pool.setdefault(key, [])
+        if len(idle) < _POOL_SIZE_PER_HOST:
+            idle.append(conn)
+            return
+    conn.close()
+
+
+def close_pool():
+    """关闭连接池中的所有空闲连接。"""
+    with _pool_lock:
+        conns = [c for idle in _pool.values() for c in idle]
+        _pool.clear()
+    for conn in conns:
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+def _request_once(url: str, headers: dict, timeout: float) -> dict:
+    """发起单次 GET（不跟随重定向），返回响应字典。连接失效时自动重试一次。"""
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    host = parts.hostname or ''
+    port = parts.port or (443 if scheme == 'https' else 80)
+    path = parts.path or '/'
+    if parts.query:
+        path += '?' + parts.query
+
+    for attempt in range(2):
+        conn = _acquire(scheme, host, port, timeout)
+        try:
+            conn.request('GET', path, headers=headers)
+            resp = conn.getresponse()
+            body = resp.read(MAX_BODY_BYTES + 1)
+            truncated = len(body) > MAX_BODY_BYTES
+            result = {
+                'url': url,
+                'status': resp.status,
+                'headers': {k.lower(): v for k, v in resp.getheaders()},
+                'body': body[:MAX_BODY_BYTES],
+                'truncated': truncated,
+            }
+            if truncated or resp.will_close:
+                conn.close()
+            else:
+                _release(scheme, host, port, conn)
+            return result
+        except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+            # 池中的长连接可能已被服务端关闭，换一条新连接重试
+            conn.close()
+            if attempt:
+                raise
+        except Exception:
+            conn.close()
+            raise
+    raise RuntimeError('unreachable')
+
+
+def _decode_body(body: bytes, encoding: str) -> bytes:
+    """按 Content-Encoding 解压响应体。"""
+    encoding = encoding.lower()
+    if encoding == 'gzip':
+        return gzip.decompress(body)
+    if encoding == 'deflate':
+        try:
+            return zlib.decompress(body)
+        except zlib.error:
+            return zlib.decompress(body, -zlib.MAX_WBITS)
+    return body
+
+
+def _cached_response(entry: dict, body: bytes) -> dict:
+    return {
+        'url': entry['final_url'],
+        'status': entry['status'],
+        'headers': dict(entry['headers']),
+        'body': body,
+        'truncated': False,
+        'from_cache': True,
+    }
+
+
+def http_get(url: str, timeout: float = 10, headers: dict | None = None,
+             max_age: int | None = None) -> dict:
+    """GET 指定 URL（自动跟随重定向、解压，经过 page_cache 磁盘缓存），返回响应字典。
+
+    Args:
+        max_age: 可选。缓存条目在该秒数内直接复用，覆盖响应头给出的新鲜度；0 表示强制刷新。
+
+    Returns:
+        dict，包含：
+            'url':     str   —— 跟随重定向后的最终 URL
+            'status':  int   —— HTTP 状态码
+            'headers': dict  —— 响应头（键为小写）
+            'body':    bytes —— 解压后的响应体
+            'truncated': bool —— 响应体是否超过 MAX_BODY_BYTES 被截断
+            'from_cache': bool —— 是否来自缓存
+    """
+    from script import page_cache
+
+    # 携带 Cookie / Authorization 的请求可能返回个人化内容，不经过共享缓存
+    use_cache = (page_cache.cache_enabled() or page_cache.offline()) and not page_cache.has_credentials(headers)
+    entry = page_cache.lookup(url) if use_cache else None
+    if use_cache and page_cache.offline():
+        body = page_cache.read_body(url) if entry else None
+        if body is None:
+            raise page_cache.OfflineMiss(f'离线模式下缓存未命中: {url}')
+        return _cached_response(entry, body)
+    if entry is not None and page_cache.is_fresh(entry, max_age):
+        body = page_cache.read_body(url)
+        if body is not None:
+            log(f'http_fetch | cache hit {url}')
+            return _cached_response(entry, body)
+
+    req_headers = {
+        'User-Agent': USER_AGENT,
+        'Accept': 'text/html,application/xhtml+xml,text/plain;q=0.9,*/*;q=0.8',
+        'Accept-Encoding': 'gzip, deflate',
+        'Connection': 'keep-alive',
+    }
+    req_headers.update(headers or {})
+    if entry is not None and max_age != 0:
+        req_headers.update(page_cache.validators(entry))
+
+    origin = url
+    for _ in range(MAX_REDIRECTS + 1):
+        resp = _request_once(url, req_headers, timeout)
+        location = resp['headers'].get('location')
+        if resp['status'] in (301, 302, 303, 307, 308) and location:
+            url = urljoin(url, location)
+            log(f'http_fetch | redirect → {url}')
+            continue
+        if resp['status'] == 304 and entry is not None:
+            body = page_cache.read_body(origin)
+            if body is not None:
+                page_cache.refresh(origin, resp['headers'])
+                log(f'http_fetch | 304 not modified {origin}')
+                return _cached_response(entry, body)
+        resp['body'] = _decode_body(resp['body'], resp['headers'].get('content-encoding', ''))
+        resp['from_cache'] = False
+        if use_cache and not resp['truncated']:
+            page_cache.store(origin, resp['status'], resp['headers'], resp['body'], final_url=url,
+                             request_headers=req_headers)
+        return resp
+    raise RuntimeError(f'重定向次数过多: {url}')
+
+
+def detect_charset(headers: dict, body: bytes) -> str:
+    """从 Content-Type 或 <meta charset> 推断文本编码，默认 utf-8。"""
+    m = re.search(r'charset=([\w\-]+)', headers.get('content-type', ''), re.I)
+    if not m:
+        m = re.search(rb'<meta[^>]+charset=["\']?([\w\-]+)', body[:4096], re.I)
+    if m:
+        charset = m.group(1)
+        return charset.decode('ascii', 'ignore') if isinstance(charset, bytes) else charset
+    return 'utf-8'
+
+
+# ── HTML → [INTERACTIVE|...] 文本 ─────────────────────────────────────────
+
+_INTERACTIVE = {'input', 'button', 'a', 'select', 'textarea'}
+_SKIP = {'script', 'style', 'noscript', 'svg', 'template', 'head'}
+_VOID = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta',
+         'source', 'track', 'wbr'}
+
+
+def _is_hidden(tag: str, attrs: dict) -> bool:
+    if 'hidden' in attrs or attrs.get('aria-hidden') == 'true':
+        return True
+    style = (attrs.get('style') or '').replace(' ', '').lower()
+    if 'display:none' in style or 'visibility:hidden' in style:
+        return True
+    return tag == 'input' and (attrs.get('type') or '').lower() == 'hidden'
+
+
+def _selector(tag: str, attrs: dict) -> str:
+    """与 browser_read 中 JS 的 getSelector 保持一致。"""
+    if attrs.get('id'):
+        return '#' + attrs['id']
+    cls = (attrs.get('class') or '').split()
+    if cls:
+        return f'{tag}.{cls[0]}'
+    return tag
+
+
+def _input_type(tag: str, attrs: dict) -> str:
+    """模拟 DOM 元素 .type 属性的默认值。"""
+    t = (attrs.get('type') or '').lower()
+    if tag == 'input':
+        return t or 'text'
+    if tag == 'button':
+        return t or 'submit'
+    if tag == 'select':
+        return 'select-multiple' if 'multiple' in attrs else 'select-one'
+    if tag == 'textarea':
+        return 'textarea'
+    return t
+
+
+class _TextExtractor(HTMLParser):
+    """按文档顺序输出文字行，可交互元素以 [INTERACTIVE|...] 内联到上一行。"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.lines: list[str] = []
+        self.title = ''
+        self.noscript_text: list[str] = []
+        self.script_count = 0
+        self._skip_stack: list[str] = []      # 正在跳过的元素（script/style/隐藏元素等）
+        self._in_title = False
+        self._in_noscript = False
+        self._capture: dict | None = None     # 正在收集文字的可交互元素
+
+    # ── 工具方法 ──
+    def _emit_marker(self, tag: str, attrs: dict, text: str):
+        label = text.strip()[:30] or (attrs.get('value') or '')[:30] or (attrs.get('placeholder') or '')[:30]
+        if tag == 'a' and not label:
+            return
+        type_ = _input_type(tag, attrs)
+        type_str = f' type={type_}' if type_ else ''
+        marker = f'[INTERACTIVE|{tag}|{_selector(tag, attrs)}{type_str}|"{label}"]'
+        if self.lines:
+            self.lines[-1] += ' ' + marker
+        else:
+            self.lines.append(marker)
+
+    # ── HTMLParser 回调 ──
+    def handle_starttag(self, tag, attrs_list):
+        attrs = {k: (v if v is not None else '') for k, v in attrs_list}
+        if tag == 'script':
+            self.script_count += 1
+        if tag == 'title' and not self.title:
+            self._in_title = True
+        if tag == 'noscript':
+            self._in_noscript = True
+        if tag == 'body':
+            # 兼容省略 </head> 的页面
+            self._skip_stack.clear()
+
+        if self._skip_stack:
+            if tag not in _VOID:
+                self._skip_stack.append(tag)
+            return
+        if tag in _SKIP or _is_hidden(tag, attrs):
+            if tag not in _VOID:
+                self._skip_stack.append(tag)
+            return
+
+        if self._capture is not None:
+            if tag == 'a' == self._capture['tag']:
+                # <a> 不能嵌套，浏览器会隐式闭合前一个链接
+                cap, self._capture = self._capture, None
+                self._emit_marker(cap['tag'], cap['attrs'], ' '.join(cap['text']))
+            elif tag == self._capture['tag']:
+                self._capture['depth'] += 1
+                return
+            else:
+                return
+        if tag in _INTERACTIVE:
+            if tag in _VOID:
+                self._emit_marker(tag, attrs, '')
+            else:
+                self._capture = {'tag': tag, 'attrs': attrs, 'text': [], 'depth': 1}
+
+    def handle_startendtag(self, tag, attrs_list):
+        self.handle_starttag(tag, attrs_list)
+        if tag not in _VOID:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if tag == 'title':
+            self._in_title = False
+        if tag == 'noscript':
+            self._in_noscript = False
+
+        if self._skip_stack:
+            # 容忍未闭合的标签：弹出到最近一个同名元素为止
+            if tag in self._skip_stack:
+                while self._skip_stack and self._skip_stack.pop() != tag:
+                    pass
+            return
+
+        if self._capture is not None and tag == self._capture['tag']:
+            self._capture['depth'] -= 1
+            if self._capture['depth'] == 0:
+                cap, self._capture = self._capture, None
+                self._emit_marker(cap['tag'], cap['attrs'], ' '.join(cap['text']))
+
+    def handle_data(self, data):
+        if self._in_title:
+            self.title += data
+        if self._in_noscript:
+            self.noscript_text.append(data)
+        if self._skip_stack:
+            return
+        text = data.strip()
+        if not text:
+            return
+        if self._capture is not None:
+            self._capture['text'].append(text)
+        else:
+            self.lines.append(text)
+
+
+def html_to_text(html: str) -> dict:
+    """将 HTML 解析为 browser_read 的文本格式。
+
+    Returns:
+        dict，包含 'title'、'text'，以及供 needs_js 使用的 'noscript'、'script_count'。
+    """
+    parser = _TextExtractor()
+    try:
+        parser.feed(html)
+        parser.close()
+    except Exception as e:
+        log(f'http_fetch | html parse error: {e}')
+    return {
+        'title': ' '.join(parser.title.split()),
+        'text': '\n'.join(parser.lines),
+        'noscript': ' '.join(' '.join(parser.noscript_text).split()),
+        'script_count': parser.script_count,
+    }
+
+
+# ── JS 依赖判断 ───────────────────────────────────────────────────────────
+
+_SPA_MARKERS = re.compile(
+    r'<div[^>]+id=["\'](?:root|app|__next|__nuxt|svelte)["\'][^>]*>\s*</div>'
+    r'|<app-root[\s>]|\bng-app\b|data-reactroot=""\s*>\s*<'
+    r'|window\.__INITIAL_STATE__\s*=\s*\{\s*\}',
+    re.I,
+)
+_NOSCRIPT_HINT = re.compile(r'enable\s+javascript|javascript\s+is\s+(?:disabled|required)|启用\s*javascript|开启\s*javascript', re.I)
+_META_REFRESH = re.compile(r'<meta[^>]+http-equiv=["\']?refresh', re.I)
+
+
+def needs_js(html: str, parsed: dict) -> str | None:
+    """判断页面是否需要浏览器渲染。返回升级原因，None 表示静态解析即可。"""
+    text_len = len(parsed['text'])
+    if _META_REFRESH.search(html):
+        return 'meta refresh'
+    if parsed['noscript'] and _NOSCRIPT_HINT.search(parsed['noscript']):
+        return 'noscript 提示需要 JavaScript'
+    if _SPA_MARKERS.search(html) and text_len < 2000:
+        return 'SPA 挂载点'
+    if text_len < 200 and parsed['script_count'] > 0:
+        return f'正文过短（{text_len} 字符）且包含脚本'
+    if text_len == 0:
+        return '正文为空'
+    return None
+
+
+def fetch_static(url: str, timeout: float = 10, max_age: int | None = None) -> dict | None:
+    """尝试以纯 HTTP 方式打开页面（经过磁盘缓存）。
+
+    Returns:
+        可静态解析时返回 {'url', 'title', 'text'}；需要浏览器时返回 None。
+    """
+    if urlsplit(url).scheme.lower() not in ('http', 'https'):
+        return None
+    try:
+        resp = http_get(url, timeout=timeout, max_age=max_age)
+    except Exception as e:
+        log(f'http_fetch | GET {url} failed, escalate: {e}')
+        return None
+
+    if resp['status'] != 200 or resp['truncated']:
+        log(f'http_fetch | {url} status={resp["status"]} truncated={resp["truncated"]}, escalate')
+        return None
+
+    ctype = resp['headers'].get('content-type', '').split(';')[0].strip().lower()
+    charset = detect_charset(resp['headers'], resp['body'])
+    try:
+        body = resp['body'].decode(charset, errors='replace')
+    except LookupError:
+        body = resp['body'].decode('utf-8', errors='replace')
+
+    if ctype in _TEXT_TYPES:
+        text = '\n'.join(line for line in body.splitlines() if line.strip())
+        return {'url': resp['url'], 'title': resp['url'].rsplit('/', 1)[-1], 'text': text}
+    if ctype and ctype not in _HTML_TYPES:
+        log(f'http_fetch | {url} content-type={ctype}, escalate')
+        return None
+
+    parsed = html_to_text(body)
+    reason = needs_js(body, parsed)
+    if reason:
+        log(f'http_fetch | {url} needs JS ({reason}), escalate')
+        return None
+    log(f'http_fetch | {url} served statically ({len(parsed["text"])} chars)')
+    return {'url': resp['url'], 'title': parsed['title'], 'text': parsed['text']}
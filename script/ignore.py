@@ -0,0 +1,152 @@
+"""
+ignore.py —— 工作区遍历与忽略规则。
+
+search_workspace 等需要遍历 work_dir 的工具统一使用 walk_files()：
+    - 总是跳过 DEFAULT_IGNORED_DIRS（版本库元数据、依赖目录、缓存目录）；
+    - 遵循各级目录中的 .gitignore / .ignore（支持 !取反、目录规则、/ 锚定与 **）。
+"""
+
+from __future__ import annotations
+
+import os
+import re
+from typing import Iterator
+
+DEFAULT_IGNORED_DIRS = {
+    '.git', '.hg', '.svn', 'node_modules', '__pycache__', '.venv', 'venv',
+    '.mypy_cache', '.pytest_cache', '.ruff_cache', '.tox', '.nox', '.idea', '.next',
+}
+IGNORE_FILES = ('.gitignore', '.ignore')
+
+
+def glob_to_regex(pattern: str) -> re.Pattern:
+    """将 glob（支持 **）编译为匹配以 / 分隔的相对路径的正则。"""
+    return re.compile('^' + _translate(pattern.replace('\\', '/').lstrip('/')) + '$')
+
+
+def _translate(pattern: str) -> str:
+    """将 gitignore 通配符转换为正则表达式（匹配以 / 分隔的相对路径）。"""
+    i, n, out = 0, len(pattern), []
+    while i < n:
+        c = pattern[i]
+        if pattern.startswith('**/', i):
+            out.append('(?:.*/)?')
+            i += 3
+        elif pattern.startswith('/**', i) and i + 3 == n:
+            out.append('/.*')
+            i += 3
+        elif pattern.startswith('**', i):
+            out.append('.*')
+            i += 2
+        elif c == '*':
+            out.append('[^/]*')
+            i += 1
+        elif c == '?':
+            out.append('[^/]')
+            i += 1
+        elif c == '[':
+            j = pattern.find(']', i + 1)
+            if j == -1:
+                out.append(re.escape(c))
+                i += 1
+            else:
+                body = pattern[i + 1:j].replace('\\', '\\\\')
+                if body.startswith('!'):
+                    body = '^' + body[1:]
+                out.append(f'[{body}]')
+                i = j + 1
+        elif c == '\\' and i + 1 < n:
+            out.append(re.escape(pattern[i + 1]))
+            i += 2
+        else:
+            out.append(re.escape(c))
+            i += 1
+    return ''.join(out)
+
+
+class IgnoreRules:
+    """一组按顺序生效的忽略规则，后出现的规则优先（与 git 一致）。"""
+
+    def __init__(self, rules: list[tuple[re.Pattern, bool, bool, str]] | None = None):
+        # (regex, negate, dir_only, base)；base 为规则文件所在目录相对根目录的路径
+        self.rules = rules or []
+
+    def extend_from(self, abs_dir: str, rel_dir: str) -> 'IgnoreRules':
+        """读取目录中的忽略文件，返回追加了新规则的 IgnoreRules（无忽略文件时返回自身）。"""
+        new_rules = []
+        for name in IGNORE_FILES:
+            path = os.path.join(abs_dir, name)
+            if not os.path.isfile(path):
+                continue
+            try:
+                with open(path, 'r', encoding='utf-8', errors='replace') as f:
+                    lines = f.read().splitlines()
+            except OSError:
+                continue
+            for line in lines:
+                line = line.rstrip()
+                if not line or line.startswith('#'):
+                    continue
+                negate = line.startswith('!')
+                if negate:
+                    line = line[1:]
+                dir_only = line.endswith('/')
+                line = line.rstrip('/')
+                if not line:
+                    continue
+                anchored = '/' in line
+                body = _translate(line.lstrip('/'))
+                regex = re.compile(('^' if anchored else '(?:^|.*/)') + body + '$')
+                new_rules.append((regex, negate, dir_only, rel_dir))
+        if not new_rules:
+            return self
+        return IgnoreRules(self.rules + new_rules)
+
+    def ignored(self, rel_path: str, is_dir: bool) -> bool:
+        result = False
+        for regex, negate, dir_only, base in self.rules:
+            if dir_only and not is_dir:
+                continue
+            if base:
+                if not rel_path.startswith(base + '/'):
+                    continue
+                sub = rel_path[len(base) + 1:]
+            else:
+                sub = rel_path
+            if regex.match(sub):
+                result = not negate
+        return result
+
+
+def walk_files(root: str, max_files: int | None = None) -> Iterator[tuple[str, os.DirEntry]]:
+    """遍历 root 下未被忽略的文件，产出 (以 / 分隔的相对路径, DirEntry)。"""
+    count = 0
+    stack = [(root, '', IgnoreRules().extend_from(root, ''))]
+    while stack:
+        abs_dir, rel_dir, rules = stack.pop()
+        try:
+            entries = sorted(os.scandir(abs_dir), key=lambda e: e.name)
+        except OSError:
+            continue
+        subdirs = []
+        for entry in entries:
+            rel = f'{rel_dir}/{entry.name}' if rel_dir else entry.name
+            try:
+                is_dir = entry.is_dir(follow_symlinks=False)
+                if not is_dir and not entry.is_file(follow_symlinks=False):
+                    continue
+            except OSError:
+                continue
+            if is_dir:
+                if entry.name in DEFAULT_IGNORED_DIRS or rules.ignored(rel, True):
+                    continue
+                subdirs.append((entry.path, rel))
+            else:
+                if rules.ignored(rel, False):
+                    continue
+                yield rel, entry
+                count += 1
+                if max_files is not None and count >= max_files:
+                    return
+        for abs_sub, rel_sub in reversed(subdirs):
+            stack.append((abs_sub, rel_sub, rules.extend_from(abs_sub, rel_sub)))
@@ -0,0 +1,293 @@
+"""
+jobs.py —— 后台任务：长时间运行的命令（开发服务器、耗时构建、训练脚本等）。
+
+system_command 会在 wait 秒后终止命令；job_start 启动的命令则在独立的进程组中后台运行，
+不受 wait 限制，stdout 与 stderr 合并写入磁盘上的输出文件（logs/jobs/），Bot 可继续做其他工作，
+之后通过 job_status / job_output（按字节偏移增量读取）/ job_wait / job_kill 查询与控制。
+
+后台任务同样受 command_limits 限制（见 limits.py），但不限制 CPU 时间。
+任务按会话隔离：单会话模式使用模块级的默认任务表，服务模式下每个 Session 拥有自己的任务表；
+会话结束（/end、DELETE 会话、批处理任务结束）时终止其仍在运行的任务。
+"""
+
+import codecs
+import os
+import signal
+import subprocess
+import threading
+import time
+
+from script.logger import log
+from script.session import current as current_session
+
+_JOB_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'logs', 'jobs')
+_IS_WINDOWS = os.name == 'nt'
+
+
+class Job:
+    """一个后台任务。"""
+
+    def __init__(self, job_id: str, command: str, cwd: str, proc, output_path: str, cgroup=None):
+        self.id = job_id
+        self.command = command
+        self.cwd = cwd
+        self.proc = proc
+        self.output_path = output_path
+        self.started = time.time()
+        self.ended: float | None = None
+        self.usage = None            # limits.Usage，结束后设置
+        self._cgroup = cgroup
+        self._done = threading.Event()
+        threading.Thread(target=self._reap, name=f'job-{job_id}', daemon=True).start()
+
+    def _reap(self):
+        from script.limits import wait_with_usage
+        usage = wait_with_usage(self.proc)
+        if self._cgroup is not None:
+            usage.max_rss = self._cgroup.peak_memory() or usage.max_rss
+            self._cgroup.remove()
+        self.usage = usage
+        self.ended = time.time()
+        self._done.set()
+        log(f'jobs | [{self.id}] 结束: {usage.describe()}')
+
+    @property
+    def running(self) -> bool:
+        return not self._done.is_set()
+
+    def wait(self, timeout: float | None) -> bool:
+        return self._done.wait(timeout)
+
+    def output_size(self) -> int:
+        try:
+            return os.path.getsize(self.output_path)
+        except OSError:
+            return 0
+
+    def read(self, offset: int, max_bytes: int) -> tuple[bytes, int]:
+        """从字节偏移 offset 读取至多 max_bytes 字节，返回 (数据, 下一次的偏移)。"""
+        with open(self.output_path, 'rb') as f:
+            f.seek(offset)
+            data = f.read(max_bytes)
+        return data, offset + len(data)
+
+    def kill(self, grace: float = 3.0):
+        """先发送 SIGTERM（Windows 上直接结束进程树），宽限期后仍未退出则强制终止。"""
+        if not self.running:
+            return
+        if _IS_WINDOWS:
+            subprocess.run(f'taskkill /F /T /PID {self.proc.pid}', shell=True, capture_output=True)
+        else:
+            self._signal(signal.SIGTERM)
+            if self.wait(grace):
+                return
+            if self._cgroup is not None:
+                self._cgroup.kill()
+            self._signal(signal.SIGKILL)
+        self.wait(grace)
+
+    def _signal(self, sig):
+        try:
+            os.killpg(self.proc.pid, sig)
+        except ProcessLookupError:
+            pass
+
+    def status(self) -> str:
+        end = self.ended or time.time()
+        state = '运行中' if self.running else '已结束'
+        line = (f'[{self.id}] {state}（{_duration(end - self.started)}，PID {self.proc.pid}，'
+                f'输出 {self.output_size()} 字节）: {self.command}')
+        if self.usage is not None:
+            line += f'\n    {self.usage.describe()}'
+        return line
+
+
+def _duration(seconds: float) -> str:
+    seconds = int(seconds)
+    if seconds < 60:
+        return f'{seconds}s'
+    if seconds < 3600:
+        return f'{seconds // 60}min {seconds % 60}s'
+    return f'{seconds // 3600}h {seconds % 3600 // 60}min'
+
+
+class JobTable:
+    """一个会话的后台任务表。"""
+
+    def __init__(self, owner: str):
+        self.owner = owner
+        self.jobs: dict[str, Job] = {}
+        self._next = 1
+        self._lock = threading.Lock()
+
+    def start(self, command: str) -> Job:
+        from script.limits import apply_limits, create_cgroup, get_limits
+        from script.system import get_cwd, get_env
+
+        with self._lock:
+            job_id = str(self._next)
+            self._next += 1
+        os.makedirs(_JOB_DIR, exist_ok=True)
+        output_path = os.path.abspath(os.path.join(_JOB_DIR, f'{self.owner}-{os.getpid()}-{job_id}.log'))
+        limits = get_limits()
+        limits['cpu_seconds'] = None   # 后台任务本就是长时间运行的，不限制 CPU 时间
+        cgroup = create_cgroup(limits)
+        cwd = get_cwd()
+        kwargs = dict(shell=True, stdin=subprocess.DEVNULL, stderr=subprocess.STDOUT,
+                      cwd=cwd, env=get_env())
+        if _IS_WINDOWS:
+            kwargs['creationflags'] = subprocess.CREATE_NEW_PROCESS_GROUP
+        else:
+            kwargs['start_new_session'] = True
+        with open(output_path, 'wb') as out:
+            try:
+                proc = subprocess.Popen(command, stdout=out, **kwargs)
+                apply_limits(proc.pid, limits, cgroup)
+            except Exception:
+                if cgroup is not None:
+                    cgroup.remove()
+                raise
+        job = Job(job_id, command, cwd, proc, output_path, cgroup)
+        self.jobs[job_id] = job
+        log(f'jobs | [{job_id}] 启动 PID {proc.pid} | cwd: {cwd} | {command}')
+        return job
+
+    def get(self, job_id) -> Job | None:
+        return self.jobs.get(str(job_id).strip().lstrip('[').rstrip(']'))
+
+    def shutdown(self):
+        running = [job for job in self.jobs.values() if job.running]
+        for job in running:
+            job.kill(grace=1.0)
+        if running:
+            log(f'jobs | 已终止 {len(running)} 个后台任务（{self.owner}）')
+
+
+_default_table = JobTable('main')
+
+
+def _table() -> JobTable:
+    session = current_session()
+    if session is None:
+        return _default_table
+    if session.jobs is None:
+        session.jobs = JobTable(session.id)
+    return session.jobs
+
+
+def has_running_jobs() -> bool:
+    """当前会话是否有仍在运行的后台任务。"""
+    return any(job.running for job in _table().jobs.values())
+
+
+def release_jobs():
+    """终止当前会话仍在运行的后台任务（会话结束时调用）。"""
+    session = current_session()
+    table = _default_table if session is None else session.jobs
+    if table is not None:
+        table.shutdown()
+
+
+# ── 工具入口 ──────────────────────────────────────────────────────────────
+
+def _missing(job_id) -> str:
+    ids = ', '.join(_table().jobs) or '无'
+    return f'后台任务不存在: {job_id}（现有任务: {ids}）'
+
+
+def job_start(command: str) -> str:
+    if not command.strip():
+        return '命令为空。'
+    try:
+        job = _table().start(command)
+    except Exception as e:
+        log(f'jobs | 启动失败: {e}')
+        return f'启动后台任务失败: {e}'
+    return (f'已在后台启动任务 [{job.id}]（PID {job.proc.pid}）: {command}\n'
+            f'用 job_output 读取输出，job_wait 等待结束，job_kill 终止。')
+
+
+def job_status(job_id=None) -> str:
+    table = _table()
+    if job_id is not None and str(job_id).strip():
+        job = table.get(job_id)
+        return job.status() if job else _missing(job_id)
+    if not table.jobs:
+        return '当前没有后台任务。'
+    return '\n'.join(job.status() for job in table.jobs.values())
+
+
+def _decode_prefix(data: bytes, encoding: str, max_chars: int, final: bool) -> tuple[str, int]:
+    """从 data 开头解码至多 max_chars 个字符，返回 (文本, 实际消耗的字节数)。
+
+    末尾不完整的多字节字符不解码也不计入消耗（final 为 True 时除外），
+    下次从该字符的起始字节继续读取，偏移量始终落在字符边界上。
+    """
+    decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+    parts, chars, pos, block = [], 0, 0, 1024
+    while pos < len(data) and chars < max_chars:
+        state = decoder.getstate()
+        chunk = data[pos:pos + block]
+        last = final and pos + len(chunk) >= len(data)
+        text = decoder.decode(chunk, last)
+        if chars + len(text) > max_chars:
+            # 超出字符数：回到块首逐字节解码，找到第 max_chars 个字符的结束位置
+            decoder.setstate(state)
+            for i in range(len(chunk)):
+                pending = len(decoder.getstate()[0])
+                text = decoder.decode(chunk[i:i + 1], last and i == len(chunk) - 1)
+                if chars + len(text) > max_chars:
+                    return ''.join(parts), pos - pending
+                parts.append(text)
+                chars += len(text)
+                pos += 1
+            break
+        parts.append(text)
+        chars += len(text)
+        pos += len(chunk)
+    return ''.join(parts), pos - len(decoder.getstate()[0])
+
+
+def job_output(job_id, offset: int = 0, max_chars: int = 4000) -> str:
+    from config import get_config
+    encoding = get_config()['encoding']
+    job = _table().get(job_id)
+    if job is None:
+        return _missing(job_id)
+    running = job.running
+    size = job.output_size()
+    if offset < 0:
+        offset = max(0, size + offset)   # 负数表示从末尾倒数
+    max_chars = max(1, max_chars)
+    data, _ = job.read(offset, max_chars * 4)
+    if offset and codecs.lookup(encoding).name == 'utf-8':
+        # 偏移落在多字节字符中间时跳过残余的续字节
+        skip = 0
+        while skip < min(3, len(data)) and 0x80 <= data[skip] < 0xC0:
+            skip += 1
+        offset, data = offset + skip, data[skip:]
+    text, consumed = _decode_prefix(data, encoding, max_chars, final=not running and offset + len(data) >= size)
+    next_offset = offset + consumed
+    state = '运行中' if running else '已结束'
+    more = f'，还有 {size - next_offset} 字节未读' if next_offset < size else ''
+    header = f'<任务 [{job.id}] 输出 {offset}~{next_offset} / {size} 字节（{state}{more}），下次从 offset={next_offset} 继续>'
+    return f'{header}\n{text}' if text else f'{header}\n（没有新输出）'
+
+
+def job_wait(job_id, timeout: float = 30) -> str:
+    job = _table().get(job_id)
+    if job is None:
+        return _missing(job_id)
+    finished = job.wait(max(0.0, float(timeout)))
+    prefix = '' if finished else f'等待 {timeout} 秒后任务仍在运行。\n'
+    return prefix + job.status()
+
+
+def job_kill(job_id) -> str:
+    job = _table().get(job_id)
+    if job is None:
+        return _missing(job_id)
+    if not job.running:
+        return f'任务已结束。\n{job.status()}'
+    job.kill()
+    return f'已终止任务 [{job.id}]。\n{job.status()}'
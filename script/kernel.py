@@ -0,0 +1,249 @@
+"""
+kernel.py —— python_exec 工具：常驻的 Python 工作进程。
+
+system_command 运行 python 脚本时，每次都要启动解释器、重新导入 pandas / matplotlib 等库并重新加载数据。
+python_exec 把代码交给会话内常驻的工作进程（script/kernel_worker.py）执行：
+全局变量与已导入的模块跨调用保留，迭代式的数据分析每一步只需毫秒级开销。
+
+    - 输出：stdout / stderr（含子进程与 C 扩展的输出）合并捕获，最后一条语句为表达式时附带其 repr，
+      过长时保留首尾截断；
+    - 超时：先发送中断（SIGINT，Windows 上为 CTRL_BREAK），代码中抛出 KeyboardInterrupt，变量保留；
+      宽限期内仍未响应则终止工作进程，下次调用时自动重启（变量丢失）；
+    - 资源：受 command_limits 限制（见 limits.py，不限制 CPU 时间），内存超限时代码中抛出 MemoryError；
+    - 解释器：config 的 python_kernel，默认与 Momoka 相同的解释器；环境变量同 system_command，
+      并默认 MPLBACKEND=Agg（绘图请用 savefig 保存）。
+
+工作进程按会话隔离：单会话模式使用模块级的默认进程，服务模式下每个 Session 拥有自己的进程；
+会话结束时（/end、DELETE 会话、批处理任务结束）终止。
+"""
+
+import json
+import os
+import queue
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+from script.logger import log
+from script.session import current as current_session
+
+MAX_OUTPUT = 10000
+MAX_REPR = 2000
+INTERRUPT_GRACE = 3.0
+
+_WORKER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'kernel_worker.py')
+_IS_WINDOWS = os.name == 'nt'
+_TIMEOUT = object()
+
+
+class Kernel:
+    """一个会话的 Python 工作进程。"""
+
+    def __init__(self, owner: str):
+        self.owner = owner
+        self.proc = None
+        self.cells = 0
+        self._cgroup = None
+        self._responses: queue.Queue = queue.Queue()
+        self._next = 1
+        self._lock = threading.Lock()
+
+    @property
+    def alive(self) -> bool:
+        return self.proc is not None and self.proc.poll() is None
+
+    def _start(self):
+        from config import get_config
+        from script.limits import apply_limits, create_cgroup, get_limits
+        from script.system import get_cwd, get_env
+
+        python = get_config().get('python_kernel') or sys.executable
+        limits = get_limits()
+        limits['cpu_seconds'] = None   # 工作进程常驻，不限制累计 CPU 时间
+        cgroup = create_cgroup(limits)
+        env = get_env()
+        env.setdefault('MPLBACKEND', 'Agg')
+        env['PYTHONIOENCODING'] = 'utf-8'
+        kwargs = dict(stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                      cwd=get_cwd(), env=env)
+        if _IS_WINDOWS:
+            kwargs['creationflags'] = subprocess.CREATE_NEW_PROCESS_GROUP
+        else:
+            kwargs['start_new_session'] = True
+        try:
+            self.proc = subprocess.Popen([python, '-u', _WORKER], **kwargs)
+            apply_limits(self.proc.pid, limits, cgroup)
+        except Exception:
+            if cgroup is not None:
+                cgroup.remove()
+            raise
+        self._cgroup = cgroup
+        self._responses = queue.Queue()
+        self.cells = 0
+        threading.Thread(target=self._read, args=(self.proc.stdout, self._responses),
+                         name=f'kernel-{self.owner}', daemon=True).start()
+        log(f'kernel | 启动 Python 工作进程 PID {self.proc.pid}（{python}）')
+
+    @staticmethod
+    def _read(pipe, responses: queue.Queue):
+        for line in iter(pipe.readline, b''):
+            try:
+                responses.put(json.loads(line))
+            except ValueError:
+                continue
+        responses.put(None)   # 工作进程已退出
+
+    def _wait(self, request_id: int, timeout: float):
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return _TIMEOUT
+            try:
+                response = self._responses.get(timeout=remaining)
+            except queue.Empty:
+                return _TIMEOUT
+            # 跳过之前被中断的调用迟到的结果
+            if response is None or response.get('id') == request_id:
+                return response
+
+    def _interrupt(self):
+        try:
+            if _IS_WINDOWS:
+                self.proc.send_signal(signal.CTRL_BREAK_EVENT)
+            else:
+                os.kill(self.proc.pid, signal.SIGINT)
+        except OSError:
+            pass
+
+    def _stop(self) -> str:
+        """终止工作进程（含其启动的子进程），返回资源统计与 stderr 中的启动错误。"""
+        from script.limits import wait_with_usage
+        proc, self.proc = self.proc, None
+        if proc is None:
+            return ''
+        if proc.poll() is None:
+            if _IS_WINDOWS:
+                subprocess.run(f'taskkill /F /T /PID {proc.pid}', shell=True, capture_output=True)
+            else:
+                if self._cgroup is not None:
+                    self._cgroup.kill()
+                try:
+                    os.killpg(proc.pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+        usage = wait_with_usage(proc)
+        if self._cgroup is not None:
+            usage.max_rss = self._cgroup.peak_memory() or usage.max_rss
+            self._cgroup.remove()
+            self._cgroup = None
+        try:
+            stderr = proc.stderr.read().decode('utf-8', errors='replace').strip()
+        except (OSError, ValueError):
+            stderr = ''
+        for pipe in (proc.stdin, proc.stdout, proc.stderr):
+            try:
+                pipe.close()
+            except OSError:
+                pass
+        log(f'kernel | Python 工作进程 PID {proc.pid} 结束: {usage.describe()}')
+        return usage.describe() + (f'\n{stderr[-2000:]}' if stderr else '')
+
+    def execute(self, code: str, timeout: float) -> str:
+        with self._lock:
+            if not self.alive:
+                if self.proc is not None:
+                    self._stop()
+                self._start()
+            from script.system import get_cwd
+            request_id = self._next
+            self._next += 1
+            request = {'id': request_id, 'code': code, 'cwd': get_cwd(),
+                       'max_output': MAX_OUTPUT, 'max_repr': MAX_REPR}
+            try:
+                self.proc.stdin.write((json.dumps(request, ensure_ascii=False) + '\n').encode('utf-8'))
+                self.proc.stdin.flush()
+            except OSError:
+                return f'Python 工作进程已退出，下次调用将重新启动（之前的变量已丢失）。\n{self._stop()}'
+
+            note = ''
+            response = self._wait(request_id, timeout)
+            if response is _TIMEOUT:
+                self._interrupt()
+                response = self._wait(request_id, INTERRUPT_GRACE)
+                if response is _TIMEOUT:
+                    detail = self._stop()
+                    return (f'执行超时（超过 {timeout} 秒）且无法中断，已终止 Python 工作进程，'
+                            f'下次调用将重新启动（之前的变量已丢失）。\n{detail}')
+                note = f'执行超时（超过 {timeout} 秒），已中断；之前的变量仍然保留。'
+            if response is None:
+                detail = self._stop()
+                return f'Python 工作进程意外退出（之前的变量已丢失，下次调用将重新启动）。\n{detail}'
+            self.cells += 1
+
+        parts = []
+        if response.get('output'):
+            parts.append(response['output'].rstrip('\n'))
+        if response.get('result') is not None:
+            parts.append(f'Out: {response["result"]}')
+        if response.get('error'):
+            parts.append(response['error'])
+        if note:
+            parts.append(note)
+        parts.append(f'[python_exec] 第 {self.cells} 次调用，用时 {response.get("elapsed", 0):.3f}s')
+        if len(parts) == 1:
+            parts.insert(0, '（无输出）')
+        return '\n'.join(parts)
+
+    def reset(self) -> str:
+        with self._lock:
+            if self.proc is None:
+                return 'Python 工作进程尚未启动。'
+            self._stop()
+            return 'Python 工作进程已重启，所有变量已清空。'
+
+    def shutdown(self):
+        with self._lock:
+            if self.proc is not None:
+                self._stop()
+
+
+_default_kernel = Kernel('main')
+
+
+def _kernel() -> Kernel:
+    session = current_session()
+    if session is None:
+        return _default_kernel
+    if session.kernel is None:
+        session.kernel = Kernel(session.id)
+    return session.kernel
+
+
+def release_kernel():
+    """终止当前会话的 Python 工作进程（会话结束时调用）。"""
+    session = current_session()
+    kernel = _default_kernel if session is None else session.kernel
+    if kernel is not None:
+        kernel.shutdown()
+
+
+# ── 工具入口 ──────────────────────────────────────────────────────────────
+
+def python_exec(code: str, timeout: float | None = None, reset: bool = False) -> str:
+    from config import get_config
+
+    kernel = _kernel()
+    prefix = ''
+    if reset:
+        prefix = kernel.reset() + '\n'
+    if not code.strip():
+        return prefix.strip() or '代码为空。'
+    timeout = float(timeout) if timeout else float(get_config().get('wait', 10))
+    try:
+        return prefix + kernel.execute(code, timeout)
+    except Exception as e:
+        log(f'kernel | 执行失败: {e}')
+        return prefix + f'无法启动 Python 工作进程: {type(e).__name__}: {e}'
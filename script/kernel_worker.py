@@ -0,0 +1,131 @@
+"""
+kernel_worker.py —— python_exec 的工作进程（由 script/kernel.py 启动，只依赖标准库）。
+
+协议：父进程经 stdin 逐行发送 JSON 请求 {"id", "code", "cwd", "max_output", "max_repr"}，
+工作进程经 stdout 逐行返回 {"id", "output", "result", "error", "elapsed"}。
+启动时先把协议用的 stdin / stdout 复制到新的文件描述符，再把 fd 0 指向 /dev/null、
+fd 1 / 2 指向捕获文件，因此 print、C 扩展与子进程的输出都会被捕获，而不会混入协议。
+
+代码在同一个全局命名空间中执行（变量、导入跨调用保留），最后一条语句为表达式时返回其 repr（同时存入 _）。
+SIGINT（Windows 上为 CTRL_BREAK）在代码中抛出 KeyboardInterrupt，中断当前调用而不丢失状态。
+"""
+
+import ast
+import json
+import os
+import reprlib
+import signal
+import sys
+import tempfile
+import time
+import traceback
+
+_INTERRUPT = getattr(signal, 'SIGBREAK', signal.SIGINT)
+
+
+def _clip(text: str, limit: int) -> str:
+    """超长文本保留首尾，中间以省略说明代替。"""
+    if len(text) <= limit:
+        return text
+    head = limit * 2 // 3
+    tail = limit - head
+    return f'{text[:head]}\n…（省略 {len(text) - limit} 字符）…\n{text[-tail:]}'
+
+
+def _read_capture(f, limit: int) -> str:
+    """读取捕获文件：过大时只读取首尾部分，不把整份输出载入内存。"""
+    size = os.fstat(f.fileno()).st_size
+    f.seek(0)
+    if size <= limit * 4:
+        return _clip(f.read().decode('utf-8', errors='replace'), limit)
+    head = f.read(limit * 2 // 3).decode('utf-8', errors='replace')
+    f.seek(size - limit // 3)
+    tail = f.read().decode('utf-8', errors='replace')
+    return f'{head}\n…（输出共 {size} 字节，省略中间部分）…\n{tail}'
+
+
+def _repr(value, limit: int) -> str:
+    try:
+        text = repr(value)
+    except Exception as e:
+        text = f'<repr 失败: {type(e).__name__}: {e}>'
+    if len(text) > limit and type(value) in (list, tuple, dict, set, frozenset, str, bytes):
+        short = reprlib.Repr()
+        short.maxlist = short.maxtuple = short.maxdict = short.maxset = short.maxfrozenset = 50
+        short.maxstring = short.maxother = limit
+        short.maxlevel = 4
+        text = short.repr(value)
+    return _clip(text, limit)
+
+
+def _run(code: str, namespace: dict, max_repr: int) -> tuple[str | None, str | None]:
+    """执行一段代码，返回 (最后一个表达式的 repr, 异常信息)。"""
+    try:
+        tree = ast.parse(code, '<cell>', 'exec')
+        last = None
+        if tree.body and isinstance(tree.body[-1], ast.Expr):
+            last = ast.Expression(tree.body.pop().value)
+        exec(compile(tree, '<cell>', 'exec'), namespace)
+        if last is None:
+            return None, None
+        value = eval(compile(last, '<cell>', 'eval'), namespace)
+        if value is None:
+            return None, None
+        namespace['_'] = value
+        return _repr(value, max_repr), None
+    except BaseException as e:
+        if isinstance(e, SystemExit):
+            return None, f'SystemExit: {e.code}（工作进程未退出，变量已保留）'
+        tb = traceback.format_exception(type(e), e, e.__traceback__)
+        # 去掉工作进程自身的栈帧，只保留用户代码部分
+        tb = [line for line in tb if __file__ not in line]
+        return None, ''.join(tb).rstrip()
+
+
+def main():
+    proto_in = os.fdopen(os.dup(0), 'r', encoding='utf-8')
+    proto_out = os.fdopen(os.dup(1), 'w', encoding='utf-8')
+    devnull = os.open(os.devnull, os.O_RDONLY)
+    os.dup2(devnull, 0)
+    os.close(devnull)
+    capture = tempfile.TemporaryFile()
+    os.dup2(capture.fileno(), 1)
+    os.dup2(capture.fileno(), 2)
+    sys.stdin = open(os.devnull, 'r')
+    sys.stdout = open(1, 'w', encoding='utf-8', errors='replace', closefd=False, buffering=1)
+    sys.stderr = open(2, 'w', encoding='utf-8', errors='replace', closefd=False, buffering=1)
+    # 只在执行用户代码期间响应中断，空闲时收到的中断（与调用结束同时到达）直接忽略
+    signal.signal(_INTERRUPT, signal.SIG_IGN)
+
+    namespace = {'__name__': '__main__', '__builtins__': __builtins__}
+    for line in proto_in:
+        try:
+            request = json.loads(line)
+        except ValueError:
+            continue
+        capture.seek(0)
+        capture.truncate()
+        started = time.perf_counter()
+        try:
+            if request.get('cwd'):
+                os.chdir(request['cwd'])
+            signal.signal(_INTERRUPT, signal.default_int_handler)
+            result, error = _run(request.get('code', ''), namespace, int(request.get('max_repr', 2000)))
+            signal.signal(_INTERRUPT, signal.SIG_IGN)
+        except KeyboardInterrupt:
+            # 中断恰好发生在用户代码之外
+            signal.signal(_INTERRUPT, signal.SIG_IGN)
+            result, error = None, 'KeyboardInterrupt'
+        except OSError as e:
+            result, error = None, f'{type(e).__name__}: {e}'
+        elapsed = time.perf_counter() - started
+        sys.stdout.flush()
+        sys.stderr.flush()
+        output = _read_capture(capture, int(request.get('max_output', 10000)))
+        proto_out.write(json.dumps({'id': request.get('id'), 'output': output, 'result': result,
+                                    'error': error, 'elapsed': elapsed}, ensure_ascii=False) + '\n')
+        proto_out.flush()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,250 @@
+"""
+limits.py —— 子进程的资源限制与资源统计。
+
+限制为可选项，配置项 command_limits（默认均为 null，即不限制）：
+    cpu_seconds     单个进程的 CPU 时间（RLIMIT_CPU，超出后收到 SIGXCPU）
+    memory_mb       单个进程的数据段（RLIMIT_DATA，统计堆与私有可写映射，不统计 JVM、WebAssembly、
+                    ASAN 预留的地址空间）；启用 cgroup 时改为整个进程树的 memory.max
+    file_size_mb    单个文件的最大写入大小（RLIMIT_FSIZE，超出后收到 SIGXFSZ）
+    max_processes   可新建的进程数（RLIMIT_NPROC 按用户计数，因此在当前用户已有进程数之上累加）；
+                    启用 cgroup 时改为整个进程树的 pids.max
+    cgroup          已委派给当前用户的 cgroup v2 目录（如 systemd-run --user -p Delegate=yes 创建的目录）。
+                    设置且可写时，每条命令在其下新建子 cgroup，限制与统计覆盖整个进程树
+
+子进程启动后由父进程施加限制（Linux 上用 resource.prlimit 设置子进程的 rlimit，
+cgroup 则写入其 cgroup.procs），不使用 preexec_fn：多线程进程中 fork 之后执行 Python 代码可能死锁。
+限制在启动后的极短时间内生效，其间派生的子进程不受限制；非 Linux 的 POSIX 系统上 rlimit 不生效。
+
+资源统计通过 os.wait4 回收子进程时取得（用户态 / 内核态 CPU 时间、峰值常驻内存、退出状态），
+启用 cgroup 时峰值内存取 memory.peak。
+Windows 上没有 rlimit / wait4，只统计退出码。
+"""
+
+import os
+import signal
+import sys
+import time
+import uuid
+
+from script.logger import log
+
+_IS_POSIX = os.name == 'posix'
+
+DEFAULT_LIMITS = {
+    'cpu_seconds': None,
+    'memory_mb': None,
+    'file_size_mb': None,
+    'max_processes': None,
+    'cgroup': None,
+}
+
+_SIGNAL_HINTS = {
+    'SIGXCPU': '超出 CPU 时间限制',
+    'SIGXFSZ': '超出文件大小限制',
+    'SIGKILL': '被强制终止',
+}
+
+
+def get_limits(cfg: dict | None = None) -> dict:
+    """合并默认值与 config.json 的 command_limits。"""
+    if cfg is None:
+        from config import get_config
+        cfg = get_config()
+    limits = dict(DEFAULT_LIMITS)
+    limits.update(cfg.get('command_limits') or {})
+    return limits
+
+
+def _user_process_count() -> int:
+    """当前用户的进程数（仅 Linux，用于换算 RLIMIT_NPROC）。"""
+    uid = os.getuid()
+    count = 0
+    try:
+        for entry in os.scandir('/proc'):
+            if entry.name.isdigit():
+                try:
+                    if entry.stat().st_uid == uid:
+                        count += 1
+                except OSError:
+                    pass
+    except OSError:
+        return 0
+    return count
+
+
+# ── cgroup v2 ─────────────────────────────────────────────────────────────
+
+class Cgroup:
+    """为一条命令新建的子 cgroup。"""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    @classmethod
+    def create(cls, root: str | None, limits: dict) -> 'Cgroup | None':
+        """在委派的 cgroup 目录下新建子 cgroup 并写入限制；不可用时返回 None（回退到 rlimit）。"""
+        if not root or not sys.platform.startswith('linux'):
+            return None
+        path = os.path.join(root, f'momoka-{os.getpid()}-{uuid.uuid4().hex[:8]}')
+        try:
+            os.mkdir(path)
+        except OSError as e:
+            log(f'limits | 无法创建 cgroup {path}: {e}')
+            return None
+        group = cls(path)
+        if limits.get('memory_mb'):
+            group._write('memory.max', str(int(limits['memory_mb']) * 1024 * 1024))
+        if limits.get('max_processes'):
+            group._write('pids.max', str(int(limits['max_processes'])))
+        return group
+
+    def _write(self, name: str, value: str):
+        try:
+            with open(os.path.join(self.path, name), 'w') as f:
+                f.write(value)
+        except OSError as e:
+            log(f'limits | 写入 {name} 失败: {e}')
+
+    def _read(self, name: str) -> str | None:
+        try:
+            with open(os.path.join(self.path, name)) as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def add(self, pid: int):
+        """把进程移入本 cgroup。"""
+        self._write('cgroup.procs', str(pid))
+
+    def peak_memory(self) -> int | None:
+        """进程树的峰值内存（字节）；内核不支持 memory.peak 时返回 None。"""
+        value = self._read('memory.peak')
+        return int(value) if value and value.strip().isdigit() else None
+
+    def kill(self):
+        """终止 cgroup 内的所有进程（含脱离进程组的后代）。"""
+        self._write('cgroup.kill', '1')
+
+    def remove(self):
+        for _ in range(20):
+            try:
+                os.rmdir(self.path)
+                return
+            except OSError:
+                time.sleep(0.05)   # 进程刚被终止，稍后重试
+        log(f'limits | 无法删除 cgroup {self.path}')
+
+
+# ── 施加限制 ──────────────────────────────────────────────────────────────
+
+def create_cgroup(limits: dict) -> Cgroup | None:
+    """启用 cgroup 时在启动命令之前创建子 cgroup；未配置或不可用时返回 None。"""
+    return Cgroup.create(limits.get('cgroup'), limits) if _IS_POSIX else None
+
+
+def _rlimits(limits: dict, cgroup: Cgroup | None) -> list[tuple[int, int, int]]:
+    import resource
+
+    def _mb(key):
+        return int(limits[key]) * 1024 * 1024 if limits.get(key) else None
+
+    rlimits = []
+    if limits.get('cpu_seconds'):
+        cpu = int(limits['cpu_seconds'])
+        # 软限制触发 SIGXCPU，硬限制留出余量后 SIGKILL
+        rlimits.append((resource.RLIMIT_CPU, cpu, cpu + 5))
+    if _mb('file_size_mb'):
+        rlimits.append((resource.RLIMIT_FSIZE, _mb('file_size_mb'), _mb('file_size_mb')))
+    if cgroup is None:
+        if _mb('memory_mb'):
+            rlimits.append((resource.RLIMIT_DATA, _mb('memory_mb'), _mb('memory_mb')))
+        if limits.get('max_processes'):
+            nproc = _user_process_count() + int(limits['max_processes'])
+            rlimits.append((resource.RLIMIT_NPROC, nproc, nproc))
+    return rlimits
+
+
+def apply_limits(pid: int, limits: dict, cgroup: Cgroup | None = None):
+    """对刚启动的子进程施加限制：移入 cgroup，并通过 prlimit 设置其 rlimit（仅 Linux）。"""
+    if cgroup is not None:
+        cgroup.add(pid)
+    if not sys.platform.startswith('linux'):
+        return
+    import resource
+    for which, soft, hard in _rlimits(limits, cgroup):
+        try:
+            _, cur_hard = resource.prlimit(pid, which)
+            if cur_hard != resource.RLIM_INFINITY:
+                soft, hard = min(soft, cur_hard), min(hard, cur_hard)
+            resource.prlimit(pid, which, (soft, hard))
+        except ProcessLookupError:
+            return   # 子进程已经退出
+        except (ValueError, OSError) as e:
+            log(f'limits | prlimit {pid} 失败: {e}')
+
+
+# ── 回收与统计 ────────────────────────────────────────────────────────────
+
+class Usage:
+    """子进程的退出状态与资源占用。"""
+    __slots__ = ('returncode', 'user_time', 'sys_time', 'max_rss')
+
+    def __init__(self, returncode, user_time=None, sys_time=None, max_rss=None):
+        self.returncode = returncode
+        self.user_time = user_time
+        self.sys_time = sys_time
+        self.max_rss = max_rss   # 字节
+
+    def describe(self) -> str:
+        parts = [f'退出码 {self.returncode}']
+        code = self.returncode
+        # 负数为进程本身被信号终止；shell 以 128+N 报告其子进程被信号 N 终止
+        signum = -code if code is not None and code < 0 else (code - 128 if code and 128 < code < 160 else None)
+        if signum:
+            try:
+                name = signal.Signals(signum).name
+            except ValueError:
+                name = None
+            if name and (code < 0 or name in _SIGNAL_HINTS):
+                parts[0] += f'（{name}，{_SIGNAL_HINTS.get(name, "被信号终止")}）'
+        if self.user_time is not None:
+            parts.append(f'CPU 用户 {self.user_time:.2f}s / 系统 {self.sys_time:.2f}s')
+        if self.max_rss is not None:
+            parts.append(f'峰值内存 {self.max_rss / 1024 / 1024:.1f} MB')
+        return '[资源] ' + ' | '.join(parts)
+
+
+def _maxrss_bytes(ru_maxrss: int) -> int:
+    # Linux 以 KB 为单位，macOS 以字节为单位
+    return ru_maxrss if sys.platform == 'darwin' else ru_maxrss * 1024
+
+
+def wait_with_usage(proc, timeout: float | None = None) -> Usage | None:
+    """等待子进程结束并统计资源占用；超时返回 None（子进程仍在运行）。
+
+    POSIX 上通过 os.wait4 回收子进程，并同步设置 proc.returncode。
+    """
+    if not _IS_POSIX:
+        import subprocess
+        try:
+            return Usage(proc.wait(timeout=timeout))
+        except subprocess.TimeoutExpired:
+            return None
+
+    deadline = None if timeout is None else time.monotonic() + timeout
+    delay = 0.001
+    while True:
+        flags = 0 if deadline is None else os.WNOHANG
+        try:
+            pid, status, ru = os.wait4(proc.pid, flags)
+        except ChildProcessError:
+            # 已被其他地方回收，只能给出退出码
+            return Usage(proc.poll())
+        if pid:
+            proc.returncode = os.waitstatus_to_exitcode(status)
+            return Usage(proc.returncode, ru.ru_utime, ru.ru_stime, _maxrss_bytes(ru.ru_maxrss))
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return None
+        time.sleep(min(delay, remaining))
+        delay = min(delay * 2, 0.05)
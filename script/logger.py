@@ -1,43 +1,62 @@
 import logging
 import os
+import threading
 
 _BASE = os.path.dirname(os.path.abspath(__file__))   # script/ 目录
 _LOG_DIR = os.path.join(_BASE, '..', 'logs')         # Momoka/logs/
-os.makedirs(_LOG_DIR, exist_ok=True)
 
 _LOG_FILE      = os.path.join(_LOG_DIR, 'log.txt')
 _CHAT_LOG_FILE = os.path.join(_LOG_DIR, 'chat_history_log.txt')
 
-# ── 主日志（系统事件、指令解析等）────────────────────────────────────
-logging.basicConfig(
-    level=logging.INFO,
-    format='[%(asctime)s] %(message)s',
-    filename=_LOG_FILE,
-    filemode='a',
-    encoding='utf-8'
-)
-
-# ── 对话历史专用日志 ────────────────────────────────────────────────
+# 日志文件在第一次写日志时才创建，导入本模块不产生文件 I/O
 _chat_logger = logging.getLogger('chat_history')
-_chat_logger.setLevel(logging.INFO)
-_chat_logger.propagate = False  # 不传播到根 logger，避免混入 log.txt
+_ready = False
+_setup_lock = threading.Lock()
+
+
+def _setup():
+    global _ready
+    with _setup_lock:
+        if _ready:
+            return
+        os.makedirs(_LOG_DIR, exist_ok=True)
+
+        # ── 主日志（系统事件、指令解析等）────────────────────────────
+        logging.basicConfig(
+            level=logging.INFO,
+            format='[%(asctime)s] %(message)s',
+            filename=_LOG_FILE,
+            filemode='a',
+            encoding='utf-8'
+        )
+
+        # ── 对话历史专用日志 ────────────────────────────────────────
+        _chat_logger.setLevel(logging.INFO)
+        _chat_logger.propagate = False  # 不传播到根 logger，避免混入 log.txt
 
-_chat_handler = logging.FileHandler(_CHAT_LOG_FILE, mode='a', encoding='utf-8')
-_chat_handler.setFormatter(logging.Formatter('[%(asctime)s] %(message)s'))
-_chat_logger.addHandler(_chat_handler)
+        _chat_handler = logging.FileHandler(_CHAT_LOG_FILE, mode='a', encoding='utf-8')
+        _chat_handler.setFormatter(logging.Formatter('[%(asctime)s] %(message)s'))
+        _chat_logger.addHandler(_chat_handler)
+        _ready = True
 
 
 def log(message: str) -> None:
+    if not _ready:
+        _setup()
     logging.info(message)
 
 
 def chat_log(message: str) -> None:
     """记录 Bot 对话历史到 chat_history_log.txt。"""
+    if not _ready:
+        _setup()
     _chat_logger.info(message)
 
 
 def new_log():
     """清空 log.txt 和 chat_history_log.txt。"""
+    if not _ready:
+        _setup()
     with open(_LOG_FILE, 'w'):
         pass
     with open(_CHAT_LOG_FILE, 'w'):
@@ -46,6 +65,10 @@ def new_log():
 
 def user_log(message: str, end='\n', role='LOG') -> None:
     from config import get_config
+    from script.session import current
     if role in get_config().get('mute_log', []):
         return
-    print(f'[{role}] ' + message, end=end)
\ No newline at end of file
+    session = current()
+    # 服务模式下多个会话共用控制台，前缀中附带会话编号
+    tag = f'{role}|{session.id}' if session is not None else role
+    print(f'[{tag}] ' + message, end=end)
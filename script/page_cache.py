@@ -0,0 +1,264 @@
+"""
+page_cache.py —— 浏览器抓取的持久化磁盘缓存。
+
+HTTP 快速通道（http_fetch.http_get）与 Playwright 路由（子资源）共用同一份缓存：
+    - 以 URL 为键，响应体存为 <sha1>.bin，元数据统一记录在 index.json；
+    - 遵循 Cache-Control（no-store / no-cache / max-age / s-maxage）、Expires，
+      过期条目携带 ETag / Last-Modified 做条件请求，304 时直接复用缓存；
+    - 缓存跨会话共享：private、Vary: * / Cookie / Authorization 的响应，
+      以及携带 Cookie / Authorization 的请求（has_credentials）都不读写缓存；
+    - 调用方可传入 max_age（秒）覆盖响应头给出的新鲜度，max_age=0 表示强制刷新；
+    - 总大小超过 cache_max_mb 时按最近访问时间（LRU）淘汰；
+    - 离线模式（config 中 cache_offline 为 true 或环境变量 MOMOKA_CACHE_OFFLINE=1）
+      下只读缓存、不访问网络，可用于在测试中回放之前抓取过的页面。
+"""
+
+from __future__ import annotations
+
+import email.utils
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+
+from script.logger import log
+
+_BASE = os.path.dirname(os.path.abspath(__file__))
+_DEFAULT_DIR = os.path.join(_BASE, '..', 'cache', 'http')
+
+# 存入缓存时丢弃的响应头：响应体已解压，长度与编码信息不再有效
+_DROP_HEADERS = {'content-encoding', 'content-length', 'transfer-encoding', 'connection',
+                 'keep-alive', 'set-cookie'}
+
+# 携带这些请求头时响应可能因用户而异，不能放入跨会话共享的缓存
+_CREDENTIAL_HEADERS = {'cookie', 'authorization'}
+_PRIVATE_VARY = {'*', 'cookie', 'authorization'}
+
+_lock = threading.Lock()
+_index: dict[str, dict] | None = None
+_index_dir: str | None = None
+
+
+class OfflineMiss(Exception):
+    """离线模式下请求了未缓存的 URL。"""
+
+
+def _cfg() -> dict:
+    try:
+        from config import get_config
+        return get_config()
+    except Exception:
+        return {}
+
+
+def cache_enabled() -> bool:
+    return bool(_cfg().get('http_cache', True))
+
+
+def offline() -> bool:
+    if os.environ.get('MOMOKA_CACHE_OFFLINE', '') not in ('', '0'):
+        return True
+    return bool(_cfg().get('cache_offline', False))
+
+
+def _cache_dir() -> str:
+    return _cfg().get('cache_dir') or _DEFAULT_DIR
+
+
+def _max_bytes() -> int:
+    return int(_cfg().get('cache_max_mb', 200)) * 1024 * 1024
+
+
+def _key(url: str) -> str:
+    return hashlib.sha1(url.encode('utf-8')).hexdigest()
+
+
+# ── 索引读写（调用方需持有 _lock）────────────────────────────────────────
+
+def _load_index() -> dict[str, dict]:
+    global _index, _index_dir
+    cache_dir = _cache_dir()
+    if _index is None or _index_dir != cache_dir:
+        _index_dir = cache_dir
+        try:
+            with open(os.path.join(cache_dir, 'index.json'), 'r', encoding='utf-8') as f:
+                _index = json.load(f)
+        except (OSError, ValueError):
+            _index = {}
+    return _index
+
+
+def _save_index():
+    os.makedirs(_index_dir, exist_ok=True)
+    path = os.path.join(_index_dir, 'index.json')
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(_index, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def _evict(index: dict[str, dict]):
+    """按最近访问时间淘汰条目，直到总大小不超过上限。"""
+    limit = _max_bytes()
+    total = sum(e['size'] for e in index.values())
+    if total <= limit:
+        return
+    for key, entry in sorted(index.items(), key=lambda kv: kv[1]['last_access']):
+        try:
+            os.remove(os.path.join(_index_dir, key + '.bin'))
+        except OSError:
+            pass
+        del index[key]
+        total -= entry['size']
+        log(f'page_cache | evict {entry["url"]}')
+        if total <= limit:
+            break
+
+
+# ── 新鲜度计算 ────────────────────────────────────────────────────────────
+
+def _parse_date(value: str | None) -> float | None:
+    if not value:
+        return None
+    try:
+        return email.utils.parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+def _freshness_lifetime(headers: dict) -> float:
+    """根据响应头计算新鲜期（秒）。"""
+    cc = headers.get('cache-control', '').lower()
+    if 'no-cache' in cc or 'no-store' in cc:
+        return 0
+    m = re.search(r's-maxage=(\d+)', cc) or re.search(r'max-age=(\d+)', cc)
+    if m:
+        return int(m.group(1))
+    expires = _parse_date(headers.get('expires'))
+    if expires is not None:
+        date = _parse_date(headers.get('date')) or time.time()
+        return max(0.0, expires - date)
+    # 启发式：Last-Modified 距今时长的 10%，最多一天
+    last_modified = _parse_date(headers.get('last-modified'))
+    if last_modified is not None:
+        return min(86400.0, max(0.0, (time.time() - last_modified) * 0.1))
+    return 0
+
+
+def is_fresh(entry: dict, max_age: int | None = None) -> bool:
+    """判断缓存条目是否可以不经验证直接使用。max_age 优先于响应头。"""
+    age = time.time() - entry['stored_at']
+    if max_age is not None:
+        return age <= max_age
+    return age <= entry['lifetime']
+
+
+def validators(entry: dict) -> dict:
+    """返回条件请求头（If-None-Match / If-Modified-Since）。"""
+    headers = {}
+    if entry['headers'].get('etag'):
+        headers['If-None-Match'] = entry['headers']['etag']
+    if entry['headers'].get('last-modified'):
+        headers['If-Modified-Since'] = entry['headers']['last-modified']
+    return headers
+
+
+# ── 对外接口 ──────────────────────────────────────────────────────────────
+
+def lookup(url: str) -> dict | None:
+    """查找缓存条目（不含响应体），并刷新其 LRU 访问时间。"""
+    with _lock:
+        entry = _load_index().get(_key(url))
+        if entry is not None:
+            entry['last_access'] = time.time()
+        return entry
+
+
+def read_body(url: str) -> bytes | None:
+    """读取缓存的响应体，文件缺失时返回 None。"""
+    try:
+        with open(os.path.join(_cache_dir(), _key(url) + '.bin'), 'rb') as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def has_credentials(request_headers: dict | None) -> bool:
+    """请求是否携带 Cookie / Authorization（此类请求既不查缓存也不写缓存）。"""
+    return any(k.lower() in _CREDENTIAL_HEADERS and v for k, v in (request_headers or {}).items())
+
+
+def _shareable(headers: dict, require_public: bool) -> bool:
+    """响应能否放入共享缓存：排除 no-store、private 与按 Cookie 等区分内容的 Vary。"""
+    directives = {d.strip().split('=', 1)[0] for d in headers.get('cache-control', '').lower().split(',')}
+    if 'no-store' in directives or 'private' in directives:
+        return False
+    if {v.strip() for v in headers.get('vary', '').lower().split(',')} & _PRIVATE_VARY:
+        return False
+    return not require_public or 'public' in directives
+
+
+def store(url: str, status: int, headers: dict, body: bytes, final_url: str | None = None,
+          request_headers: dict | None = None, require_public: bool = False) -> bool:
+    """写入缓存，返回是否写入。
+
+    状态码不可缓存、响应不可共享（见 _shareable）或请求携带凭据时跳过；
+    require_public 为 True 时只缓存显式声明 Cache-Control: public 的响应。
+    """
+    headers = {k.lower(): v for k, v in headers.items()}
+    if status != 200 or has_credentials(request_headers) or not _shareable(headers, require_public):
+        return False
+    key = _key(url)
+    with _lock:
+        index = _load_index()
+        os.makedirs(_index_dir, exist_ok=True)
+        path = os.path.join(_index_dir, key + '.bin')
+        tmp = f'{path}.{threading.get_ident()}.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(body)
+        os.replace(tmp, path)
+        now = time.time()
+        index[key] = {
+            'url': url,
+            'final_url': final_url or url,
+            'status': status,
+            'headers': {k: v for k, v in headers.items() if k not in _DROP_HEADERS},
+            'size': len(body),
+            'stored_at': now,
+            'last_access': now,
+            'lifetime': _freshness_lifetime(headers),
+        }
+        _evict(index)
+        _save_index()
+    return True
+
+
+def refresh(url: str, headers: dict):
+    """收到 304 后，更新条目的存储时间与新鲜期。"""
+    headers = {k.lower(): v for k, v in headers.items()}
+    with _lock:
+        entry = _load_index().get(_key(url))
+        if entry is None:
+            return
+        for k in ('cache-control', 'expires', 'date', 'etag', 'last-modified'):
+            if k in headers:
+                entry['headers'][k] = headers[k]
+        entry['stored_at'] = time.time()
+        entry['lifetime'] = _freshness_lifetime(entry['headers'])
+        _save_index()
+
+
+def clear():
+    """清空全部缓存。"""
+    global _index
+    with _lock:
+        index = _load_index()
+        for key in list(index):
+            try:
+                os.remove(os.path.join(_index_dir, key + '.bin'))
+            except OSError:
+                pass
+        _index = {}
+        _save_index()
@@ -0,0 +1,258 @@
+"""
+patch.py —— apply_patch 工具：一次调用原子地应用多文件、多处修改。
+
+支持两种输入：
+    - patch: 统一 diff（unified diff）文本，可包含多个文件、多个 @@ 块，
+             支持 /dev/null 新建或删除文件；
+    - edits: [{file_path, old_text, new_text}, ...] 形式的替换列表。
+
+流程：
+    1. 读取所有目标文件，在内存中依次应用每个修改块；
+       定位时先精确匹配，再依次尝试忽略行尾空白、忽略首尾空白的模糊匹配，
+       统一 diff 的上下文还允许偏移到最近的匹配位置；
+    2. 任一修改块无法定位则整体放弃，不写入任何文件，并返回具体原因；
+    3. 全部通过后经 fileio.atomic_write_many 一次性落盘（临时文件 + rename，失败自动回滚）。
+"""
+
+from __future__ import annotations
+
+import difflib
+import os
+import re
+
+_HUNK_HEADER = re.compile(r'^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@')
+
+
+class PatchError(Exception):
+    """补丁无法应用。"""
+
+
+# ── 解析统一 diff ─────────────────────────────────────────────────────────
+
+def _strip_prefix(path: str) -> str | None:
+    path = path.split('\t', 1)[0].strip()
+    if path == '/dev/null':
+        return None
+    if path.startswith(('a/', 'b/')):
+        path = path[2:]
+    return path
+
+
+def _blank_is_context(lines: list[str], i: int) -> bool:
+    """空行之后仍有修改块内容时，视为丢失了前导空格的空上下文行。"""
+    for nxt in lines[i + 1:]:
+        if nxt == '':
+            continue
+        return nxt.startswith((' ', '-', '+')) and not nxt.startswith(('--- ', '+++ '))
+    return False
+
+
+def parse_unified_diff(text: str) -> list[dict]:
+    """解析统一 diff，返回 [{'old_path', 'new_path', 'hunks': [{'start', 'old', 'new'}]}]。"""
+    files: list[dict] = []
+    current: dict | None = None
+    hunk: dict | None = None
+    lines = text.splitlines()
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+        if line.startswith('--- ') and i + 1 < len(lines) and lines[i + 1].startswith('+++ '):
+            current = {'old_path': _strip_prefix(line[4:]), 'new_path': _strip_prefix(lines[i + 1][4:]), 'hunks': []}
+            files.append(current)
+            hunk = None
+            i += 2
+            continue
+        m = _HUNK_HEADER.match(line)
+        if m:
+            if current is None:
+                raise PatchError(f'第 {i + 1} 行: @@ 块之前缺少 ---/+++ 文件头')
+            hunk = {'start': int(m.group(1)), 'old': [], 'new': []}
+            current['hunks'].append(hunk)
+        elif hunk is not None and (line.startswith((' ', '-', '+')) or (line == '' and _blank_is_context(lines, i))):
+            # 部分编辑器会去掉空上下文行前的空格，夹在修改块中间的空行按上下文处理
+            tag, body = (line[0], line[1:]) if line else (' ', '')
+            if tag in (' ', '-'):
+                hunk['old'].append(body)
+            if tag in (' ', '+'):
+                hunk['new'].append(body)
+        elif line.startswith('\\'):
+            pass  # "\ No newline at end of file"
+        i += 1
+    if not files:
+        raise PatchError('未在补丁中找到任何文件（需要 --- / +++ 文件头）')
+    return files
+
+
+# ── 定位 ─────────────────────────────────────────────────────────────────
+
+_NORMALIZERS = (
+    ('', lambda s: s),
+    ('忽略行尾空白', lambda s: s.rstrip()),
+    ('忽略首尾空白', lambda s: s.strip()),
+)
+
+
+def _find_block(lines: list[str], block: list[str], expected: int) -> tuple[int, str] | None:
+    """在 lines 中查找 block，返回 (起始下标, 匹配方式说明)；多处匹配时取最接近 expected 的一处。"""
+    if not block:
+        return min(max(expected, 0), len(lines)), ''
+    for label, norm in _NORMALIZERS:
+        target = [norm(b) for b in block]
+        normed = [norm(line) for line in lines] if label else lines
+        positions = [
+            i for i in range(len(lines) - len(block) + 1)
+            if normed[i] == target[0] and normed[i:i + len(block)] == target
+        ]
+        if positions:
+            best = min(positions, key=lambda p: abs(p - expected))
+            return best, label
+    return None
+
+
+def _apply_hunk(lines: list[str], old: list[str], new: list[str], expected: int) -> tuple[list[str], str]:
+    """应用单个修改块，返回 (新行列表, 说明)。上下文无法精确定位时逐步裁掉首尾上下文行重试。"""
+    found = _find_block(lines, old, expected)
+    if found is not None:
+        pos, label = found
+        note = label
+        if abs(pos - expected) > 0 and expected >= 0:
+            note = '，'.join(x for x in (label, f'偏移 {pos - expected:+d} 行') if x)
+        return lines[:pos] + new + lines[pos + len(old):], note
+
+    # 模糊上下文（fuzz）：首尾上下文行同时存在于 old 与 new 中，可以成对裁掉
+    for fuzz in (1, 2):
+        if len(old) <= 2 * fuzz:
+            break
+        head, tail = old[:fuzz], old[-fuzz:]
+        if new[:fuzz] != head or new[-fuzz:] != tail:
+            break
+        found = _find_block(lines, old[fuzz:-fuzz], expected + fuzz)
+        if found is not None:
+            pos, label = found
+            note = '，'.join(x for x in (label, f'忽略 {fuzz} 行上下文') if x)
+            return lines[:pos] + new[fuzz:-fuzz] + lines[pos + len(old) - 2 * fuzz:], note
+    raise PatchError('无法定位修改块，上下文与文件内容不符:\n' + '\n'.join(f'  {line}' for line in old[:6]))
+
+
+def _apply_edit(content: str, old_text: str, new_text: str) -> tuple[str, str]:
+    """按 (old_text, new_text) 替换；要求 old_text 唯一，精确匹配失败时按行做空白模糊匹配。"""
+    if not old_text:
+        raise PatchError('old_text 不能为空')
+    count = content.count(old_text)
+    if count == 1:
+        return content.replace(old_text, new_text, 1), ''
+    if count > 1:
+        raise PatchError(f'old_text 在文件中出现了 {count} 次，请提供更多上下文使其唯一')
+
+    lines = content.split('\n')
+    old_lines = old_text.strip('\n').split('\n')
+    for label, norm in _NORMALIZERS[1:]:
+        target = [norm(x) for x in old_lines]
+        normed = [norm(x) for x in lines]
+        positions = [i for i in range(len(lines) - len(old_lines) + 1)
+                     if normed[i:i + len(old_lines)] == target]
+        if len(positions) == 1:
+            pos = positions[0]
+            new_lines = new_text.strip('\n').split('\n')
+            return '\n'.join(lines[:pos] + new_lines + lines[pos + len(old_lines):]), label
+        if len(positions) > 1:
+            raise PatchError(f'old_text（{label}）在文件中出现了 {len(positions)} 次，请提供更多上下文使其唯一')
+    raise PatchError('在文件中未找到 old_text')
+
+
+# ── 对外入口 ─────────────────────────────────────────────────────────────
+
+def _resolve(path: str, cwd: str) -> str:
+    return path if os.path.isabs(path) else os.path.normpath(os.path.join(cwd, path))
+
+
+def _read(path: str, encoding: str) -> str | None:
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding=encoding) as f:
+        return f.read()
+
+
+def plan_patch(patch: str | None, edits: list[dict] | None, cwd: str,
+               encoding: str = 'utf-8') -> tuple[dict[str, str | None], list[str]]:
+    """在内存中应用所有修改，返回 (待写入内容 {绝对路径: 新内容或 None 表示删除}, 每个文件的摘要)。
+
+    任一修改无法应用时抛出 PatchError，不产生任何副作用。
+    """
+    originals: dict[str, str | None] = {}
+    contents: dict[str, str | None] = {}
+    notes: dict[str, list[str]] = {}
+    counts: dict[str, int] = {}
+
+    def load(path: str) -> str | None:
+        if path not in contents:
+            originals[path] = contents[path] = _read(path, encoding)
+            notes[path], counts[path] = [], 0
+        return contents[path]
+
+    if patch:
+        for fdiff in parse_unified_diff(patch):
+            old_rel, new_rel = fdiff['old_path'], fdiff['new_path']
+            path = _resolve(new_rel or old_rel, cwd)
+            content = load(path)
+            if old_rel is None:
+                if content is not None:
+                    raise PatchError(f'{path}: 补丁要新建文件，但文件已存在')
+                content = ''
+            elif content is None:
+                raise PatchError(f'{path}: 文件不存在')
+            if new_rel is None:
+                contents[path] = None
+                counts[path] += 1
+                continue
+            had_newline = content.endswith('\n') or content == ''
+            lines = content.split('\n')
+            if had_newline and lines and lines[-1] == '':
+                lines.pop()
+            shift = 0
+            for hunk in fdiff['hunks']:
+                expected = hunk['start'] - 1 + shift
+                try:
+                    lines, note = _apply_hunk(lines, hunk['old'], hunk['new'], expected)
+                except PatchError as e:
+                    raise PatchError(f'{path} 第 {hunk["start"]} 行附近的修改块: {e}')
+                shift += len(hunk['new']) - len(hunk['old'])
+                counts[path] += 1
+                if note:
+                    notes[path].append(note)
+            contents[path] = '\n'.join(lines) + ('\n' if had_newline and lines else '')
+
+    for i, edit in enumerate(edits or [], 1):
+        path = _resolve(edit.get('file_path', ''), cwd)
+        content = load(path)
+        if content is None:
+            raise PatchError(f'第 {i} 个 edit: 文件不存在: {path}')
+        try:
+            contents[path], note = _apply_edit(content, edit.get('old_text', ''), edit.get('new_text', ''))
+        except PatchError as e:
+            raise PatchError(f'第 {i} 个 edit（{path}）: {e}')
+        counts[path] += 1
+        if note:
+            notes[path].append(note)
+
+    writes = {p: c for p, c in contents.items() if c != originals[p]}
+    summary = []
+    for path in contents:
+        old, new = originals[path], contents[path]
+        if new is None:
+            summary.append(f'{path}: 已删除')
+            continue
+        if path not in writes:
+            summary.append(f'{path}: 无变化')
+            continue
+        old_lines = (old or '').splitlines()
+        new_lines = new.splitlines()
+        added = removed = 0
+        for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False).get_opcodes():
+            if tag != 'equal':
+                removed += i2 - i1
+                added += j2 - j1
+        extra = f'（{"; ".join(dict.fromkeys(notes[path]))}）' if notes[path] else ''
+        created = '新建，' if old is None else ''
+        summary.append(f'{path}: {created}{counts[path]} 处修改，+{added} -{removed}{extra}')
+    return writes, summary
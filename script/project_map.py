@@ -0,0 +1,235 @@
+"""
+project_map.py —— project_map 工具：目录结构概览。
+
+为根目录（当前目录 where）维护一棵缓存的目录树，每个目录节点保存：
+    - 目录自身的 mtime、文件 {名称: 大小}、子目录节点、被忽略的子目录名；
+    - 汇总信息：文件数、总大小、按语言（扩展名）统计的字节数。
+刷新时只对每个目录做一次 stat：目录 mtime 未变（没有增删改名）时沿用缓存的文件列表，
+变化时才重新 scandir 该目录，汇总信息自下而上重新合并，因此大仓库的刷新开销与目录数而非文件数相关。
+（原地修改文件不改变目录 mtime，其大小可能滞后到目录下次变化时更新；工具写入经 rename 落盘，不受影响。）
+
+被忽略的目录（DEFAULT_IGNORED_DIRS 与 .gitignore / .ignore）不进入遍历，只在输出中折叠列出。
+输出按深度（depth）与每个目录的条目数（max_entries）截断，可通过 path 下钻到子目录。
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+
+from script.ignore import DEFAULT_IGNORED_DIRS, IgnoreRules
+from script.logger import log
+
+MAX_LINES = 200
+
+LANGUAGES = {
+    '.py': 'Python', '.pyi': 'Python', '.ipynb': 'Jupyter',
+    '.js': 'JavaScript', '.mjs': 'JavaScript', '.cjs': 'JavaScript', '.jsx': 'JavaScript',
+    '.ts': 'TypeScript', '.tsx': 'TypeScript', '.vue': 'Vue', '.svelte': 'Svelte',
+    '.java': 'Java', '.kt': 'Kotlin', '.kts': 'Kotlin', '.scala': 'Scala', '.groovy': 'Groovy',
+    '.go': 'Go', '.rs': 'Rust', '.c': 'C', '.h': 'C', '.cc': 'C++', '.cpp': 'C++', '.cxx': 'C++',
+    '.hpp': 'C++', '.hh': 'C++', '.cs': 'C#', '.swift': 'Swift', '.m': 'Objective-C', '.mm': 'Objective-C',
+    '.rb': 'Ruby', '.php': 'PHP', '.pl': 'Perl', '.lua': 'Lua', '.r': 'R', '.jl': 'Julia', '.dart': 'Dart',
+    '.ex': 'Elixir', '.exs': 'Elixir', '.erl': 'Erlang', '.hs': 'Haskell', '.clj': 'Clojure',
+    '.sh': 'Shell', '.bash': 'Shell', '.zsh': 'Shell', '.ps1': 'PowerShell', '.bat': 'Batch', '.cmd': 'Batch',
+    '.sql': 'SQL', '.html': 'HTML', '.htm': 'HTML', '.css': 'CSS', '.scss': 'SCSS', '.less': 'Less',
+    '.md': 'Markdown', '.rst': 'reStructuredText', '.txt': 'Text', '.tex': 'TeX',
+    '.json': 'JSON', '.yaml': 'YAML', '.yml': 'YAML', '.toml': 'TOML', '.ini': 'INI', '.cfg': 'INI',
+    '.xml': 'XML', '.csv': 'CSV', '.proto': 'Protobuf', '.gradle': 'Gradle', '.cmake': 'CMake',
+}
+_SPECIAL_NAMES = {'Makefile': 'Makefile', 'Dockerfile': 'Dockerfile', 'CMakeLists.txt': 'CMake'}
+
+
+def language_of(name: str) -> str | None:
+    """按文件名推断语言，未知时返回 None。"""
+    if name in _SPECIAL_NAMES:
+        return _SPECIAL_NAMES[name]
+    return LANGUAGES.get(os.path.splitext(name)[1].lower())
+
+
+def _fmt_size(size: int) -> str:
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024 or unit == 'GB':
+            return f'{size:.0f} {unit}' if unit == 'B' else f'{size:.1f} {unit}'
+        size /= 1024
+    return f'{size:.1f} GB'
+
+
+class _Dir:
+    __slots__ = ('mtime', 'rules', 'files', 'dirs', 'ignored',
+                 'own_langs', 'own_size', 'total_files', 'total_size', 'langs')
+
+    def __init__(self):
+        self.mtime = -1
+        self.rules: IgnoreRules | None = None
+        self.files: dict[str, int] = {}
+        self.dirs: dict[str, _Dir] = {}
+        self.ignored: list[str] = []
+        self.own_langs: dict[str, int] = {}
+        self.own_size = 0
+        self.total_files = 0
+        self.total_size = 0
+        self.langs: dict[str, int] = {}
+
+
+class ProjectTree:
+    """单个根目录的缓存目录树。"""
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+        self.node = _Dir()
+        self.last_refresh = 0.0
+        self._lock = threading.Lock()
+
+    def refresh(self) -> tuple[int, float]:
+        """按目录 mtime 增量刷新，返回 (重新扫描的目录数, 耗时秒数)。"""
+        with self._lock:
+            started = time.time()
+            rescanned = self._scan(self.node, self.root, '', IgnoreRules())
+            self.last_refresh = time.time()
+            return rescanned, self.last_refresh - started
+
+    def _scan(self, node: _Dir, abs_dir: str, rel_dir: str, parent_rules: IgnoreRules) -> int:
+        try:
+            mtime = os.stat(abs_dir).st_mtime_ns
+        except OSError:
+            return 0
+        rescanned = 0
+        if mtime != node.mtime:
+            rescanned = 1
+            node.mtime = mtime
+            node.rules = parent_rules.extend_from(abs_dir, rel_dir)
+            files, subdirs, ignored = {}, [], []
+            try:
+                entries = list(os.scandir(abs_dir))
+            except OSError:
+                entries = []
+            for entry in entries:
+                rel = f'{rel_dir}/{entry.name}' if rel_dir else entry.name
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if entry.name in DEFAULT_IGNORED_DIRS or node.rules.ignored(rel, True):
+                            ignored.append(entry.name)
+                        else:
+                            subdirs.append(entry.name)
+                    elif entry.is_file(follow_symlinks=False) and not node.rules.ignored(rel, False):
+                        files[entry.name] = entry.stat(follow_symlinks=False).st_size
+                except OSError:
+                    continue
+            node.files = files
+            node.ignored = sorted(ignored)
+            node.dirs = {name: node.dirs.get(name) or _Dir() for name in sorted(subdirs)}
+            node.own_size = sum(files.values())
+            langs: dict[str, int] = {}
+            for name, size in files.items():
+                lang = language_of(name)
+                if lang:
+                    langs[lang] = langs.get(lang, 0) + size
+            node.own_langs = langs
+
+        total_files, total_size, langs = len(node.files), node.own_size, dict(node.own_langs)
+        for name, child in node.dirs.items():
+            rel = f'{rel_dir}/{name}' if rel_dir else name
+            rescanned += self._scan(child, os.path.join(abs_dir, name), rel, node.rules)
+            total_files += child.total_files
+            total_size += child.total_size
+            for lang, size in child.langs.items():
+                langs[lang] = langs.get(lang, 0) + size
+        node.total_files, node.total_size, node.langs = total_files, total_size, langs
+        return rescanned
+
+    def find(self, rel: str) -> _Dir | None:
+        node = self.node
+        for part in [p for p in rel.replace('\\', '/').split('/') if p and p != '.']:
+            node = node.dirs.get(part)
+            if node is None:
+                return None
+        return node
+
+
+def _lang_summary(langs: dict[str, int], total: int, top: int = 3) -> str:
+    if not langs or not total:
+        return ''
+    ranked = sorted(langs.items(), key=lambda kv: -kv[1])[:top]
+    return '，'.join(f'{lang} {size * 100 // total}%' for lang, size in ranked if size * 100 // total)
+
+
+def _dir_line(name: str, node: _Dir) -> str:
+    langs = _lang_summary(node.langs, node.total_size)
+    return f'{name}/  {node.total_files} 个文件，{_fmt_size(node.total_size)}' + (f'（{langs}）' if langs else '')
+
+
+def render(node: _Dir, depth: int, max_entries: int) -> list[str]:
+    """渲染目录树摘要：子目录按总大小降序，文件按大小降序，每层最多 max_entries 个条目。"""
+    lines: list[str] = []
+
+    def walk(n: _Dir, level: int):
+        indent = '  ' * level
+        dirs = sorted(n.dirs.items(), key=lambda kv: (-kv[1].total_size, kv[0]))
+        files = sorted(n.files.items(), key=lambda kv: (-kv[1], kv[0]))
+        shown = 0
+        for name, child in dirs:
+            if shown >= max_entries or len(lines) >= MAX_LINES:
+                break
+            lines.append(indent + _dir_line(name, child))
+            shown += 1
+            if level + 1 < depth:
+                walk(child, level + 1)
+        for name, size in files:
+            if shown >= max_entries or len(lines) >= MAX_LINES:
+                break
+            lines.append(f'{indent}{name}  {_fmt_size(size)}')
+            shown += 1
+        hidden = len(dirs) + len(files) - shown
+        if hidden > 0:
+            lines.append(f'{indent}…（另有 {hidden} 个条目）')
+        if n.ignored:
+            lines.append(f'{indent}[已忽略] ' + ' '.join(f'{d}/' for d in n.ignored))
+
+    walk(node, 0)
+    return lines
+
+
+# ── 模块级缓存 ────────────────────────────────────────────────────────────
+
+_trees: dict[str, ProjectTree] = {}
+_trees_lock = threading.Lock()
+
+
+def get_tree(root: str) -> ProjectTree:
+    root = os.path.abspath(root)
+    with _trees_lock:
+        tree = _trees.get(root)
+        if tree is None:
+            tree = _trees[root] = ProjectTree(root)
+    return tree
+
+
+def project_map(path: str | None = None, depth: int = 2, max_entries: int = 15) -> str:
+    """project_map 工具入口。path 为空时概览当前目录，否则下钻到该子目录。"""
+    from script.system import get_cwd
+    cwd = get_cwd()
+    target = os.path.abspath(os.path.join(cwd, path)) if path else cwd
+    if not os.path.isdir(target):
+        return f'目录不存在: {target}'
+
+    # 目标位于已缓存的根目录之内时复用该树，否则以目标目录为根
+    with _trees_lock:
+        roots = sorted((r for r in _trees if target == r or target.startswith(r + os.sep)), key=len)
+    root = roots[0] if roots else (cwd if target.startswith(cwd + os.sep) else target)
+    tree = get_tree(root)
+    rescanned, elapsed = tree.refresh()
+    log(f'project_map | {root}: 重新扫描 {rescanned} 个目录（{elapsed:.2f}s）')
+
+    node = tree.find(os.path.relpath(target, root)) if target != root else tree.node
+    if node is None:
+        return f'目录已被忽略或不存在: {target}'
+    depth = max(1, min(int(depth), 6))
+    max_entries = max(1, int(max_entries))
+    langs = _lang_summary(node.langs, node.total_size, top=5)
+    header = f'{target}: {node.total_files} 个文件，{_fmt_size(node.total_size)}' + (f'（{langs}）' if langs else '')
+    lines = render(node, depth, max_entries)
+    if len(lines) >= MAX_LINES:
+        lines.append(f'…（输出已截断，可用 path 下钻到子目录）')
+    return header + '\n' + '\n'.join('  ' + line for line in lines)
@@ -1,57 +1,51 @@
 """
 prompt_builder.py —— 系统提示词构建。
 
-负责发现可用技能并组装 Momoka 的 system prompt。
+负责组装 Momoka 的 system prompt，以及在用户消息后附上检索到的相关技能。
 """
 
-import os
 import sys
 
 import config
 from config import get_config
+from script.skill_index import get_index
+from script.skills import get_registry
 from script.system import get_cwd
+from script.tools_def import initial_groups
 
 
 def discover_skills(cfg: dict) -> list[dict]:
-    """扫描项目 skills 目录，返回所有合法技能的元数据列表（含 name/description）。"""
-    skills_dir = cfg.get('skills_dir', 'skill')
-    # 优先用绝对路径；否则以 config.py 所在的项目根目录为基准，
-    # 而不是 work_dir（work_dir 是用户工作目录，不是项目目录）。
-    if os.path.isabs(skills_dir):
-        skills_root = skills_dir
-    else:
-        project_root = os.environ.get('MOMOKA_PROJECT_DIR', os.path.dirname(os.path.abspath(__file__)) + '/..')
-        skills_root = os.path.join(project_root, skills_dir)
-    found = []
+    """返回所有合法技能的元数据列表（含 name/description），由技能注册表缓存。"""
+    return [
+        {'name': s['name'], 'description': s['description']}
+        for s in get_registry(cfg).list_skills()
+    ]
+
 
-    if not os.path.isdir(skills_root):
-        return found
+def build_skill_hint(message: str) -> str:
+    """返回附在用户消息后的 BM25 检索出的 top-k 相关技能（skill_top_k，默认 5；0 表示关闭），无结果时为空串。
 
-    for entry in sorted(os.listdir(skills_root)):
-        skill_path = os.path.join(skills_root, entry)
-        skill_md = os.path.join(skill_path, 'SKILL.md')
-        if not (os.path.isdir(skill_path) and os.path.isfile(skill_md)):
-            continue
-        meta = {'name': entry, 'description': ''}
-        try:
-            with open(skill_md, 'r', encoding=cfg.get('encoding', 'utf-8')) as fh:
-                lines = fh.readlines()
-            if lines and lines[0].strip() == '---':
-                for line in lines[1:]:
-                    if line.strip() == '---':
-                        break
-                    if line.startswith('description:'):
-                        meta['description'] = line.split(':', 1)[1].strip().strip('"\'')
-                        break
-        except Exception:
-            pass
-        found.append(meta)
+    作为 Bot.message 的 hint 传入：只随请求发送，不写入对话历史。
+    """
+    cfg = get_config()
+    top_k = int(cfg.get('skill_top_k', 5))
+    if top_k <= 0:
+        return ''
+    hits = get_index(get_registry(cfg)).search(message, top_k)
+    if not hits:
+        return ''
+    lines = [
+        f'  - {s["name"]}: {s["description"]}' if s['description'] else f'  - {s["name"]}'
+        for s, _ in hits
+    ]
+    return '\n\n<相关skill>\n' + '\n'.join(lines) + '\n</相关skill>'
 
-    return found
 
+def build_system_prompt(grouped: bool = True) -> str:
+    """构建并返回 Momoka 的完整 system prompt。
 
-def build_system_prompt() -> str:
-    """构建并返回 Momoka 的完整 system prompt。"""
+    grouped 为 False 时（工具列表固定的子 Bot）不提示调用 enable_tools。
+    """
     cfg = get_config()
 
     if sys.platform == 'win32':
@@ -61,12 +55,11 @@ def build_system_prompt() -> str:
     else:
         platform_hint = f'Linux（{sys.platform}）'
 
-    skills = discover_skills(cfg)
-    if skills:
-        skills_hint = '\n<可用skill>\n' + '\n'.join(
-            f'  - {s["name"]}: {s["description"]}' if s['description']
-            else f'  - {s["name"]}'
-            for s in skills
+    skill_count = len(get_registry(cfg).list_skills())
+    if skill_count:
+        skills_hint = (
+            f'\n<skill>\n  技能库共 {skill_count} 个skill。每条用户消息后会以 <相关skill> 附上最相关的几个，'
+            '其他skill可通过 search_skills 按关键词检索，再用 get_skill 加载。\n</skill>'
         )
     else:
         skills_hint = ''
@@ -82,7 +75,9 @@ def build_system_prompt() -> str:
         "- 优先在工作目录中进行操作；如需操作工作目录之外的文件，请先通过 ask_user 征得同意。\n"
         "- 工作时告知你正在做或做了什么以及为什么这样做。\n"
         "- 执行任务前先查看并调用可能会用到的skill。\n"
-        "- 完成所有工作后，调用 finish 交付成果。\n"
+        "- 完成所有工作后，调用 finish 交付成果。\n" +
+        ("- 浏览网页、技能库、后台任务、代码导航、子任务委派等工具按需启用，需要时先调用 enable_tools。\n"
+         if grouped and initial_groups(cfg) is not None else "") +
         f"{(chr(10) + cfg['prompt']) if cfg.get('prompt') else ''}"
         f"{skills_hint}"
     )
\ No newline at end of file
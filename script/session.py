@@ -0,0 +1,87 @@
+"""
+session.py —— 会话（Session）：一次对话独占的运行时状态。
+
+交互式 REPL 与批处理每个进程只有一个对话，运行时状态直接存放在各模块的全局变量中
+（config 的 working config、system 的 cwd / env、browser 的页面）。
+服务模式（server.py）在一个进程内同时承载多个对话，每个对话对应一个 Session：
+
+    - working: 运行时配置（where / wait 等），只保存在内存中，不写回 working_config.json；
+    - env:     system_command 使用的环境变量；
+    - browser: 浏览器状态（独立的 BrowserContext 与页面，共享同一个 Chromium 进程）；
+    - jobs:    后台任务表（job_start 启动的命令）；
+    - checkpoints: 文件修改的检查点栈（/undo 与 rollback 工具）；
+    - kernel:  python_exec 的常驻 Python 工作进程；
+    - bot:     该会话的 Bot 实例。
+
+当前会话通过 contextvars 传递：use_session() 期间，config / system / browser 等模块
+读取 current() 返回的 Session 而不是模块全局状态；未设置会话时 current() 返回 None，
+各模块沿用原有的全局状态。浏览器线程等跨线程调用需用 contextvars.copy_context() 携带当前会话。
+
+本模块不导入 config，避免循环导入。
+"""
+
+from __future__ import annotations
+
+import contextlib
+import contextvars
+import os
+import threading
+import time
+import uuid
+
+_current: contextvars.ContextVar[Session | None] = contextvars.ContextVar('momoka_session', default=None)
+
+
+class Session:
+    """一个对话的运行时状态。"""
+
+    def __init__(self, working: dict, env: dict[str, str] | None = None, session_id: str | None = None):
+        self.id = session_id or uuid.uuid4().hex[:12]
+        self.working = dict(working)
+        self.env = os.environ.copy()
+        if env:
+            self.env.update({k: str(v) for k, v in env.items()})
+        self.browser = None        # 由 browser.py 按需创建
+        self.jobs = None           # 后台任务表，由 jobs.py 按需创建
+        self.checkpoints = None    # 文件检查点栈，由 checkpoint.py 按需创建
+        self.kernel = None         # Python 工作进程，由 kernel.py 按需创建
+        self.bot = None
+        self.lock = threading.Lock()   # 同一会话同一时间只处理一轮对话
+        self.created = time.time()
+        self.last_used = self.created
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.rounds = 0
+
+    def copy(self, session_id: str | None = None) -> 'Session':
+        """复制当前的工作目录、超时与环境变量（不含 Bot 与浏览器），用于派生子会话。"""
+        child = Session(self.working, session_id=session_id)
+        child.env = dict(self.env)
+        return child
+
+    def info(self) -> dict:
+        return {
+            'id': self.id,
+            'cwd': self.working.get('where'),
+            'created': self.created,
+            'last_used': self.last_used,
+            'busy': self.lock.locked(),
+            'input_tokens': self.input_tokens,
+            'output_tokens': self.output_tokens,
+            'rounds': self.rounds,
+        }
+
+
+def current() -> Session | None:
+    """返回当前上下文中的会话；未设置时返回 None（单会话模式）。"""
+    return _current.get()
+
+
+@contextlib.contextmanager
+def use_session(session: Session):
+    """在 with 块内将 session 设为当前会话。"""
+    token = _current.set(session)
+    try:
+        yield session
+    finally:
+        _current.reset(token)
@@ -0,0 +1,113 @@
+"""
+skill_index.py —— 技能的本地词法检索（BM25）。
+
+system prompt 不再列出全部技能：每轮用户消息用 BM25 检索最相关的 top-k 个技能附在消息后，
+其余技能由模型通过 search_skills 工具按需检索，prompt 大小不随技能库规模增长。
+
+分词：英文/数字按单词切分并转小写，中日韩文字切为相邻二字组（bigram；单字词保留原样），
+无需任何分词词典或网络服务。技能名称在文档中重复计入以提高权重。
+索引随技能注册表的内容（名称与 SKILL.md 的 mtime/size）变化自动重建。
+"""
+
+from __future__ import annotations
+
+import math
+import re
+import threading
+
+from script.skills import SkillRegistry, get_registry
+
+_WORD = re.compile(r'[a-z0-9]+|[\u3040-\u30ff\u3400-\u9fff\uf900-\ufaff]+')
+_CJK = re.compile(r'[\u3040-\u30ff\u3400-\u9fff\uf900-\ufaff]')
+_NAME_WEIGHT = 3
+_K1 = 1.5
+_B = 0.75
+
+
+def tokenize(text: str) -> list[str]:
+    """将文本切分为检索词。"""
+    tokens = []
+    for word in _WORD.findall(text.lower()):
+        if _CJK.match(word) and len(word) > 1:
+            tokens.extend(word[i:i + 2] for i in range(len(word) - 1))
+        else:
+            tokens.append(word)
+    return tokens
+
+
+def _document(skill: dict) -> list[str]:
+    name_tokens = tokenize(skill['name'].replace('-', ' ').replace('_', ' '))
+    meta = skill.get('meta', {})
+    extra = ' '.join(str(meta[k]) for k in ('keywords', 'tags') if meta.get(k))
+    return name_tokens * _NAME_WEIGHT + tokenize(skill['description'] + ' ' + extra)
+
+
+class SkillIndex:
+    """一组技能上的 BM25 倒排索引。"""
+
+    def __init__(self, skills: list[dict]):
+        self.skills = skills
+        self.postings: dict[str, list[tuple[int, int]]] = {}
+        self.lengths: list[int] = []
+        for i, skill in enumerate(skills):
+            doc = _document(skill)
+            self.lengths.append(len(doc))
+            counts: dict[str, int] = {}
+            for tok in doc:
+                counts[tok] = counts.get(tok, 0) + 1
+            for tok, tf in counts.items():
+                self.postings.setdefault(tok, []).append((i, tf))
+        self.avg_len = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0.0
+
+    def search(self, query: str, top_k: int = 5) -> list[tuple[dict, float]]:
+        """返回与 query 最相关的技能 [(skill, score)]，只包含得分大于 0 的技能。"""
+        n = len(self.skills)
+        scores: dict[int, float] = {}
+        for tok in set(tokenize(query)):
+            posting = self.postings.get(tok)
+            if not posting:
+                continue
+            idf = math.log(1 + (n - len(posting) + 0.5) / (len(posting) + 0.5))
+            for i, tf in posting:
+                norm = _K1 * (1 - _B + _B * self.lengths[i] / (self.avg_len or 1))
+                scores[i] = scores.get(i, 0.0) + idf * tf * (_K1 + 1) / (tf + norm)
+        best = sorted(scores.items(), key=lambda item: (-item[1], self.skills[item[0]]['name']))[:top_k]
+        return [(self.skills[i], score) for i, score in best]
+
+
+_index: SkillIndex | None = None
+_index_key: tuple | None = None
+_index_lock = threading.Lock()
+
+
+def get_index(registry: SkillRegistry | None = None) -> SkillIndex:
+    """返回当前技能库的索引；技能有增删或 SKILL.md 变化时重建。"""
+    global _index, _index_key
+    registry = registry or get_registry()
+    skills = registry.list_skills()
+    key = (registry.root, tuple((s['name'], s['key']) for s in skills))
+    with _index_lock:
+        if _index is None or _index_key != key:
+            _index, _index_key = SkillIndex(skills), key
+        return _index
+
+
+def search_skills(query: str, top_k: int = 10) -> str:
+    """search_skills 工具：按关键词检索技能；query 为空时按名称列出技能。"""
+    registry = get_registry()
+    index = get_index(registry)
+    total = len(index.skills)
+    if not total:
+        return f'技能库为空（{registry.root}）。'
+    if not query.strip():
+        names = [s['name'] for s in index.skills[:max(top_k, 50)]]
+        more = f'\n…（共 {total} 个）' if total > len(names) else ''
+        return f'技能库共 {total} 个skill:\n' + '\n'.join(f'  - {n}' for n in names) + more
+    hits = index.search(query, top_k)
+    if not hits:
+        return f'没有与 {query!r} 相关的skill（技能库共 {total} 个）。可换用其他关键词，或以空 query 列出全部名称。'
+    lines = [f'与 {query!r} 相关的skill（技能库共 {total} 个）:']
+    for skill, score in hits:
+        desc = f': {skill["description"]}' if skill['description'] else ''
+        lines.append(f'  - {skill["name"]}{desc}')
+    return '\n'.join(lines)
@@ -0,0 +1,260 @@
+"""
+skills.py —— 技能（Agent Skills）注册表。
+
+prompt_builder 与 get_skill 工具共用同一个注册表：
+    - skills_root() 统一计算技能根目录：skills_dir 为绝对路径时直接使用，
+      否则相对项目目录（环境变量 MOMOKA_PROJECT_DIR，缺省为本仓库根目录）；
+    - 一次扫描得到所有技能，SKILL.md 头部（front matter）的解析结果按 (mtime, size) 缓存，
+      并持久化到 cache/skills/，下次启动只需 stat，无需重新读取未变化的 SKILL.md；
+      根目录 mtime 变化（增删技能）时才重新列目录；
+    - 资源清单（scripts/、references/、assets/ 等目录下的文件）在首次使用该技能时生成，
+      技能目录及子目录 mtime 变化时重建；
+    - SKILL.md 与资源文件内容按需读取，放入按字符数限额的 LRU 缓存，以 (路径, mtime, size) 为键。
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+_BASE = os.path.dirname(os.path.abspath(__file__))
+_CACHE_DIR = os.path.join(_BASE, '..', 'cache', 'skills')
+_VERSION = 1
+
+RESOURCE_DIRS = ('scripts', 'references', 'assets')
+CONTENT_CACHE_CHARS = 4 * 1024 * 1024
+
+
+def skills_root(cfg: dict) -> str:
+    """返回技能根目录的绝对路径。"""
+    skills_dir = cfg.get('skills_dir', 'skill')
+    if os.path.isabs(skills_dir):
+        return skills_dir
+    # 以项目目录为基准，而不是 work_dir（work_dir 是用户工作目录，不是项目目录）
+    project_root = os.environ.get('MOMOKA_PROJECT_DIR') or os.path.join(_BASE, '..')
+    return os.path.normpath(os.path.join(os.path.abspath(project_root), skills_dir))
+
+
+def parse_front_matter(text: str) -> dict[str, str]:
+    """解析 SKILL.md 开头 --- 之间的简单 YAML（key: value，支持 | / > 多行块）。"""
+    lines = text.splitlines()
+    if not lines or lines[0].strip() != '---':
+        return {}
+    meta: dict[str, str] = {}
+    key, block = None, None
+    for line in lines[1:]:
+        if line.strip() == '---':
+            break
+        if block is not None and (line.startswith((' ', '\t')) or not line.strip()):
+            block.append(line.strip())
+            continue
+        if block is not None:
+            meta[key] = ' '.join(x for x in block if x)
+            block = None
+        if ':' not in line or line.startswith((' ', '\t', '#')):
+            continue
+        key, value = line.split(':', 1)
+        key, value = key.strip(), value.strip()
+        if value in ('|', '>', '|-', '>-'):
+            block = []
+        else:
+            meta[key] = value.strip('"\'')
+    if block is not None:
+        meta[key] = ' '.join(x for x in block if x)
+    return meta
+
+
+def _read_head(path: str, encoding: str, limit: int = 16384) -> str:
+    """只读取文件开头部分（front matter 足够短），避免为解析头部读取整个 SKILL.md。"""
+    with open(path, 'r', encoding=encoding, errors='replace') as f:
+        return f.read(limit)
+
+
+def _mtime(path: str) -> int | None:
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+class SkillRegistry:
+    """一个技能根目录下的全部技能。"""
+
+    def __init__(self, root: str, encoding: str = 'utf-8'):
+        self.root = root
+        self.encoding = encoding
+        # name -> {'name', 'description', 'meta', 'path', 'key': (mtime_ns, size)}
+        self._skills: dict[str, dict] = {}
+        # name -> (目录 mtime 元组, [资源相对路径])
+        self._manifests: dict[str, tuple[tuple, list[str]]] = {}
+        self._content: OrderedDict[tuple, str] = OrderedDict()
+        self._content_chars = 0
+        self._root_mtime: int | None = None
+        self._lock = threading.RLock()
+        self._cache_file = os.path.join(_CACHE_DIR, hashlib.sha1(root.encode('utf-8')).hexdigest() + '.json')
+        self._load_cache()
+
+    # ── 持久化 ──────────────────────────────────────────────────────────
+
+    def _load_cache(self):
+        try:
+            with open(self._cache_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') == _VERSION and data.get('root') == self.root:
+                self._skills = {
+                    name: dict(entry, key=tuple(entry['key']))
+                    for name, entry in data['skills'].items()
+                }
+        except (OSError, ValueError, KeyError, TypeError):
+            self._skills = {}
+
+    def _save_cache(self):
+        try:
+            os.makedirs(_CACHE_DIR, exist_ok=True)
+            tmp = self._cache_file + '.tmp'
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump({'version': _VERSION, 'root': self.root, 'skills': self._skills}, f, ensure_ascii=False)
+            os.replace(tmp, self._cache_file)
+        except OSError:
+            pass
+
+    # ── 扫描 ────────────────────────────────────────────────────────────
+
+    def _entry(self, name: str, cached: dict | None) -> dict | None:
+        """返回技能的元数据；SKILL.md 未变化时复用缓存。"""
+        path = os.path.join(self.root, name)
+        skill_md = os.path.join(path, 'SKILL.md')
+        try:
+            st = os.stat(skill_md)
+        except OSError:
+            return None
+        key = (st.st_mtime_ns, st.st_size)
+        if cached is not None and cached['key'] == key:
+            return cached
+        try:
+            meta = parse_front_matter(_read_head(skill_md, self.encoding))
+        except OSError:
+            meta = {}
+        return {
+            'name': name,
+            'description': meta.get('description', ''),
+            'meta': meta,
+            'path': path,
+            'key': key,
+        }
+
+    def refresh(self, force: bool = False):
+        """根目录变化时重新列目录并更新变化的 SKILL.md 元数据。"""
+        with self._lock:
+            root_mtime = _mtime(self.root)
+            if not force and root_mtime is not None and root_mtime == self._root_mtime:
+                return
+            self._root_mtime = root_mtime
+            skills: dict[str, dict] = {}
+            if root_mtime is not None:
+                for name in sorted(os.listdir(self.root)):
+                    if not os.path.isdir(os.path.join(self.root, name)):
+                        continue
+                    entry = self._entry(name, self._skills.get(name))
+                    if entry is not None:
+                        skills[name] = entry
+            changed = skills != self._skills
+            self._skills = skills
+            if changed:
+                self._save_cache()
+
+    def list_skills(self) -> list[dict]:
+        """返回所有技能的元数据（name/description/meta/path），按名称排序。
+
+        根目录未变化时直接返回已缓存的元数据；单个技能的变化由 get() 在使用时发现。
+        """
+        self.refresh()
+        with self._lock:
+            return list(self._skills.values())
+
+    def get(self, name: str) -> dict | None:
+        """返回单个技能的元数据；SKILL.md 有变化时重新解析。"""
+        if not name or name.startswith('.') or '/' in name or os.sep in name:
+            return None
+        self.refresh()
+        with self._lock:
+            cached = self._skills.get(name)
+            if cached is None and not os.path.isdir(os.path.join(self.root, name)):
+                return None
+            entry = self._entry(name, cached)
+            if entry is None:
+                self._skills.pop(name, None)
+                return None
+            if entry is not cached:
+                self._skills[name] = entry
+                self._save_cache()
+            return entry
+
+    # ── 资源清单 ────────────────────────────────────────────────────────
+
+    def manifest(self, name: str) -> list[str]:
+        """返回技能目录内所有文件的相对路径（以 / 分隔，不含 SKILL.md）。"""
+        path = os.path.join(self.root, name)
+        stamp = (_mtime(path),) + tuple(_mtime(os.path.join(path, d)) for d in RESOURCE_DIRS)
+        with self._lock:
+            cached = self._manifests.get(name)
+            if cached is not None and cached[0] == stamp:
+                return cached[1]
+        files = []
+        for dirpath, dirnames, filenames in os.walk(path):
+            dirnames.sort()
+            rel_dir = os.path.relpath(dirpath, path).replace(os.sep, '/')
+            for fn in sorted(filenames):
+                rel = fn if rel_dir == '.' else f'{rel_dir}/{fn}'
+                if rel != 'SKILL.md':
+                    files.append(rel)
+        with self._lock:
+            self._manifests[name] = (stamp, files)
+        return files
+
+    # ── 内容 ────────────────────────────────────────────────────────────
+
+    def read(self, name: str, resource: str = 'SKILL.md') -> tuple[str, str]:
+        """读取技能内的文件，返回 (绝对路径, 内容)；文件不存在时抛出 FileNotFoundError。"""
+        skill_path = os.path.join(self.root, name)
+        path = os.path.normpath(os.path.join(skill_path, resource))
+        if not path.startswith(os.path.normpath(skill_path) + os.sep):
+            raise FileNotFoundError(path)
+        st = os.stat(path)
+        if not os.path.isfile(path):
+            raise FileNotFoundError(path)
+        key = (path, st.st_mtime_ns, st.st_size)
+        with self._lock:
+            content = self._content.get(key)
+            if content is not None:
+                self._content.move_to_end(key)
+                return path, content
+        with open(path, 'r', encoding=self.encoding) as f:
+            content = f.read()
+        with self._lock:
+            self._content[key] = content
+            self._content_chars += len(content)
+            while self._content_chars > CONTENT_CACHE_CHARS and len(self._content) > 1:
+                _, old = self._content.popitem(last=False)
+                self._content_chars -= len(old)
+        return path, content
+
+
+_registries: dict[tuple[str, str], SkillRegistry] = {}
+_registries_lock = threading.Lock()
+
+
+def get_registry(cfg: dict | None = None) -> SkillRegistry:
+    """返回当前配置对应的技能注册表（按根目录与编码复用）。"""
+    if cfg is None:
+        from config import get_config
+        cfg = get_config()
+    key = (skills_root(cfg), cfg.get('encoding', 'utf-8'))
+    with _registries_lock:
+        registry = _registries.get(key)
+        if registry is None:
+            registry = _registries[key] = SkillRegistry(*key)
+        return registry
@@ -0,0 +1,342 @@
+"""
+streaming.py —— 流式请求（config: stream）与工具参数的增量落盘。
+
+非流式请求需要等模型生成完整的工具调用参数、整体缓存并 JSON 解析后才能写文件。
+开启 stream 后 Bot 以流式接收响应：edit_file / append_file 的 arguments 增量到达时，
+ArgumentStream 逐段解析 JSON，把顶层 "content" 字符串边解码边写入临时文件（StreamedContent），
+其余参数（file_path、encoding 等）照常保留。生成结束时文件内容已在磁盘上，
+执行工具时只需检查点 + rename（append_file 为原地追加），内存占用与文件大小无关。
+
+写入历史的 assistant 消息中，content 参数替换为占位文本，后续请求不再重复发送整份文件内容。
+"""
+
+from __future__ import annotations
+
+import codecs
+import json
+import os
+import re
+import shutil
+import tempfile
+
+from script.fileio import append_encoder, install
+
+# 以流式方式写入的工具及其内容参数
+STREAMED_TOOLS = {'edit_file': 'content', 'append_file': 'content'}
+
+_SPOOL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'cache', 'stream')
+_MARK = '\0streamed\0'
+_SPECIAL = re.compile(r'["\\]')
+_ESCAPES = {'n': '\n', 't': '\t', 'r': '\r', 'b': '\b', 'f': '\f', '"': '"', '\\': '\\', '/': '/'}
+
+
+class StreamedContent:
+    """流式写入的内容：先写入临时文件，commit 时原子地替换（或追加到）目标文件。"""
+    __slots__ = ('path', 'chars', 'newlines', 'last', 'committed', '_file')
+
+    def __init__(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        fd, self.path = tempfile.mkstemp(prefix='.stream.', suffix='.tmp', dir=directory)
+        # 文本模式写入，换行符处理与 fileio.atomic_write 一致
+        self._file = open(fd, 'w', encoding='utf-8', errors='replace')
+        self.chars = 0
+        self.newlines = 0
+        self.last = ''
+        self.committed = False
+
+    def write(self, text: str):
+        self._file.write(text)
+        self.chars += len(text)
+        self.newlines += text.count('\n')
+        self.last = text[-1]
+
+    @property
+    def lines(self) -> int:
+        return self.newlines + (1 if self.chars and self.last != '\n' else 0)
+
+    def close(self):
+        if not self._file.closed:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+
+    def commit(self, target: str, encoding: str = 'utf-8', append: bool = False):
+        """写入 target：append 为 False 时经临时文件 + rename 覆盖（同 fileio.atomic_write）；
+        否则原地追加，失败时截断回原长度。"""
+        self.close()
+        target = os.path.realpath(target)
+        directory = os.path.dirname(target)
+        os.makedirs(directory, exist_ok=True)
+        if append:
+            with open(target, 'ab') as out:
+                size = out.tell()
+                try:
+                    self._copy_to(out, encoding, size)
+                    out.flush()
+                    os.fsync(out.fileno())
+                except BaseException:
+                    out.truncate(size)
+                    raise
+            os.unlink(self.path)
+            self.committed = True
+            return
+        if codecs.lookup(encoding).name == 'utf-8' and os.path.dirname(self.path) == directory:
+            tmp = self.path
+        else:
+            fd, tmp = tempfile.mkstemp(prefix='.' + os.path.basename(target) + '.', suffix='.tmp', dir=directory)
+            try:
+                with open(fd, 'wb') as out:
+                    self._copy_to(out, encoding)
+                    out.flush()
+                    os.fsync(out.fileno())
+            except BaseException:
+                os.unlink(tmp)
+                raise
+            os.unlink(self.path)
+        install(tmp, target)
+        self.committed = True
+
+    def _copy_to(self, out, encoding: str, size: int = 0):
+        """把内容以 encoding 写入 out：utf-8 直接复制字节，其他编码逐块转码（size 为目标文件原长度）。"""
+        if codecs.lookup(encoding).name == 'utf-8':
+            with open(self.path, 'rb') as src:
+                shutil.copyfileobj(src, out, 1 << 20)
+            return
+        encoder = append_encoder(encoding, size)
+        with open(self.path, 'r', encoding='utf-8', newline='') as src:
+            for chunk in iter(lambda: src.read(1 << 20), ''):
+                out.write(encoder.encode(chunk))
+            out.write(encoder.encode('', final=True))
+
+    def discard(self):
+        """丢弃未提交的内容（请求出错、工具未执行等）。"""
+        if self.committed:
+            return
+        self._file.close()
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class ArgumentStream:
+    """增量解析一个工具调用的 arguments，把顶层 content 字符串直接解码写入 StreamedContent。"""
+
+    def __init__(self, key: str = 'content'):
+        self.key = key
+        self.fields: dict[str, str] = {}      # 已解析的顶层短字符串参数（file_path、encoding 等）
+        self.content: StreamedContent | None = None
+        self._head: list[str] = []            # content 之外的原始参数文本
+        self._state = 'out'                   # 'out' | 'str' | 'content'
+        self._depth = 0
+        self._str: list[str] = []
+        self._str_escape = False
+        self._expect_key = False
+        self._expect_value = False
+        self._last_key = None
+        self._escape = ''                     # content 中跨块的转义序列
+        self._high = None                     # 等待低位代理的高位代理
+
+    def feed(self, chunk: str):
+        i, n = 0, len(chunk)
+        while i < n:
+            if self._state == 'content':
+                i = self._feed_content(chunk, i)
+                continue
+            c = chunk[i]
+            i += 1
+            self._head.append(c)
+            if self._state == 'str':
+                self._str.append(c)
+                if self._str_escape:
+                    self._str_escape = False
+                elif c == '\\':
+                    self._str_escape = True
+                elif c == '"':
+                    self._state = 'out'
+                    self._string_closed(''.join(self._str))
+                continue
+            if c == '"':
+                if self._depth == 1 and self._expect_value and self._last_key == self.key and self.content is None:
+                    self._state = 'content'
+                    self._head.append(_MARK)
+                    path = self.fields.get('file_path')
+                    directory = os.path.dirname(os.path.abspath(path)) if path else _SPOOL_DIR
+                    try:
+                        self.content = StreamedContent(directory)
+                    except OSError:
+                        self.content = StreamedContent(_SPOOL_DIR)
+                else:
+                    self._state = 'str'
+                    self._str = ['"']
+            elif c in '{[':
+                self._depth += 1
+                self._expect_key = c == '{' and self._depth == 1
+            elif c in '}]':
+                self._depth -= 1
+            elif self._depth == 1 and c == ':':
+                self._expect_value = True
+            elif self._depth == 1 and c == ',':
+                self._expect_key, self._expect_value = True, False
+
+    def _string_closed(self, raw: str):
+        if self._depth != 1:
+            return
+        try:
+            value = json.loads(raw)
+        except ValueError:
+            return
+        if self._expect_key:
+            self._last_key, self._expect_key = value, False
+        elif self._expect_value:
+            if len(value) <= 4096:
+                self.fields[self._last_key] = value
+            self._expect_value = False
+
+    def _emit(self, text: str):
+        if self._high is not None:
+            self.content.write('\ufffd')
+            self._high = None
+        self.content.write(text)
+
+    def _feed_content(self, chunk: str, i: int) -> int:
+        if self._escape:
+            self._escape += chunk[i]
+            esc = self._escape
+            if esc[1] != 'u':
+                self._escape = ''
+                self._emit(_ESCAPES.get(esc[1], esc[1]))
+            elif len(esc) == 6:
+                self._escape = ''
+                code = int(esc[2:], 16) if all(ch in '0123456789abcdefABCDEF' for ch in esc[2:]) else 0xFFFD
+                if 0xD800 <= code < 0xDC00:
+                    if self._high is not None:
+                        self.content.write('\ufffd')
+                    self._high = code
+                elif 0xDC00 <= code < 0xE000 and self._high is not None:
+                    self.content.write(chr(0x10000 + ((self._high - 0xD800) << 10) + (code - 0xDC00)))
+                    self._high = None
+                else:
+                    self._emit(chr(code) if not 0xD800 <= code < 0xE000 else '\ufffd')
+            return i + 1
+        m = _SPECIAL.search(chunk, i)
+        end = m.start() if m else len(chunk)
+        if end > i:
+            self._emit(chunk[i:end])
+        if m is None:
+            return end
+        if chunk[end] == '"':
+            if self._high is not None:
+                self._emit('')
+            self._state = 'out'
+            self._expect_value = False
+            self._head.append('"')
+        else:
+            self._escape = '\\'
+        return end + 1
+
+    @property
+    def complete(self) -> bool:
+        return self._state == 'out' and self._depth == 0
+
+    def finish(self) -> str:
+        """结束解析，返回写入历史的 arguments（content 替换为占位文本）。"""
+        head = ''.join(self._head)
+        if self.content is None:
+            return head
+        self.content.close()
+        if not self.complete:
+            self.content.discard()
+            self.content = None
+            return head.replace(_MARK, '')
+        placeholder = f'[已流式写入 {self.content.chars} 字符，共 {self.content.lines} 行]'
+        return head.replace('"' + _MARK + '"', json.dumps(placeholder, ensure_ascii=False), 1)
+
+    def abort(self):
+        if self.content is not None:
+            self.content.discard()
+
+
+class _Function:
+    __slots__ = ('name', 'arguments')
+
+    def __init__(self, name: str, arguments: str):
+        self.name = name
+        self.arguments = arguments
+
+
+class StreamedToolCall:
+    """流式响应中组装出的工具调用，接口与 SDK 的 tool_call 对象一致；streamed 为流式写入的内容。"""
+    __slots__ = ('id', 'type', 'function', 'streamed')
+
+    def __init__(self, call_id: str, name: str, arguments: str, streamed: StreamedContent | None):
+        self.id = call_id
+        self.type = 'function'
+        self.function = _Function(name, arguments)
+        self.streamed = streamed
+
+
+class _PendingCall:
+    __slots__ = ('id', 'name', 'parts', 'decoder')
+
+    def __init__(self):
+        self.id = ''
+        self.name = ''
+        self.parts: list[str] = []
+        self.decoder: ArgumentStream | None = None
+
+    def feed(self, text: str):
+        if self.decoder is None and not self.parts and self.name in STREAMED_TOOLS:
+            self.decoder = ArgumentStream(STREAMED_TOOLS[self.name])
+        if self.decoder is not None:
+            self.decoder.feed(text)
+        else:
+            self.parts.append(text)
+
+    def finish(self) -> StreamedToolCall:
+        if self.decoder is None:
+            return StreamedToolCall(self.id, self.name, ''.join(self.parts), None)
+        arguments = self.decoder.finish()
+        return StreamedToolCall(self.id, self.name, arguments, self.decoder.content)
+
+    def abort(self):
+        if self.decoder is not None:
+            self.decoder.abort()
+
+
+def collect_stream(stream) -> dict:
+    """消费流式响应，返回与非流式相同结构的 {'content', 'tool_calls', 'input_tokens', 'output_tokens'}。"""
+    text: list[str] = []
+    calls: dict[int, _PendingCall] = {}
+    usage = None
+    try:
+        for chunk in stream:
+            if getattr(chunk, 'usage', None):
+                usage = chunk.usage
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta
+            if delta.content:
+                text.append(delta.content)
+            for d in delta.tool_calls or []:
+                index = d.index if d.index is not None else (len(calls) if d.id else max(calls, default=0))
+                call = calls.get(index)
+                if call is None:
+                    call = calls[index] = _PendingCall()
+                if d.id:
+                    call.id = d.id
+                if d.function is not None:
+                    if d.function.name:
+                        call.name += d.function.name
+                    if d.function.arguments:
+                        call.feed(d.function.arguments)
+    except BaseException:
+        for call in calls.values():
+            call.abort()
+        raise
+    return {
+        'content': ''.join(text),
+        'tool_calls': [calls[i].finish() for i in sorted(calls)],
+        'input_tokens': usage.prompt_tokens if usage else 0,
+        'output_tokens': usage.completion_tokens if usage else 0,
+    }
@@ -0,0 +1,487 @@
+"""
+symbol_index.py —— 代码符号索引（find_symbol / find_references 工具的后端）。
+
+索引结构：
+    每个源文件保存其定义的符号列表，符号为元组 (名称, 类型, 起始行, 结束行, 所属容器, 首行文本)；
+    另维护 {名称: {相对路径}} 的倒排表，按名称查找只需访问包含该名称的文件。
+    - Python 用 ast 解析，得到类 / 函数 / 方法 / 模块级与类级变量的准确起止行（含装饰器）；
+    - 其他语言用 tags 风格的逐行正则提取定义，花括号语言按括号配对、Ruby / Lua 按同缩进的 end
+      估计结束行，位于类 / 结构体等容器行范围内的符号记录其容器名。
+
+生命周期与 workspace_index 相同：首次查询时在后台线程构建，持久化到 cache/symbols/，
+下次启动按 mtime / size 增量更新；工具写入文件后经 workspace_index.notify_changed 立即更新该文件。
+
+find_references 先用 workspace_index 的三元组签名筛出可能包含该名称的文件，
+再逐行按完整单词匹配，不需要为引用单独建索引。
+"""
+
+from __future__ import annotations
+
+import ast
+import hashlib
+import os
+import pickle
+import re
+import threading
+import time
+
+from script.ignore import walk_files
+from script.logger import log
+from script.workspace_index import (MAX_FILES, REFRESH_INTERVAL, _cfg, _read_text, add_change_listener,
+                                    get_index, resolve_root)
+
+_BASE = os.path.dirname(os.path.abspath(__file__))
+_INDEX_DIR = os.path.join(_BASE, '..', 'cache', 'symbols')
+_VERSION = 1
+
+MAX_SIGNATURE = 160
+
+
+# ── Python（ast）──────────────────────────────────────────────────────────
+
+def _python_symbols(text: str) -> list[tuple]:
+    try:
+        tree = ast.parse(text)
+    except (SyntaxError, ValueError):
+        return []
+    lines = text.splitlines()
+    out = []
+
+    def signature(lineno: int) -> str:
+        return lines[lineno - 1].strip()[:MAX_SIGNATURE] if 0 < lineno <= len(lines) else ''
+
+    def visit(body, container: str, in_class: bool):
+        for node in body:
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                start = min([d.lineno for d in node.decorator_list] + [node.lineno])
+                if isinstance(node, ast.ClassDef):
+                    kind = 'class'
+                else:
+                    kind = 'method' if in_class else 'function'
+                out.append((node.name, kind, start, node.end_lineno or node.lineno, container,
+                            signature(node.lineno)))
+                qualname = f'{container}.{node.name}' if container else node.name
+                visit(node.body, qualname, isinstance(node, ast.ClassDef))
+            elif isinstance(node, (ast.Assign, ast.AnnAssign)) and (not container or in_class):
+                targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+                for target in targets:
+                    if isinstance(target, ast.Name):
+                        out.append((target.id, 'variable', node.lineno, node.end_lineno or node.lineno,
+                                    container, signature(node.lineno)))
+            elif isinstance(node, (ast.If, ast.Try, ast.With)) and not container:
+                # 模块顶层 if TYPE_CHECKING / try: import 等结构中的定义
+                for block in ('body', 'orelse', 'finalbody'):
+                    visit(getattr(node, block, []), container, in_class)
+                for handler in getattr(node, 'handlers', []):
+                    visit(handler.body, container, in_class)
+
+    visit(tree.body, '', False)
+    return out
+
+
+# ── 其他语言（逐行正则）──────────────────────────────────────────────────
+
+_ID = r'[A-Za-z_$][\w$]*'
+_JS = [
+    (re.compile(rf'^\s*(?:export\s+)?(?:default\s+)?(?:abstract\s+)?class\s+(?P<name>{_ID})'), 'class'),
+    (re.compile(rf'^\s*(?:export\s+)?(?:declare\s+)?(?:interface|enum|type)\s+(?P<name>{_ID})'), 'type'),
+    (re.compile(rf'^\s*(?:export\s+)?(?:default\s+)?(?:async\s+)?function\s*\*?\s*(?P<name>{_ID})'), 'function'),
+    (re.compile(rf'^\s*(?:export\s+)?(?:const|let|var)\s+(?P<name>{_ID})\s*(?::[^=]+)?=\s*(?:async\s+)?'
+                rf'(?:function\b|\([^)]*\)\s*(?::[^=]+)?=>|{_ID}\s*=>)'), 'function'),
+    (re.compile(rf'^\s+(?:(?:public|private|protected|static|async|readonly|override|get|set)\s+)*'
+                rf'(?P<name>{_ID})\s*\([^)]*\)\s*(?::\s*[^{{]+)?\{{\s*$'), 'method'),
+]
+_GO = [
+    (re.compile(r'^func\s+\(\s*\w*\s*\*?\s*(?P<container>[A-Za-z_]\w*)[^)]*\)\s*(?P<name>[A-Za-z_]\w*)'), 'method'),
+    (re.compile(r'^func\s+(?P<name>[A-Za-z_]\w*)'), 'function'),
+    (re.compile(r'^type\s+(?P<name>[A-Za-z_]\w*)'), 'type'),
+]
+_RUST = [
+    (re.compile(r'^\s*(?:pub(?:\([^)]*\))?\s+)?(?:(?:async|unsafe|const|extern(?:\s+"[^"]*")?)\s+)*'
+                r'fn\s+(?P<name>[A-Za-z_]\w*)'), 'function'),
+    (re.compile(r'^\s*(?:pub(?:\([^)]*\))?\s+)?(?:struct|enum|trait|union|type|mod)\s+(?P<name>[A-Za-z_]\w*)'), 'type'),
+    (re.compile(r'^\s*(?:unsafe\s+)?impl(?:<[^>]*>)?\s+(?:[\w:<>, ]+\s+for\s+)?(?P<name>[A-Za-z_]\w*)'), 'impl'),
+    (re.compile(r'^\s*macro_rules!\s*(?P<name>[A-Za-z_]\w*)'), 'macro'),
+]
+_MODIFIERS = r'(?:public|private|protected|internal|static|final|abstract|sealed|partial|open|data|inner|override|virtual|async|synchronized|native|suspend|inline|extern|readonly)'
+_JVM = [
+    (re.compile(rf'^\s*(?:@\w+\s+)*(?:{_MODIFIERS}\s+)*(?:class|interface|enum|record|struct|object|trait)\s+'
+                r'(?P<name>[A-Za-z_]\w*)'), 'class'),
+    (re.compile(rf'^\s*(?:{_MODIFIERS}\s+)*fun\s+(?:<[^>]*>\s*)?(?:[\w.]+\.)?(?P<name>[A-Za-z_]\w*)\s*\('), 'function'),
+    (re.compile(rf'^\s*(?:{_MODIFIERS}\s+)*func\s+(?P<name>[A-Za-z_]\w*)'), 'function'),
+    (re.compile(rf'^\s*(?:{_MODIFIERS}\s+)*def\s+(?P<name>[A-Za-z_]\w*)'), 'function'),
+    (re.compile(rf'^\s*(?:{_MODIFIERS}\s+)+[\w<>\[\],.? ]+?\s+(?P<name>[A-Za-z_]\w*)\s*\('), 'method'),
+]
+_C = [
+    (re.compile(r'^#\s*define\s+(?P<name>[A-Za-z_]\w*)'), 'macro'),
+    (re.compile(r'^\s*(?:typedef\s+)?(?:struct|class|union|enum(?:\s+class)?)\s+(?:\w+\s+)*?(?P<name>[A-Za-z_]\w*)'
+                r'\s*(?::[^{;]*)?\{?\s*$'), 'type'),
+    (re.compile(r'^(?:[\w*&:<>,~]+\s+)+[*&]*(?P<name>[A-Za-z_~][\w:~]*)\s*\([^;]*$'), 'function'),
+]
+_RUBY = [
+    (re.compile(r'^\s*(?:class|module)\s+(?P<name>[A-Z]\w*(?:::\w+)*)'), 'class'),
+    (re.compile(r'^\s*def\s+(?:self\.)?(?P<name>[A-Za-z_]\w*[?!=]?)'), 'method'),
+]
+_PHP = [
+    (re.compile(r'^\s*(?:(?:abstract|final)\s+)?(?:class|interface|trait|enum)\s+(?P<name>[A-Za-z_]\w*)'), 'class'),
+    (re.compile(r'^\s*(?:(?:public|private|protected|static|abstract|final)\s+)*function\s+&?(?P<name>[A-Za-z_]\w*)'),
+     'function'),
+]
+_SHELL = [
+    (re.compile(r'^\s*function\s+(?P<name>[A-Za-z_][\w-]*)'), 'function'),
+    (re.compile(r'^\s*(?P<name>[A-Za-z_][\w-]*)\s*\(\)\s*\{?'), 'function'),
+]
+_LUA = [
+    (re.compile(r'^\s*(?:local\s+)?function\s+(?:(?P<container>[\w.]+)[.:])?(?P<name>[A-Za-z_]\w*)'), 'function'),
+]
+
+# 扩展名 → (规则, 结束行的估计方式)
+_RULES = {}
+for _exts, _rules, _end in (
+        (('.js', '.mjs', '.cjs', '.jsx', '.ts', '.tsx', '.vue', '.svelte'), _JS, 'brace'),
+        (('.go',), _GO, 'brace'),
+        (('.rs',), _RUST, 'brace'),
+        (('.java', '.kt', '.kts', '.scala', '.cs', '.swift', '.groovy', '.dart'), _JVM, 'brace'),
+        (('.c', '.h', '.cc', '.cpp', '.cxx', '.hpp', '.hh', '.m', '.mm'), _C, 'brace'),
+        (('.rb',), _RUBY, 'end'),
+        (('.php',), _PHP, 'brace'),
+        (('.sh', '.bash', '.zsh'), _SHELL, 'brace'),
+        (('.lua',), _LUA, 'end')):
+    for _ext in _exts:
+        _RULES[_ext] = (_rules, _end)
+
+_KEYWORDS = frozenset({'if', 'for', 'while', 'switch', 'catch', 'return', 'else', 'do', 'try', 'new',
+                       'function', 'sizeof', 'elif', 'case', 'throw', 'delete', 'await', 'typeof'})
+_CONTAINER_KINDS = frozenset({'class', 'type', 'impl'})
+_STRIP_STRINGS = re.compile(r'"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'|`[^`]*`|//.*$|/\*.*?\*/|#.*$')
+
+
+def _brace_end(lines: list[str], start: int, limit: int = 5000) -> int:
+    """从 start（0 起）开始按花括号配对估计定义的结束行（1 起）；声明（遇到 ; 之前没有 {）返回起始行。"""
+    depth = 0
+    opened = False
+    for i in range(start, min(len(lines), start + limit)):
+        code = _STRIP_STRINGS.sub('', lines[i]) if ('"' in lines[i] or "'" in lines[i] or '/' in lines[i]
+                                                    or '#' in lines[i] or '`' in lines[i]) else lines[i]
+        for ch in code:
+            if ch == '{':
+                depth += 1
+                opened = True
+            elif ch == '}':
+                depth -= 1
+                if opened and depth <= 0:
+                    return i + 1
+            elif ch == ';' and not opened:
+                return start + 1
+        if not opened and i - start >= 3:
+            return start + 1
+    return start + 1
+
+
+def _indent_end(lines: list[str], start: int) -> int:
+    """Ruby / Lua：查找与定义行同缩进的 end。"""
+    indent = len(lines[start]) - len(lines[start].lstrip())
+    for i in range(start + 1, len(lines)):
+        stripped = lines[i].lstrip()
+        if stripped.startswith('end') and len(lines[i]) - len(stripped) == indent \
+                and (len(stripped) == 3 or not (stripped[3].isalnum() or stripped[3] == '_')):
+            return i + 1
+    return start + 1
+
+
+def _regex_symbols(text: str, rules: list, end_mode: str) -> list[tuple]:
+    lines = text.splitlines()
+    out = []
+    containers: list[tuple[int, str]] = []   # (结束行, 名称)
+    for i, line in enumerate(lines):
+        if not line or line.isspace():
+            continue
+        for pattern, kind in rules:
+            m = pattern.match(line)
+            if m is None:
+                continue
+            name = m.group('name')
+            if name in _KEYWORDS:
+                break
+            if kind == 'macro' and line.startswith('#'):
+                end = i + 1
+                while end < len(lines) and lines[end - 1].rstrip().endswith('\\'):
+                    end += 1   # 以反斜杠续行的宏
+            else:
+                end = _brace_end(lines, i) if end_mode == 'brace' else _indent_end(lines, i)
+            while containers and containers[-1][0] < i + 1:
+                containers.pop()
+            container = (m.groupdict().get('container') or '') or (containers[-1][1] if containers else '')
+            out.append((name, kind, i + 1, end, container, line.strip()[:MAX_SIGNATURE]))
+            if kind in _CONTAINER_KINDS and end > i + 1:
+                containers.append((end, f'{container}.{name}' if container else name))
+            break
+    return out
+
+
+def extract_symbols(rel: str, text: str) -> list[tuple]:
+    """提取文件中定义的符号，不支持的语言返回空列表。"""
+    ext = os.path.splitext(rel)[1].lower()
+    if ext in ('.py', '.pyi'):
+        return _python_symbols(text)
+    rule = _RULES.get(ext)
+    return _regex_symbols(text, *rule) if rule else []
+
+
+def supported(rel: str) -> bool:
+    ext = os.path.splitext(rel)[1].lower()
+    return ext in ('.py', '.pyi') or ext in _RULES
+
+
+# ── 索引 ─────────────────────────────────────────────────────────────────
+
+class SymbolIndex:
+    """单个根目录的符号索引。"""
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+        self.encoding = _cfg().get('encoding', 'utf-8')
+        # {相对路径: (mtime_ns, size, [符号])}
+        self.files: dict[str, tuple[int, int, list[tuple]]] = {}
+        self.by_name: dict[str, set[str]] = {}
+        self.ready = threading.Event()
+        self.building = False
+        self.last_refresh = 0.0
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._path = os.path.join(
+            _INDEX_DIR, hashlib.sha1(self.root.encode('utf-8')).hexdigest() + '.pkl'
+        )
+        self._load()
+
+    # ── 持久化 ──
+    def _load(self):
+        try:
+            with open(self._path, 'rb') as f:
+                data = pickle.load(f)
+            if data.get('version') == _VERSION and data.get('root') == self.root:
+                self.files = data['files']
+                for rel, (_, _, symbols) in self.files.items():
+                    for sym in symbols:
+                        self.by_name.setdefault(sym[0], set()).add(rel)
+                self.ready.set()
+                log(f'symbol_index | loaded {len(self.files)} files for {self.root}')
+        except (OSError, pickle.UnpicklingError, EOFError, KeyError, AttributeError):
+            pass
+
+    def _save(self):
+        os.makedirs(_INDEX_DIR, exist_ok=True)
+        with self._lock:
+            data = {'version': _VERSION, 'root': self.root, 'files': dict(self.files)}
+        tmp = f'{self._path}.{threading.get_ident()}.tmp'
+        with open(tmp, 'wb') as f:
+            pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, self._path)
+
+    # ── 构建与增量更新 ──
+    def _set(self, rel: str, entry: tuple | None):
+        """替换（entry 为 None 时删除）单个文件的符号，同步更新倒排表。调用方持有 _lock。"""
+        old = self.files.pop(rel, None)
+        if old is not None:
+            for sym in old[2]:
+                names = self.by_name.get(sym[0])
+                if names is not None:
+                    names.discard(rel)
+                    if not names:
+                        del self.by_name[sym[0]]
+        if entry is not None:
+            self.files[rel] = entry
+            for sym in entry[2]:
+                self.by_name.setdefault(sym[0], set()).add(rel)
+
+    def _index_file(self, rel: str, mtime_ns: int, size: int):
+        text = _read_text(os.path.join(self.root, rel), self.encoding)
+        symbols = extract_symbols(rel, text) if text is not None else []
+        with self._lock:
+            self._set(rel, (mtime_ns, size, symbols))
+
+    def refresh(self):
+        """遍历根目录，按 mtime / size 增量更新，移除已删除文件。"""
+        if not self._refresh_lock.acquire(blocking=False):
+            return
+        self.building = True
+        started = time.time()
+        try:
+            seen = set()
+            changed = 0
+            for rel, entry in walk_files(self.root, MAX_FILES):
+                if not supported(rel):
+                    continue
+                seen.add(rel)
+                try:
+                    st = entry.stat(follow_symlinks=False)
+                except OSError:
+                    continue
+                old = self.files.get(rel)
+                if old is None or old[0] != st.st_mtime_ns or old[1] != st.st_size:
+                    self._index_file(rel, st.st_mtime_ns, st.st_size)
+                    changed += 1
+            with self._lock:
+                removed = [rel for rel in self.files if rel not in seen]
+                for rel in removed:
+                    self._set(rel, None)
+            self.last_refresh = time.time()
+            self.building = False
+            self.ready.set()
+            if changed or removed:
+                self._save()
+            log(f'symbol_index | refresh {self.root}: {len(seen)} files, '
+                f'{changed} changed, {len(removed)} removed ({time.time() - started:.2f}s)')
+        except Exception as e:
+            log(f'symbol_index | refresh error: {e}')
+        finally:
+            self.building = False
+            self._refresh_lock.release()
+
+    def refresh_async(self):
+        threading.Thread(target=self.refresh, daemon=True, name='momoka-symbols').start()
+
+    def update_file(self, abs_path: str):
+        """单个文件被修改后立即更新其符号。"""
+        rel = os.path.relpath(abs_path, self.root).replace(os.sep, '/')
+        if not supported(rel):
+            return
+        try:
+            st = os.stat(abs_path)
+        except OSError:
+            with self._lock:
+                self._set(rel, None)
+            return
+        self._index_file(rel, st.st_mtime_ns, st.st_size)
+
+    # ── 查询 ──
+    def lookup(self, name: str, kind: str = '', prefix: str = '') -> list[tuple[str, tuple]]:
+        """按名称（可带容器限定，如 Bot.message）精确查找，返回 [(相对路径, 符号)]。"""
+        container, _, short = name.rpartition('.')
+        with self._lock:
+            rels = sorted(self.by_name.get(short, ()))
+            entries = [(rel, self.files[rel][2]) for rel in rels if rel in self.files]
+        out = []
+        for rel, symbols in entries:
+            if prefix and not rel.startswith(prefix):
+                continue
+            for sym in symbols:
+                if sym[0] != short or (kind and sym[1] != kind):
+                    continue
+                if container and not (sym[4] == container or sym[4].endswith('.' + container)):
+                    continue
+                out.append((rel, sym))
+        return out
+
+    def similar(self, name: str, prefix: str = '', limit: int = 10) -> list[str]:
+        """名称不存在时给出包含查询串（不区分大小写）的候选名称。"""
+        needle = name.rpartition('.')[2].lower()
+        with self._lock:
+            names = [n for n, rels in self.by_name.items() if needle in n.lower()
+                     and (not prefix or any(rel.startswith(prefix) for rel in rels))]
+        names.sort(key=lambda n: (len(n), n))
+        return names[:limit]
+
+
+# ── 模块级注册表 ──────────────────────────────────────────────────────────
+
+_indexes: dict[str, SymbolIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_symbol_index(root: str) -> SymbolIndex:
+    """获取（必要时创建并在后台构建）root 的符号索引。"""
+    root = os.path.abspath(root)
+    with _indexes_lock:
+        idx = _indexes.get(root)
+        if idx is None:
+            idx = _indexes[root] = SymbolIndex(root)
+            idx.refresh_async()
+    return idx
+
+
+def _on_changed(abs_path: str):
+    with _indexes_lock:
+        targets = [idx for root, idx in _indexes.items() if abs_path.startswith(root + os.sep)]
+    for idx in targets:
+        idx.update_file(abs_path)
+
+
+add_change_listener(_on_changed)
+
+
+def _wait_ready(idx) -> str:
+    if not idx.ready.is_set():
+        idx.ready.wait(timeout=float(_cfg().get('wait', 10)))
+    if not idx.building and time.time() - idx.last_refresh > REFRESH_INTERVAL:
+        idx.refresh_async()
+    if idx.ready.is_set() and not idx.building:
+        return ''
+    return f'\n<提示: 索引仍在构建/刷新中（已索引 {len(idx.files)} 个文件），结果可能不完整>'
+
+
+def find_symbol(name: str, path: str | None = None, kind: str = '', max_results: int = 20) -> str:
+    """find_symbol 工具入口：返回符号定义的位置（文件:起始行-结束行）。"""
+    name = name.strip()
+    target, root, prefix = resolve_root(path)
+    if not os.path.isdir(target):
+        return f'目录不存在: {target}'
+    idx = get_symbol_index(root)
+    note = _wait_ready(idx)
+    hits = idx.lookup(name, kind, prefix)
+    if not hits:
+        similar = idx.similar(name, prefix)
+        hint = f'\n相近的名称: {", ".join(similar)}' if similar else ''
+        return f'在 {target} 中未找到符号 {name!r}。{hint}{note}'
+    # 定义在前、变量在后，同类按路径深度排序
+    hits.sort(key=lambda h: (h[1][1] == 'variable', h[0].count('/'), h[0], h[1][2]))
+    shown = f'，显示前 {max_results} 个' if len(hits) > max_results else ''
+    lines = [f'找到 {len(hits)} 处 {name!r} 的定义{shown}（可用 read_file 的 start_line / end_line 读取）:{note}']
+    for rel, (sym_name, sym_kind, start, end, container, sig) in hits[:max_results]:
+        qualname = f'{container}.{sym_name}' if container else sym_name
+        span = f'{start}-{end}' if end > start else str(start)
+        lines.append(f'{os.path.join(root, rel)}:{span}  {sym_kind} {qualname}')
+        lines.append(f'    {sig}')
+    log(f'symbol_index | find_symbol {name!r} in {target} → {len(hits)}')
+    return '\n'.join(lines)
+
+
+def find_references(name: str, path: str | None = None, max_results: int = 50) -> str:
+    """find_references 工具入口：返回名称（完整单词）出现的所有位置，定义处标注 [定义]。"""
+    short = name.strip().rpartition('.')[2]
+    if not short:
+        return 'name 不能为空。'
+    target, root, prefix = resolve_root(path)
+    if not os.path.isdir(target):
+        return f'目录不存在: {target}'
+    started = time.time()
+    text_idx = get_index(root)
+    sym_idx = get_symbol_index(root)
+    note = _wait_ready(sym_idx)
+    note = _wait_ready(text_idx) or note
+    definitions = {(rel, sym[2]) for rel, sym in sym_idx.lookup(short, prefix=prefix)}
+
+    word = re.compile(rf'(?<![\w$]){re.escape(short)}(?![\w$])')
+    literals = [short] if len(short) >= 3 else []
+    results, total, files = [], 0, 0
+    for rel in sorted(text_idx.candidates(literals, prefix)):
+        text = _read_text(os.path.join(root, rel), text_idx.encoding)
+        if text is None or short not in text:
+            continue
+        found = False
+        for lineno, line in enumerate(text.splitlines(), 1):
+            if not word.search(line):
+                continue
+            found = True
+            total += 1
+            if len(results) < max_results:
+                mark = ' [定义]' if (rel, lineno) in definitions else ''
+                results.append(f'{os.path.join(root, rel)}:{lineno}:{mark} {line.strip()[:200]}')
+        files += found
+    elapsed_ms = (time.time() - started) * 1000
+    log(f'symbol_index | find_references {short!r} in {target} → {total} ({elapsed_ms:.0f} ms)')
+    if not total:
+        return f'在 {target} 中未找到 {short!r} 的引用（{elapsed_ms:.0f} ms）。{note}'
+    shown = f'，显示前 {len(results)} 处' if total > len(results) else ''
+    header = f'{short!r} 在 {files} 个文件中出现 {total} 次（{elapsed_ms:.0f} ms{shown}）:{note}'
+    return header + '\n' + '\n'.join(results)
@@ -2,25 +2,42 @@ import os
 import sys
 from config import get_config, set_where
 from script.logger import log
+from script.session import current as current_session
 
 _IS_WINDOWS = sys.platform == 'win32'
 
 # ── 持久化的环境状态（进程内跨调用保持）────────────────────────────────────
+# 单会话模式使用下面的模块全局状态；服务模式下每个会话的 cwd / env 保存在 Session 中。
 _env = os.environ.copy()
 _cwd: str | None = None  # 延迟初始化，首次调用时从 config 读取
 
 
 def _get_cwd() -> str:
     global _cwd
+    session = current_session()
+    if session is not None:
+        cfg = get_config()
+        return cfg.get('where') or cfg['work_dir']
     if _cwd is None:
         cfg = get_config()
         _cwd = cfg.get('where') or cfg['work_dir']
     return _cwd
 
 
+def _get_env() -> dict[str, str]:
+    session = current_session()
+    return session.env if session is not None else _env
+
+
+def update_env(env: dict[str, str]):
+    """更新后续命令使用的环境变量（批处理为每个任务设置独立环境）。"""
+    _get_env().update({k: str(v) for k, v in env.items()})
+
+
 def _set_cwd(path: str):
     global _cwd
-    _cwd = path
+    if current_session() is None:
+        _cwd = path
     set_where(path)
 
 
@@ -62,6 +79,9 @@ def system_command(command: str, inputs: str | list[str] | None = None) -> str:
         encoding = get_config()['encoding']
         input_data = input_data.encode(encoding)
 
+    from script.limits import apply_limits, create_cgroup, get_limits, wait_with_usage
+    limits = get_limits()
+    cgroup = create_cgroup(limits)
     try:
         kwargs = dict(
             shell=True,
@@ -69,7 +89,7 @@ def system_command(command: str, inputs: str | list[str] | None = None) -> str:
             stderr=subprocess.PIPE,
             stdin=subprocess.PIPE if input_data else subprocess.DEVNULL,
             cwd=cwd,
-            env=_env,
+            env=_get_env(),
         )
         # start_new_session 在 Windows 上不受支持，改用 CREATE_NEW_PROCESS_GROUP
         if _IS_WINDOWS:
@@ -78,8 +98,11 @@ def system_command(command: str, inputs: str | list[str] | None = None) -> str:
             kwargs['start_new_session'] = True
 
         proc = subprocess.Popen(command, **kwargs)
+        apply_limits(proc.pid, limits, cgroup)
     except Exception as e:
         log(f'system_command error: {e}')
+        if cgroup is not None:
+            cgroup.remove()
         return str(e)
 
     stdout_chunks: list[bytes] = []
@@ -98,7 +121,6 @@ def system_command(command: str, inputs: str | list[str] | None = None) -> str:
     t_out.start()
     t_err.start()
 
-    timed_out = False
     timeout = get_config().get('wait', 10)
 
     try:
@@ -106,10 +128,11 @@ def system_command(command: str, inputs: str | list[str] | None = None) -> str:
             # 发送输入并等待
             proc.stdin.write(input_data)
             proc.stdin.close()  # 必须关闭，否则子进程可能一直等待输入
-
-        proc.wait(timeout=timeout)
-    except subprocess.TimeoutExpired:
-        timed_out = True
+    except OSError:
+        pass  # 子进程已退出，不再读取输入
+    usage = wait_with_usage(proc, timeout)
+    timed_out = usage is None
+    if timed_out:
         # 跨平台终止进程树
         if _IS_WINDOWS:
             subprocess.run(
@@ -118,10 +141,13 @@ def system_command(command: str, inputs: str | list[str] | None = None) -> str:
             )
         else:
             import signal
+            if cgroup is not None:
+                cgroup.kill()
             try:
                 os.killpg(os.getpgid(proc.pid), signal.SIGKILL)
             except ProcessLookupError:
                 proc.kill()
+        usage = wait_with_usage(proc)
 
     t_out.join(timeout=1)
     t_err.join(timeout=1)
@@ -130,8 +156,13 @@ def system_command(command: str, inputs: str | list[str] | None = None) -> str:
     if proc.stdout: proc.stdout.close()
     if proc.stderr: proc.stderr.close()
 
+    if cgroup is not None:
+        usage.max_rss = cgroup.peak_memory() or usage.max_rss
+        cgroup.remove()
+    log(f'system_command | {usage.describe()}')
+
     if timed_out:
-        return f'命令执行超时（超过 {timeout} 秒）: {command}'
+        return f'命令执行超时（超过 {timeout} 秒）: {command}\n{usage.describe()}'
 
     encoding = get_config()['encoding']
     stdout_str = b''.join(stdout_chunks).decode(encoding, errors='replace').rstrip('\r\n')
@@ -141,13 +172,18 @@ def system_command(command: str, inputs: str | list[str] | None = None) -> str:
     if stderr_str:
         output += f'\n[STDERR]: {stderr_str}'
 
-    return output or '（输出为空）'
+    return f'{output or "（输出为空）"}\n{usage.describe()}'
 
 def get_cwd() -> str:
     """返回当前持久化工作目录。"""
     return _get_cwd()
 
 
+def get_env() -> dict[str, str]:
+    """返回后续命令使用的环境变量副本。"""
+    return dict(_get_env())
+
+
 # ── 文件读写 ──────────────────────────────────────────────────────────────
 
 def find_file(filename: str, encoding: str = 'utf-8') -> str:
@@ -156,7 +192,43 @@ def find_file(filename: str, encoding: str = 'utf-8') -> str:
         return f.read()
 
 
+def read_lines(filename: str, start: int, end: int | None, encoding: str = 'utf-8',
+               max_chars: int | None = None) -> tuple[str, int, int]:
+    """逐行读取第 start~end 行（1 起，含两端），返回 (内容, 文件总行数, 完整读入的最后一行)；
+    不把整个文件载入内存。
+
+    给出 max_chars 时内容不超过该字符数：读满后不再收入后续行；第 start 行本身就超出时
+    只保留其前 max_chars 个字符（此时最后一行为 start - 1）。
+    """
+    kept = []
+    size = 0
+    last = start - 1
+    total = 0
+    with open(filename, 'r', encoding=encoding) as f:
+        for total, line in enumerate(f, 1):
+            if total < start or (end is not None and total > end) or last < total - 1:
+                continue
+            if max_chars is not None and size + len(line) > max_chars:
+                if not kept:
+                    kept.append(line[:max_chars])
+                continue
+            kept.append(line)
+            size += len(line)
+            last = total
+    return ''.join(kept), total, last
+
+
 def edit_file(filename: str, text: str, encoding: str = 'utf-8'):
-    """将 text 覆盖写入指定文件。"""
-    with open(filename, 'w', encoding=encoding) as f:
-        f.write(text)
\ No newline at end of file
+    """将 text 原子地覆盖写入指定文件（临时文件 + rename，写入中途崩溃不会截断原文件）。"""
+    from script.fileio import atomic_write
+    atomic_write(filename, text, encoding)
+    from script.workspace_index import notify_changed
+    notify_changed(filename)
+
+
+def append_file(filename: str, text: str, encoding: str = 'utf-8'):
+    """将 text 追加到指定文件末尾（文件不存在时创建），原地追加并 fsync。"""
+    from script.fileio import atomic_append
+    atomic_append(filename, text, encoding)
+    from script.workspace_index import notify_changed
+    notify_changed(filename)
\ No newline at end of file
@@ -0,0 +1,204 @@
+"""
+tables.py —— browse_extract_tables 工具：把网页表格直接写入 CSV / JSON 文件。
+
+browser.browser_tables() 在页面中一次 JS 遍历取出所有表格（rowspan / colspan 已展开），
+本模块负责规范化并写入工作区，只把表格形状与少量样例行返回给模型，
+数据不经过模型转录，既节省 token 也避免抄错数字。
+
+规范化：
+    - 表头：<thead> / 全部为 <th> 的前几行（多级表头按列以 " / " 连接）；
+      没有标记表头时，若首行全为文字且之后的行含数字，则把首行当作表头；重名的列加序号；
+    - 去掉全空的行与列，各行补齐到相同列数；
+    - 数字：多数非空单元格可解析为数字的列视为数值列，去掉千位分隔符、货币符号、
+      脚注标记（[1]、*、†），括号 / Unicode 减号表示负数，N/A、— 等缺失值置空；
+      整列单位一致（%、同一货币或 万元 / 亿 等数量单位）时单位移到表头，例如 "增长率 (%)"，
+      数值本身不做换算。无法解析的单元格保留原文。
+      任一单元格以 0 开头且后接数字（000001、002594 等代码、编号）的列视为文本列，保留前导零。
+"""
+
+from __future__ import annotations
+
+import csv
+import io
+import json
+import os
+import re
+import time
+
+NUMERIC_RATIO = 0.8
+
+_FOOTNOTE = re.compile(r'(?:\s*\[(?:\w{1,3}|注\s*\d*)\]|[*†‡§]+)$')
+_CURRENCY = re.compile(r'^(?:US\$|HK\$|NT\$|RMB|CNY|USD|EUR|GBP|JPY|[$¥￥€£₹₩])\s*|'
+                       r'\s*(?:万亿元|亿元|万元|千元|万亿|亿|万|元|美元|USD|EUR|CNY|RMB)$')
+_GROUPED = re.compile(r'^\d{1,3}(?:[,\s\u00a0\u202f\']\d{3})+(?:\.\d+)?$')
+_MISSING = frozenset({'-', '--', '—', '–', '/', '..', '...', '…', 'N/A', 'n/a', 'NA', 'n.a.', 'null', '暂无', '无'})
+_PLAIN = re.compile(r'^(?:\d+(?:\.\d*)?|\.\d+)(?:[eE][-+]?\d+)?$')
+_LEADING_ZERO = re.compile(r'^0\d')
+
+
+def parse_number(text: str) -> tuple[int | float, str] | None:
+    """解析单元格中的数字，返回 (数值, 单位)；单位为 '%'、'‰'、货币符号或空串。无法解析时返回 None。"""
+    s = _FOOTNOTE.sub('', text.strip()).strip()
+    if not s:
+        return None
+    negative = False
+    if s.startswith('(') and s.endswith(')'):
+        negative, s = True, s[1:-1].strip()
+    if s[:1] in '-−–+':
+        negative, s = s[0] != '+', s[1:].strip()
+    unit = ''
+    for _ in range(2):   # 前缀与后缀可能同时出现，如 "¥3,000元"
+        m = _CURRENCY.search(s)
+        if not m or not s:
+            break
+        unit = unit or m.group(0).strip()
+        s = (s[:m.start()] + s[m.end():]).strip()
+        if s[:1] in '-−–':   # "$-12"
+            negative, s = True, s[1:].strip()
+    if s[-1:] in ('%', '‰'):
+        unit, s = s[-1], s[:-1].strip()
+    if _GROUPED.match(s):
+        s = re.sub(r'[,\s\u00a0\u202f\']', '', s)
+    elif not _PLAIN.match(s):
+        return None
+    value = float(s) if any(c in s for c in '.eE') else int(s)
+    return (-value if negative else value), unit
+
+
+def _is_text(cell: str) -> bool:
+    return bool(cell) and parse_number(cell) is None
+
+
+def _headers(grid: list[list[str]], head_rows: int) -> tuple[list[str], list[list[str]]]:
+    """返回 (表头, 数据行)。"""
+    if head_rows == 0 and len(grid) > 1 and all(_is_text(c) for c in grid[0] if c) \
+            and any(c for c in grid[0]) and any(parse_number(c) for row in grid[1:] for c in row if c):
+        head_rows = 1
+    width = len(grid[0]) if grid else 0
+    headers = []
+    for col in range(width):
+        parts = []
+        for row in grid[:head_rows]:
+            if row[col] and (not parts or parts[-1] != row[col]):
+                parts.append(row[col])
+        headers.append(' / '.join(parts) or f'列{col + 1}')
+    seen: dict[str, int] = {}
+    for i, name in enumerate(headers):
+        seen[name] = seen.get(name, 0) + 1
+        if seen[name] > 1:
+            headers[i] = f'{name}_{seen[name]}'
+    return headers, grid[head_rows:]
+
+
+def normalize(raw: dict) -> dict:
+    """规范化一个表格，返回 {caption, selector, kind, headers, rows, numeric, total_rows}。"""
+    width = max(len(r) for r in raw['grid'])
+    grid = [list(r) + [''] * (width - len(r)) for r in raw['grid']]
+    grid = [r for r in grid if any(r)]
+    keep = [c for c in range(width) if any(r[c] for r in grid)]
+    grid = [[r[c] for c in keep] for r in grid]
+    headers, rows = _headers(grid, raw.get('headRows', 0))
+
+    numeric = []
+    for col in range(len(headers)):
+        cells = [r[col] for r in rows if r[col] and r[col] not in _MISSING]
+        if any(_LEADING_ZERO.match(c.strip()) for c in cells):
+            continue   # 股票代码、邮编等编号：转成数字会丢失前导零
+        parsed = [parse_number(c) for c in cells]
+        ok = [p for p in parsed if p is not None]
+        if not cells or len(ok) < NUMERIC_RATIO * len(cells):
+            continue
+        numeric.append(headers[col])
+        units = {u for _, u in ok}
+        strip_unit = len(units) == 1 and '' not in units and len(ok) == len(cells)
+        if strip_unit:
+            headers[col] = f'{headers[col]} ({units.pop()})'
+            numeric[-1] = headers[col]
+        for r in rows:
+            if r[col] in _MISSING:
+                r[col] = ''
+                continue
+            p = parse_number(r[col]) if r[col] else None
+            if p is not None and (strip_unit or not p[1]):
+                r[col] = p[0]
+    return {'caption': raw.get('caption', ''), 'selector': raw.get('selector', ''), 'kind': raw.get('kind', 'table'),
+            'headers': headers, 'rows': rows, 'numeric': numeric,
+            'total_rows': raw.get('totalRows', len(raw['grid']))}
+
+
+def _slug(text: str, limit: int = 40) -> str:
+    slug = re.sub(r'[\\/:*?"<>|\s]+', '_', text).strip('._')
+    return slug[:limit] or 'table'
+
+
+def to_csv(table: dict) -> str:
+    buf = io.StringIO()
+    writer = csv.writer(buf, lineterminator='\n')
+    writer.writerow(table['headers'])
+    writer.writerows(table['rows'])
+    return buf.getvalue()
+
+
+def to_json(table: dict, url: str = '') -> str:
+    data = {'caption': table['caption'], 'source': url, 'headers': table['headers'],
+            'rows': [dict(zip(table['headers'], r)) for r in table['rows']]}
+    return json.dumps(data, ensure_ascii=False, indent=1)
+
+
+def _sample(table: dict, n: int, width: int = 30) -> list[str]:
+    def cell(v) -> str:
+        s = str(v)
+        return s if len(s) <= width else s[:width] + '…'
+    lines = ['    ' + ' | '.join(cell(h) for h in table['headers'])]
+    lines += ['    ' + ' | '.join(cell(v) for v in r) for r in table['rows'][:n]]
+    return lines
+
+
+def extract_tables(save_dir: str, name: str | None = None, fmt: str = 'csv',
+                   indexes: list[int] | None = None, sample_rows: int = 3, max_tables: int = 20) -> str:
+    """browse_extract_tables 工具入口：提取当前页面的表格写入 save_dir，返回形状与样例行。"""
+    from config import get_config
+    from script.browser import browser_tables
+    from script.checkpoint import checkpoint
+    from script.system import edit_file
+
+    data = browser_tables(max_tables)
+    if isinstance(data, str):
+        return data
+    if not data['tables']:
+        return f'当前页面（{data["url"]}）没有找到表格。可用 browse_layout 查看页面结构，或用 browse_eval 自行提取。'
+    fmt = fmt if fmt in ('csv', 'json', 'both') else 'csv'
+    selected = [(i, t) for i, t in enumerate(data['tables'], 1) if not indexes or i in indexes]
+    if not selected:
+        return f'页面共有 {len(data["tables"])} 个表格，没有符合 tables 参数的表格。'
+
+    encoding = get_config()['encoding']
+    base = _slug(name or data['title'] or f'table_{time.strftime("%Y%m%d_%H%M%S")}')
+    os.makedirs(save_dir, exist_ok=True)
+    lines = [f'从 {data["url"]} 提取了 {len(selected)} 个表格'
+             + (f'（页面共 {data["total"]} 个，仅处理前 {len(data["tables"])} 个）' if data['total'] > len(data['tables']) else '')
+             + ':']
+    outputs = []   # [(序号, 原始表格, 规范化表格, {路径: 内容})]
+    for i, raw in selected:
+        table = normalize(raw)
+        stem = os.path.join(save_dir, base if len(selected) == 1 else f'{base}_{i}')
+        writes = {}
+        if fmt in ('csv', 'both'):
+            writes[stem + '.csv'] = to_csv(table)
+        if fmt in ('json', 'both'):
+            writes[stem + '.json'] = to_json(table, data['url'])
+        outputs.append((i, raw, table, writes))
+    # 同名文件会被覆盖，写入前统一建立检查点，可用 /undo 撤销
+    checkpoint([p for *_, writes in outputs for p in writes], f'browse_extract_tables {data["url"]}')
+    for i, raw, table, writes in outputs:
+        for path, text in writes.items():
+            edit_file(path, text, encoding)
+        paths = list(writes)
+        caption = f' "{table["caption"]}"' if table['caption'] else ''
+        truncated = '（行数过多已截断）' if table['total_rows'] > len(raw['grid']) else ''
+        lines.append(f'[{i}] {table["kind"]}{caption} {len(table["rows"])} 行 × {len(table["headers"])} 列'
+                     f'{truncated} → {", ".join(paths)}')
+        if table['numeric']:
+            lines.append(f'    数值列: {", ".join(table["numeric"])}')
+        lines.extend(_sample(table, sample_rows))
+    return '\n'.join(lines)
@@ -12,16 +12,55 @@ import json
 import traceback
 from script.logger import log, user_log
 from config import get_config
-from script.system import system_command, find_file, edit_file
+from script.system import find_file, edit_file, append_file
+from script.checkpoint import checkpoint
 import os
 
 
+MAX_RANGE_LINES = 1000
+MAX_RANGE_CHARS = 100 * 1024
+
+
+def _read_range(file_path: str, start_line, end_line, encoding: str) -> str:
+    """read_file 的按行范围读取（配合 find_symbol 返回的行号），不受整文件大小限制。
+
+    单次最多返回 MAX_RANGE_LINES 行、MAX_RANGE_CHARS 个字符（与整文件读取的 100 KB 上限相当），
+    超出部分截断并注明。
+    """
+    from script.system import read_lines
+    start = max(1, int(start_line or 1))
+    end = int(end_line) if end_line else start + MAX_RANGE_LINES - 1
+    if end < start:
+        return f'行范围无效: {start}-{end}'
+    end = min(end, start + MAX_RANGE_LINES - 1)
+    user_log(f'Bot 阅读文件: {file_path}（第 {start}-{end} 行）')
+    try:
+        content, total, last = read_lines(file_path, start, end, encoding, MAX_RANGE_CHARS)
+    except Exception as e:
+        log(f'read_file error | {file_path}\n{traceback.format_exc()}')
+        return f'在阅读文件时遇到了以下错误: \n{type(e).__name__}: {e}\n如果没有找到文件，可以尝试使用文件的绝对路径。'
+    if start > total:
+        return f'{file_path} 共 {total} 行，起始行 {start} 超出范围。'
+    if last < start:
+        return (f'成功打开文件: {file_path}（第 {start} 行过长，只显示前 {MAX_RANGE_CHARS} 个字符，共 {total} 行）\n'
+                f'{file_path}:\n{content}\n…（已截断）')
+    note = ''
+    if last < min(end, total):
+        note = f'\n…（已截断: 内容超过 {MAX_RANGE_CHARS} 字符，请从第 {last + 1} 行继续读取）'
+    more = f'，之后还有 {total - last} 行' if last < total else ''
+    return f'成功打开文件: {file_path}（第 {start}-{last} 行，共 {total} 行{more}）\n{file_path}:\n{content}{note}'
+
+
 # ── 单个工具执行 ──────────────────────────────────────────────────────────
 
 def _execute_tool(name: str, args: dict,
-                  input_func=input) -> tuple[str, dict[str, str], bool]:
+                  input_func=input, work_bot=None, streamed=None) -> tuple[str, dict[str, str], bool]:
     """执行单个工具调用。
 
+    work_bot 为发起调用的 Bot，供 enable_tools 等需要修改 Bot 状态的工具使用。
+    streamed 为流式请求中已写入临时文件的 content（StreamedContent，见 script/streaming.py），
+    此时 args['content'] 只是占位文本。
+
     Returns:
         (result_str, file_contents_dict, is_finish)
         file_contents_dict: 仅 read_file 成功时非空，格式 {filename: content}
@@ -40,6 +79,21 @@ def _execute_tool(name: str, args: dict,
             user_log(f'超时时长已设置为: {seconds} 秒')
             return f'超时时长已更新为 {seconds} 秒', {}, False
 
+        # ── enable_tools ────────────────────────────────────────────────
+        case 'enable_tools':
+            from script.tools_def import GROUP_DESCRIPTIONS
+            groups = args.get('groups') or []
+            if isinstance(groups, str):
+                groups = [groups]
+            unknown = [g for g in groups if g not in GROUP_DESCRIPTIONS]
+            if unknown:
+                return f'未知的工具分组: {", ".join(unknown)}（可用: {", ".join(GROUP_DESCRIPTIONS)}）', {}, False
+            added = work_bot.enable_tool_groups(groups) if work_bot is not None else []
+            if added:
+                user_log(f'启用工具: {", ".join(added)}')
+                return f'已启用工具分组: {", ".join(added)}，下一步即可使用其中的工具。', {}, False
+            return f'工具分组 {", ".join(groups)} 已经可用。', {}, False
+
         # ── finish ──────────────────────────────────────────────────────
         case 'finish':
             return 'FINISH', {}, True
@@ -49,22 +103,75 @@ def _execute_tool(name: str, args: dict,
             command = args.get('command', '')
             inputs = args.get('inputs')  # 获取新参数
             user_log(f'终端输入: {command}{f' | input={inputs}' if inputs is not None else ""}', role='CMD')
-            output = system_command(command, inputs=inputs)
+            from script.command_cache import run_command
+            output = run_command(command, inputs=inputs)
             user_log(f'终端输出: {"(NULL)" if output == "" else ("\n" + output)}', role='CMD')
             return output or '（输出为空）', {}, False
 
-        # ── edit_file ────────────────────────────────────────────────────
-        case 'edit_file':
+        # ── 后台任务 ────────────────────────────────────────────────────
+        case 'job_start':
+            from script.command_cache import invalidate
+            from script.jobs import job_start
+            command = args.get('command', '')
+            invalidate()
+            user_log(f'后台启动: {command}', role='CMD')
+            return job_start(command), {}, False
+
+        case 'job_status':
+            from script.jobs import job_status
+            return job_status(args.get('job_id')), {}, False
+
+        case 'job_output':
+            from script.jobs import job_output
+            job_id = args.get('job_id', '')
+            user_log(f'读取后台任务 [{job_id}] 的输出', role='CMD')
+            return job_output(job_id, int(args.get('offset', 0)), int(args.get('max_chars', 4000))), {}, False
+
+        case 'job_wait':
+            from script.jobs import job_wait
+            job_id = args.get('job_id', '')
+            timeout = float(args.get('timeout', 30))
+            user_log(f'等待后台任务 [{job_id}]（最多 {timeout:g} 秒）', role='CMD')
+            return job_wait(job_id, timeout), {}, False
+
+        case 'job_kill':
+            from script.jobs import job_kill
+            job_id = args.get('job_id', '')
+            user_log(f'终止后台任务 [{job_id}]', role='CMD')
+            return job_kill(job_id), {}, False
+
+        # ── python_exec ──────────────────────────────────────────────────
+        case 'python_exec':
+            from script.command_cache import invalidate
+            from script.kernel import python_exec
+            code = args.get('code', '')
+            invalidate()
+            user_log(f'执行 Python 代码（{len(code.splitlines())} 行）', role='CMD')
+            return python_exec(code, args.get('timeout'), bool(args.get('reset', False))), {}, False
+
+        # ── edit_file / append_file ──────────────────────────────────────
+        case 'edit_file' | 'append_file':
             file_path = args.get('file_path', '')
-            content = args.get('content', '')
             encoding = args.get('encoding') or default_encoding
+            append = name == 'append_file'
             try:
-                edit_file(file_path, content, encoding)
-                write_lines = len(content.splitlines())
+                checkpoint([file_path], f'{name} {file_path}', link=not append)
+                if streamed is not None:
+                    streamed.commit(file_path, encoding, append=append)
+                    from script.workspace_index import notify_changed
+                    notify_changed(file_path)
+                    write_lines = streamed.lines
+                else:
+                    content = args.get('content', '')
+                    (append_file if append else edit_file)(file_path, content, encoding)
+                    write_lines = len(content.splitlines())
+                if append:
+                    user_log(f'Bot 追加文件: {file_path} (+{write_lines})')
+                    return f'已追加到文件: {file_path}（+{write_lines} 行）', {}, False
                 user_log(f'Bot 写入文件: {file_path} (+{write_lines})')
                 return f'文件写入完成: {file_path}（+{write_lines} 行）', {}, False
             except Exception as e:
-                log(f'edit_file error | {file_path}\n{traceback.format_exc()}')
+                log(f'{name} error | {file_path}\n{traceback.format_exc()}')
                 return f'在编辑文件时遇到了以下错误: \n{type(e).__name__}: {e}\n如果没有找到文件，可以尝试使用文件的绝对路径。', {}, False
 
         # ── replace_file ──────────────────────────────────────────────────
@@ -78,6 +185,7 @@ def _execute_tool(name: str, args: dict,
                 if old_text not in content:
                     return f'替换失败: 在 {file_path} 中未找到指定的旧文本。', {}, False
                 new_content = content.replace(old_text, new_text, 1)
+                checkpoint([file_path], f'replace_file {file_path}')
                 edit_file(file_path, new_content, encoding)
                 old_lines = len(old_text.splitlines())
                 new_lines = len(new_text.splitlines())
@@ -87,10 +195,86 @@ def _execute_tool(name: str, args: dict,
                 log(f'replace_file error | {file_path}\n{traceback.format_exc()}')
                 return f'在替换文件时遇到了以下错误: \n{type(e).__name__}: {e}\n如果没有找到文件，可以尝试使用文件的绝对路径。', {}, False
 
+        # ── apply_patch ───────────────────────────────────────────────────
+        case 'apply_patch':
+            from script.patch import plan_patch, PatchError
+            from script.fileio import atomic_write_many
+            from script.system import get_cwd
+            from script.workspace_index import notify_changed
+            patch = args.get('patch')
+            edits = args.get('edits')
+            encoding = args.get('encoding') or default_encoding
+            if not patch and not edits:
+                return '应用补丁失败: 需要提供 patch 或 edits 参数。', {}, False
+            try:
+                writes, summary = plan_patch(patch, edits, get_cwd(), encoding)
+            except PatchError as e:
+                return f'应用补丁失败（未修改任何文件）: {e}', {}, False
+            except Exception as e:
+                log(f'apply_patch error\n{traceback.format_exc()}')
+                return f'应用补丁失败（未修改任何文件）: \n{type(e).__name__}: {e}', {}, False
+            checkpoint(writes, f'apply_patch {len(writes)} 个文件')
+            try:
+                atomic_write_many(writes, encoding)
+            except Exception as e:
+                log(f'apply_patch write error\n{traceback.format_exc()}')
+                return f'写入文件时出错，所有文件已回滚: \n{type(e).__name__}: {e}', {}, False
+            for path in writes:
+                notify_changed(path)
+            user_log(f'Bot 应用补丁: {len(writes)} 个文件')
+            return '补丁已应用:\n' + '\n'.join(f'  {line}' for line in summary), {}, False
+
+        case 'bulk_replace':
+            import re as _re
+            from script.bulk import bulk_replace, format_result, split_glob
+            from script.checkpoint import current_store
+            from script.system import get_cwd
+            from script.workspace_index import notify_changed
+            glob = args.get('glob', '')
+            pattern = args.get('pattern', '')
+            if not glob or not pattern:
+                return '批量替换失败: 需要提供 glob 与 pattern 参数。', {}, False
+            dry_run = bool(args.get('dry_run', False))
+            root, rel_glob = split_glob(glob, get_cwd())
+            user_log(f'Bot 批量替换{"（预览）" if dry_run else ""}: {glob} /{pattern}/')
+            store = current_store()
+            try:
+                result = bulk_replace(
+                    root, rel_glob, pattern, args.get('replacement', ''),
+                    dry_run=dry_run,
+                    ignore_case=bool(args.get('ignore_case', False)),
+                    multiline=bool(args.get('multiline', False)),
+                    encoding=args.get('encoding') or default_encoding,
+                    snapshot_dir=None if dry_run else store.dir,
+                )
+            except _re.error as e:
+                return f'批量替换失败: 正则表达式错误: {e}', {}, False
+            except Exception as e:
+                log(f'bulk_replace error\n{traceback.format_exc()}')
+                return f'批量替换失败: \n{type(e).__name__}: {e}', {}, False
+            if not dry_run:
+                store.commit(f'bulk_replace {glob} /{pattern}/',
+                             [r['snapshot'] for r in result['files'] + result['errors'] if r.get('snapshot')])
+                for r in result['files']:
+                    notify_changed(r['path'])
+            return format_result(result, dry_run), {}, False
+
+        # ── rollback ───────────────────────────────────────────────────────
+        case 'rollback':
+            from script.checkpoint import list_checkpoints, rollback
+            steps = int(args.get('steps', 1))
+            if steps <= 0:
+                return list_checkpoints(), {}, False
+            user_log(f'撤销最近 {steps} 次文件修改')
+            return rollback(steps), {}, False
+
         # ── read_file ──────────────────────────────────────────────────────
         case 'read_file':
             file_path = args.get('file_path', '')
             encoding = args.get('encoding') or default_encoding
+            start_line, end_line = args.get('start_line'), args.get('end_line')
+            if start_line or end_line:
+                return _read_range(file_path, start_line, end_line, encoding), {}, False
             user_log(f'Bot 阅读文件: {file_path}')
             try:
                 import os as _os
@@ -112,62 +296,99 @@ def _execute_tool(name: str, args: dict,
 
         # ── get_skill ──────────────────────────────────────────────────────
         case 'get_skill':
-            import os as _os
+            from script.skills import get_registry, skills_root
             skill_name = args.get('skill_name', '').strip()
             resource = args.get('resource', '').strip()  # 可选：scripts/xxx.py / references/xxx.md 等
-            skills_dir = cfg.get('skills_dir', 'skill')
-            if _os.path.isabs(skills_dir):
-                skills_root = skills_dir
-            else:
-                _project_root = _os.environ.get('MOMOKA_PROJECT_DIR', '')
-                skills_root = _os.path.join(_project_root, skills_dir)
-            skill_path = _os.path.join(skills_root, skill_name)
+            registry = get_registry(cfg)
+            skill = registry.get(skill_name)
 
-            if not _os.path.isdir(skill_path):
+            if skill is None:
+                skill_path = os.path.join(skills_root(cfg), skill_name)
+                if os.path.isdir(skill_path):
+                    return f'skill目录存在但缺少 SKILL.md: {skill_path}', {}, False
                 return (f'未找到skill: {skill_name}（路径: {skill_path}）'
-                        f'\n提示: 请确认 {skills_dir}/ 目录下存在该skill文件夹。'), {}, False
+                        f'\n提示: 请确认 {cfg.get("skills_dir", "skill")}/ 目录下存在该skill文件夹。'), {}, False
 
             # 读取指定资源文件，或默认读取 SKILL.md
             if resource:
-                target = _os.path.join(skill_path, resource)
-                if not _os.path.isfile(target):
+                try:
+                    target, content = registry.read(skill_name, resource)
+                except FileNotFoundError:
                     # 列出可用资源供模型参考
-                    available = []
-                    for root_, dirs_, files_ in _os.walk(skill_path):
-                        for f_ in files_:
-                            available.append(_os.path.join(root_, f_))
                     return (f'未找到资源文件: {resource}\n'
                             f'skill {skill_name!r} 中可用文件:\n' +
-                            '\n'.join(f'  {f}' for f in sorted(available))), {}, False
-                try:
-                    with open(target, 'r', encoding=default_encoding) as fh:
-                        content = fh.read()
-                    user_log(f'读取skill资源: {skill_name}/{resource}')
-                    log(f'get_skill | {skill_name}/{resource} ({len(content)} chars)')
-                    return content, {target: content}, False
+                            '\n'.join(f'  {f}' for f in registry.manifest(skill_name))), {}, False
                 except Exception as e:
                     return f'读取资源文件失败: {e}', {}, False
+                user_log(f'读取skill资源: {skill_name}/{resource}')
+                log(f'get_skill | {skill_name}/{resource} ({len(content)} chars)')
+                return content, {target: content}, False
             else:
-                skill_md = _os.path.join(skill_path, 'SKILL.md')
-                if not _os.path.isfile(skill_md):
-                    return f'skill目录存在但缺少 SKILL.md: {skill_path}', {}, False
                 try:
-                    with open(skill_md, 'r', encoding=default_encoding) as fh:
-                        content = fh.read()
-                    # 顺带列出目录中可用的其他资源（scripts/references/assets）
-                    extras = []
-                    for sub in ('scripts', 'references', 'assets'):
-                        sub_path = _os.path.join(skill_path, sub)
-                        if _os.path.isdir(sub_path):
-                            for fn in sorted(_os.listdir(sub_path)):
-                                extras.append(os.path.realpath(os.path.join(sub_path, fn)))
-                    suffix = ('\n\n可用资源文件（使用 resource 参数加载）:\n' +
-                              '\n'.join(f'  {e}' for e in extras)) if extras else ''
-                    user_log(f'已加载skill: {skill_name}')
-                    log(f'get_skill | {skill_name}/SKILL.md ({len(content)} chars)')
-                    return content + suffix, {skill_md: content}, False
+                    skill_md, content = registry.read(skill_name)
                 except Exception as e:
                     return f'读取 SKILL.md 失败: {e}', {}, False
+                # 顺带列出目录中可用的其他资源（scripts/references/assets）
+                extras = [
+                    os.path.realpath(os.path.join(skill['path'], rel))
+                    for rel in registry.manifest(skill_name)
+                    if rel.split('/', 1)[0] in ('scripts', 'references', 'assets')
+                ]
+                suffix = ('\n\n可用资源文件（使用 resource 参数加载）:\n' +
+                          '\n'.join(f'  {e}' for e in extras)) if extras else ''
+                user_log(f'已加载skill: {skill_name}')
+                log(f'get_skill | {skill_name}/SKILL.md ({len(content)} chars)')
+                return content + suffix, {skill_md: content}, False
+        # ── search_skills ──────────────────────────────────────────────────
+        case 'search_skills':
+            from script.skill_index import search_skills
+            query = args.get('query', '')
+            user_log(f'搜索skill: {query!r}')
+            return search_skills(query, int(args.get('top_k', 10))), {}, False
+
+        # ── delegate ───────────────────────────────────────────────────────
+        case 'delegate':
+            from script.delegate import delegate
+            tasks = args.get('tasks') or []
+            user_log(f'委派 {len(tasks)} 个子任务')
+            return delegate(tasks), {}, False
+
+        # ── search_workspace ───────────────────────────────────────────────
+        case 'search_workspace':
+            from script.workspace_index import search_workspace
+            query = args.get('query', '')
+            if not query:
+                return '搜索失败: query 不能为空。', {}, False
+            path = args.get('path') or None
+            user_log(f'搜索工作区: {query!r}{f" ({path})" if path else ""}')
+            return search_workspace(
+                query, path,
+                regex=bool(args.get('regex', False)),
+                case_sensitive=bool(args.get('case_sensitive', False)),
+                max_results=int(args.get('max_results', 20)),
+                context=int(args.get('context', 1)),
+            ), {}, False
+
+        case 'project_map':
+            from script.project_map import project_map
+            path = args.get('path') or None
+            user_log(f'查看目录结构{f": {path}" if path else ""}')
+            return project_map(path, depth=int(args.get('depth', 2)),
+                               max_entries=int(args.get('max_entries', 15))), {}, False
+
+        case 'find_symbol' | 'find_references':
+            from script.symbol_index import find_references, find_symbol
+            symbol = args.get('name', '').strip()
+            if not symbol:
+                return '查找失败: name 不能为空。', {}, False
+            path = args.get('path') or None
+            if name == 'find_symbol':
+                user_log(f'查找定义: {symbol}')
+                return find_symbol(symbol, path, kind=args.get('kind', ''),
+                                   max_results=int(args.get('max_results', 20))), {}, False
+            user_log(f'查找引用: {symbol}')
+            return find_references(symbol, path, max_results=int(args.get('max_results', 50))), {}, False
+
         case 'change_directory':
             from script.system import set_cwd_explicit
             path = args.get('path', '')
@@ -187,8 +408,9 @@ def _execute_tool(name: str, args: dict,
         case 'browse_open':
             from script.browser import browser_open
             url = args.get('url', '')
+            max_age = args.get('max_age')
             user_log(f'打开网页: {url}')
-            return browser_open(url), {}, False
+            return browser_open(url, max_age=int(max_age) if max_age is not None else None), {}, False
 
         case 'browse_search':
             from script.browser import browser_search
@@ -210,12 +432,28 @@ def _execute_tool(name: str, args: dict,
             user_log(f'页面搜索: {text!r}')
             return browser_find(text, int(max_results)), {}, False
 
+        case 'browse_layout':
+            from script.browser import browser_layout
+            region = args.get('region')
+            viewport_only = args.get('viewport_only', True)
+            max_blocks = args.get('max_blocks', 60)
+            user_log('读取页面布局...')
+            return browser_layout(region, bool(viewport_only), int(max_blocks)), {}, False
+
+        case 'browse_extract_tables':
+            from script.tables import extract_tables
+            save_dir = args.get('save_dir') or cfg['work_dir']
+            user_log(f'提取网页表格 → {save_dir}')
+            return extract_tables(save_dir, args.get('name'), args.get('format', 'csv'),
+                                  args.get('tables'), int(args.get('sample_rows', 3))), {}, False
+
         case 'browse_download':
             from script.browser import browser_download
-            url = args.get('url', '')
+            urls = args.get('urls') or args.get('url', '')
             save_dir = args.get('save_dir') or cfg['work_dir']
-            user_log(f'下载文件: {url} → {save_dir}')
-            return browser_download(url, save_dir), {}, False
+            checksum = args.get('checksum')
+            user_log(f'下载文件: {urls} → {save_dir}')
+            return browser_download(urls, save_dir, checksum), {}, False
 
         case 'browse_upload':
             from script.browser import browser_upload
@@ -285,7 +523,18 @@ def execute_tool_calls(
         except json.JSONDecodeError:
             args = {}
 
-        result, file_contents, finish = _execute_tool(name, args, input_func)
+        if work_bot.tools is None:
+            # 模型调用了尚未启用分组中的工具（如沿用早先的调用），照常执行并启用该分组
+            from script.tools_def import group_of
+            group = group_of(name)
+            if group is not None:
+                work_bot.enable_tool_groups([group])
+        if work_bot.tools is not None and name not in {t['function']['name'] for t in work_bot.tools}:
+            # 固定工具列表（子 Bot）之外的调用一律拒绝，不能只靠不下发 schema 来限制
+            result, file_contents, finish = f'工具 {name} 在当前助手中不可用。', {}, False
+        else:
+            result, file_contents, finish = _execute_tool(name, args, input_func, work_bot,
+                                                          streamed=getattr(tc, 'streamed', None))
         all_file_contents.update(file_contents)
 
         log(f'execute_tool_calls | {name}({args}) → {result}')
@@ -296,4 +545,10 @@ def execute_tool_calls(
             is_finish = True
             break
 
+    # 流式写入但未执行（如排在 finish 之后）的内容不落盘
+    for tc in tool_calls:
+        streamed = getattr(tc, 'streamed', None)
+        if streamed is not None:
+            streamed.discard()
+
     return is_finish, all_file_contents
\ No newline at end of file
@@ -1,339 +1,873 @@
-from config import *
+"""
+tools_def.py —— 工具定义（JSON Function Call 格式）与工具分组。
 
-TOOLS: list[dict] = [
-    {
-        "type": "function",
-        "function": {
-            "name": "system_command",
-            "description": "在用户的终端执行命令。",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "command": {"type": "string", "description": "要执行的终端命令"},
-                    "inputs": {
-                        "type": ["string", "array"],
-                        "items": {"type": "string"},
-                        "description": "可选。如果命令需要交互式输入（如确认、输入参数），在此提供。若是列表则按顺序输入。"
-                    }
-                },
-                "required": ["command"],
-            },
-        },
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "edit_file",
-            "description": "用新内容整体覆盖写入指定文件（创建或覆盖）。将文件完整内容作为 content 参数传入。",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "file_path": {"type": "string", "description": "文件的绝对路径（含扩展名）"},
-                    "content": {"type": "string", "description": "写入文件的完整内容"},
-                    "encoding": {"type": "string", "description": "文件编码", "default": get_config()['encoding']},
-                },
-                "required": ["file_path", "content"],
-            },
-        },
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "replace_file",
-            "description": "对文件的部分内容进行精确替换。将要被替换的旧文本和替换后的新文本分别作为参数传入。旧文本必须与文件中的内容完全一致。",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "file_path": {"type": "string", "description": "文件的绝对路径（含扩展名）"},
-                    "old_text": {"type": "string", "description": "文件中要被替换的原始文本，必须与文件内容完全一致"},
-                    "new_text": {"type": "string", "description": "替换后的新文本"},
-                    "encoding": {"type": "string", "description": "文件编码", "default": get_config()['encoding']},
-                },
-                "required": ["file_path", "old_text", "new_text"],
-            },
-        },
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "read_file",
-            "description": "读取并返回指定文件的完整内容。",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "file_path": {"type": "string", "description": "文件的绝对路径（含扩展名）"},
-                    "encoding": {"type": "string", "description": "文件编码", "default": get_config()['encoding']},
-                },
-                "required": ["file_path"],
-            },
-        },
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "change_directory",
-            "description": "切换当前工作目录（支持相对路径或绝对路径）。",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "path": {"type": "string", "description": "目标目录路径"},
-                },
-                "required": ["path"],
-            },
-        },
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "ask_user",
-            "description": "在有问题时向用户提问，等待用户回复后继续。",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "question": {"type": "string", "description": "向用户提出的问题"},
-                },
-                "required": ["question"],
-            },
-        },
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "set_wait",
-            "description": "设置操作的最大超时时长（秒）。默认为 10 秒。",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "seconds": {"type": "integer", "description": "超时时长（秒）"},
-                },
-                "required": ["seconds"],
-            },
-        },
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "get_skill",
-            "description": (
-                "在需要时加载 Agent Skills 标准格式的skill文件（SKILL.md）或skill内的脚本/资源文件。"
-                "skill目录结构: <name>/SKILL.md、scripts/（可执行脚本）、"
-                "references/（参考文档）、assets/（模板及二进制资源）。"
-                "需要执行脚本或读取额外文档时，用 resource='scripts/xxx.py' 等再次调用。"
-            ),
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "skill_name": {
-                        "type": "string",
-                        "description": "skill目录名称",
-                    },
-                    "resource": {
-                        "type": "string",
-                        "description": (
-                            "可选。skill目录内的相对路径。"
-                        ),
-                    },
-                },
-                "required": ["skill_name"],
-            },
-        },
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "finish",
-            "description": "完成所有工作，向用户交付成果并结束自动执行阶段。",
-            "parameters": {
-                "type": "object",
-                "properties": {},
-                "required": [],
-            },
-        },
-    },
-    # ── 浏览器指令 ────────────────────────────────────────────────────────
-    {
-        "type": "function",
-        "function": {
-            "name": "browse_open",
-            "description": "用 Chromium 浏览器打开指定网页。",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "url": {"type": "string", "description": "要打开的完整 URL"},
-                },
-                "required": ["url"],
-            },
-        },
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "browse_search",
-            "description": "使用搜索引擎搜索关键词，直接跳转到搜索结果页。支持 google、bing、baidu、duckduckgo，默认 google。",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "query": {"type": "string", "description": "搜索关键词"},
-                    "engine": {
-                        "type": "string",
-                        "enum": ["google", "bing", "baidu", "duckduckgo"],
-                        "description": "搜索引擎，默认 google",
-                        "default": "google",
-                    },
-                },
-                "required": ["query"],
-            },
-        },
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "browse_read",
-            "description": "读取当前浏览器页面的文字内容及可交互元素列表。建议在每次浏览器操作后调用以确认结果。",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "max_chars": {
-                        "type": "integer",
-                        "description": "返回内容的最大字符数，默认 4000",
-                        "default": 4000,
-                    },
-                },
-                "required": [],
-            },
-        },
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "browse_find",
-            "description": "在当前页面中搜索包含指定文字的可见元素，返回匹配元素的选择器和文字片段。",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "text": {"type": "string", "description": "要搜索的文字"},
-                    "max_results": {
-                        "type": "integer",
-                        "description": "最多返回的结果数，默认 10",
-                        "default": 10,
-                    },
-                },
-                "required": ["text"],
-            },
-        },
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "browse_download",
-            "description": "通过浏览器下载文件（保留登录态 Cookie），保存到工作目录或指定目录。",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "url": {"type": "string", "description": "文件下载 URL"},
-                    "save_dir": {
-                        "type": "string",
-                        "description": "保存目录，默认为工作目录",
-                    },
-                },
-                "required": ["url"],
-            },
-        },
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "browse_upload",
-            "description": "向页面的文件输入框上传本地文件。",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "selector": {"type": "string", "description": "文件输入框的 CSS 选择器"},
-                    "file_path": {"type": "string", "description": "本地文件的绝对路径"},
-                },
-                "required": ["selector", "file_path"],
-            },
-        },
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "browse_pdf",
-            "description": "将当前浏览器页面导出为 PDF 文件。",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "save_dir": {
-                        "type": "string",
-                        "description": "PDF 保存目录，默认为工作目录",
-                    },
-                },
-                "required": [],
-            },
-        },
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "browse_eval",
-            "description": "在当前浏览器页面中执行 JavaScript 表达式，返回执行结果。",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "script": {"type": "string", "description": "要执行的 JavaScript 表达式"},
-                },
-                "required": ["script"],
-            },
-        },
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "browse_wait_for_navigation",
-            "description": "等待当前页面导航完成（例如点击链接、提交表单或执行了可能跳转的 JavaScript 后）。\n建议在调用可能触发页面跳转的 browse_eval 之后调用此工具，以确保新页面完全加载后再进行读取或其他操作。",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "timeout": {
-                        "type": "integer",
-                        "description": "最大等待时间（秒）",
-                        "default": get_config()['wait'],
-                    },
-                    "state": {
-                        "type": "string",
-                        "enum": ["load", "domcontentloaded", "networkidle"],
-                        "description": "等待的加载状态，'load' 等待 load 事件，'domcontentloaded' 等待 DOM 解析完成，'networkidle' 等待网络空闲",
-                        "default": "networkidle"
-                    }
-                },
-                "required": []
-            },
-        },
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "browse_switch",
-            "description": "切换到指定编号的标签页。标签页编号可在 browse_read 返回的标签页列表中查看。",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "index": {"type": "integer", "description": "目标标签页的编号"},
-                },
-                "required": ["index"],
-            },
-        },
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "browse_close",
-            "description": "关闭浏览器及 Playwright 实例。",
-            "parameters": {
-                "type": "object",
-                "properties": {},
-                "required": [],
-            },
-        },
-    },
-]
\ No newline at end of file
+TOOLS 列表在第一次调用 get_tools() 时根据同一份配置快照构建一次，之后复用，
+导入本模块不读取配置。
+
+工具分组：每次请求只发送已启用分组的工具，减少每轮固定的输入 token。
+core 组始终启用；其余分组由用户消息的关键词启发式（groups_for_message）
+或模型调用 enable_tools 启用，启用后在该 Bot 的后续请求中保持。
+各分组组合对应的工具列表按组合缓存，同一组合每次请求复用同一个列表对象。
+"""
+
+import re
+
+from config import get_config
+
+TOOL_GROUPS: dict[str, tuple[str, ...]] = {
+    'core': ('system_command', 'edit_file', 'append_file', 'replace_file', 'apply_patch', 'bulk_replace', 'rollback',
+             'read_file', 'search_workspace', 'project_map', 'change_directory', 'ask_user', 'set_wait',
+             'enable_tools', 'finish'),
+    'browser': ('browse_open', 'browse_search', 'browse_read', 'browse_find', 'browse_layout',
+                'browse_extract_tables', 'browse_download', 'browse_upload', 'browse_pdf', 'browse_eval',
+                'browse_wait_for_navigation', 'browse_switch', 'browse_close'),
+    'skill': ('get_skill', 'search_skills'),
+    'jobs': ('job_start', 'job_status', 'job_output', 'job_wait', 'job_kill'),
+    'code': ('find_symbol', 'find_references'),
+    'python': ('python_exec',),
+    'delegate': ('delegate',),
+}
+GROUP_DESCRIPTIONS = {
+    'browser': '网页浏览：打开/搜索/读取网页、点击交互、下载上传文件',
+    'skill': '技能库：检索并加载 skill',
+    'jobs': '后台任务：启动并管理开发服务器、耗时构建等长时间运行的命令',
+    'code': '代码导航：按名称查找符号定义（文件:行范围）与引用位置',
+    'python': '常驻 Python 解释器：变量跨调用保留，用于数据分析、计算与绘图',
+    'delegate': '子任务委派：将相互独立的子任务交给子助手并发执行',
+}
+
+# 用户消息中出现这些模式时自动启用对应分组（宁可多启用，也不要让模型缺少需要的工具）
+_GROUP_PATTERNS = {
+    'browser': re.compile(
+        r'https?://|www\.|网页|网站|网址|浏览器|上网|联网|搜索|百度|谷歌|下载|最新|新闻|天气|股价|汇率|官网|'
+        r'\b(?:browser|website|web ?page|url|google|bing|search|download|online|latest|news)\b',
+        re.IGNORECASE),
+    'skill': re.compile(r'<相关skill>|技能|\bskills?\b', re.IGNORECASE),
+    'jobs': re.compile(
+        r'后台|长时间|服务器|编译|构建|训练|监听|开发服务|'
+        r'\b(?:server|serve|build|compile|train(?:ing)?|watch|daemon|background|dev)\b|npm run|yarn |docker',
+        re.IGNORECASE),
+    'code': re.compile(
+        r'代码|源码|函数|方法|接口|定义|引用|调用|重构|报错|\.(?:py|js|ts|go|rs|java|cpp|c|rb|php)\b|'
+        r'\b(?:code|function|method|class|def|symbol|refactor|bug|traceback|stack ?trace)\b',
+        re.IGNORECASE),
+    'python': re.compile(
+        r'数据|分析|统计|计算|绘图|画图|图表|表格|python|'
+        r'\b(?:pandas|numpy|matplotlib|dataframe|csv|excel|xlsx|plot|chart|analy[sz]e|statistics|jupyter)\b',
+        re.IGNORECASE),
+    'delegate': re.compile(r'分别|并行|同时|各自|逐个|\b(?:parallel|concurrently|each of)\b', re.IGNORECASE),
+}
+
+_tools: list[dict] | None = None
+_subsets: dict[frozenset, list[dict]] = {}
+
+
+def get_tools(groups=None) -> list[dict]:
+    """返回工具定义（首次调用时构建并缓存）。
+
+    groups 为 None 时返回全部工具；否则返回 core 与指定分组的工具（按分组组合缓存）。
+    """
+    global _tools
+    if _tools is None:
+        _tools = _build_tools(get_config())
+    if groups is None:
+        return _tools
+    key = frozenset(groups) | {'core'}
+    subset = _subsets.get(key)
+    if subset is None:
+        names = {name for g in key for name in TOOL_GROUPS.get(g, ())}
+        subset = _subsets[key] = [t for t in _tools if t['function']['name'] in names]
+    return subset
+
+
+def group_of(tool_name: str) -> str | None:
+    """返回工具所属的分组。"""
+    for group, names in TOOL_GROUPS.items():
+        if tool_name in names:
+            return group
+    return None
+
+
+def groups_for_message(text: str) -> set[str]:
+    """根据用户消息的关键词推断需要启用的分组。"""
+    return {group for group, pattern in _GROUP_PATTERNS.items() if pattern.search(text)}
+
+
+def initial_groups(cfg: dict | None = None) -> set[str] | None:
+    """新 Bot 初始启用的分组（配置 tool_groups，默认只有 core）；含 "all" 时返回 None，表示不分组。"""
+    cfg = cfg or get_config()
+    groups = cfg.get('tool_groups') or ['core']
+    if 'all' in groups:
+        return None
+    return set(groups) | {'core'}
+
+
+def select_tools(names) -> list[dict]:
+    """按名称从全部工具中挑选，保持 get_tools() 中的顺序。"""
+    names = set(names)
+    return [t for t in get_tools() if t['function']['name'] in names]
+
+
+def _build_tools(cfg: dict) -> list[dict]:
+    encoding = cfg['encoding']
+    return [
+        {
+            "type": "function",
+            "function": {
+                "name": "system_command",
+                "description": "在用户的终端执行命令。",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "command": {"type": "string", "description": "要执行的终端命令"},
+                        "inputs": {
+                            "type": ["string", "array"],
+                            "items": {"type": "string"},
+                            "description": "可选。如果命令需要交互式输入（如确认、输入参数），在此提供。若是列表则按顺序输入。"
+                        }
+                    },
+                    "required": ["command"],
+                },
+            },
+        },
+        {
+            "type": "function",
+            "function": {
+                "name": "job_start",
+                "description": (
+                    "在后台启动长时间运行的命令（开发服务器、耗时构建、训练脚本等），立即返回任务编号，不受超时限制。"
+                    "输出写入磁盘，之后用 job_output 增量读取、job_wait 等待、job_kill 终止。短命令请用 system_command。"
+                ),
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "command": {"type": "string", "description": "要在当前工作目录执行的终端命令"},
+                    },
+                    "required": ["command"],
+                },
+            },
+        },
+        {
+            "type": "function",
+            "function": {
+                "name": "job_status",
+                "description": "查看后台任务的状态（运行时长、输出大小；已结束的任务含退出码与资源占用）。",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "job_id": {"type": "string", "description": "可选。任务编号，缺省列出全部任务"},
+                    },
+                    "required": [],
+                },
+            },
+        },
+        {
+            "type": "function",
+            "function": {
+                "name": "job_output",
+                "description": "从字节偏移 offset 起读取后台任务的输出（stdout 与 stderr 合并），结果中给出下次读取的 offset。",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "job_id": {"type": "string", "description": "任务编号"},
+                        "offset": {"type": "integer", "description": "起始字节偏移，默认 0；负数表示从末尾倒数（如 -2000 读取最后约 2000 字节）", "default": 0},
+                        "max_chars": {"type": "integer", "description": "最多返回的字符数", "default": 4000},
+                    },
+                    "required": ["job_id"],
+                },
+            },
+        },
+        {
+            "type": "function",
+            "function": {
+                "name": "job_wait",
+                "description": "等待后台任务结束，最多等待 timeout 秒，返回任务状态。",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "job_id": {"type": "string", "description": "任务编号"},
+                        "timeout": {"type": "number", "description": "最长等待秒数", "default": 30},
+                    },
+                    "required": ["job_id"],
+                },
+            },
+        },
+        {
+            "type": "function",
+            "function": {
+                "name": "job_kill",
+                "description": "终止后台任务（先 SIGTERM，数秒后仍未退出则强制结束整个进程组）。",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "job_id": {"type": "string", "description": "任务编号"},
+                    },
+                    "required": ["job_id"],
+                },
+            },
+        },
+        {
+            "type": "function",
+            "function": {
+                "name": "python_exec",
+                "description": (
+                    "在常驻的 Python 解释器中执行代码，变量与已导入的模块在多次调用之间保留（类似 Jupyter）。"
+                    "适合迭代式的数据分析：数据只需加载一次，之后每步只执行新的代码，无需写脚本再用 system_command 运行。"
+                    "返回捕获的输出（print、警告、报错）及最后一个表达式的值。绘图请用 savefig 保存为文件。"
+                    "超时后会中断当前代码（变量保留）。"
+                ),
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "code": {"type": "string", "description": "要执行的 Python 代码"},
+                        "timeout": {"type": "number", "description": "超时秒数，默认与 system_command 相同"},
+                        "reset": {"type": "boolean", "description": "为 true 时先重启解释器并清空所有变量", "default": False},
+                    },
+                    "required": ["code"],
+                },
+            },
+        },
+        {
+            "type": "function",
+            "function": {
+                "name": "edit_file",
+                "description": "用新内容整体覆盖写入指定文件（创建或覆盖）。将文件完整内容作为 content 参数传入。",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "file_path": {"type": "string", "description": "文件的绝对路径（含扩展名）"},
+                        "content": {"type": "string", "description": "写入文件的完整内容"},
+                        "encoding": {"type": "string", "description": "文件编码", "default": encoding},
+                    },
+                    "required": ["file_path", "content"],
+                },
+            },
+        },
+        {
+            "type": "function",
+            "function": {
+                "name": "append_file",
+                "description": "将内容追加到指定文件末尾（文件不存在时创建）。生成很大的文件时，可先用 edit_file 写入第一段，再分多次用 append_file 追加后续内容。",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "file_path": {"type": "string", "description": "文件的绝对路径（含扩展名）"},
+                        "content": {"type": "string", "description": "追加到文件末尾的内容"},
+                        "encoding": {"type": "string", "description": "文件编码", "default": encoding},
+                    },
+                    "required": ["file_path", "content"],
+                },
+            },
+        },
+        {
+            "type": "function",
+            "function": {
+                "name": "replace_file",
+                "description": "对文件的部分内容进行精确替换。将要被替换的旧文本和替换后的新文本分别作为参数传入。旧文本必须与文件中的内容完全一致。",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "file_path": {"type": "string", "description": "文件的绝对路径（含扩展名）"},
+                        "old_text": {"type": "string", "description": "文件中要被替换的原始文本，必须与文件内容完全一致"},
+                        "new_text": {"type": "string", "description": "替换后的新文本"},
+                        "encoding": {"type": "string", "description": "文件编码", "default": encoding},
+                    },
+                    "required": ["file_path", "old_text", "new_text"],
+                },
+            },
+        },
+        {
+            "type": "function",
+            "function": {
+                "name": "apply_patch",
+                "description": (
+                    "一次性对一个或多个文件应用多处修改，全部修改校验通过后原子写入（任一处失败则不修改任何文件）。"
+                    "可传入统一 diff（patch），或 old_text/new_text 替换列表（edits）。"
+                    "修改多处或多个文件时优先使用本工具，而不是多次调用 replace_file。"
+                ),
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "patch": {
+                            "type": "string",
+                            "description": "统一 diff 格式的补丁（含 ---/+++ 文件头与 @@ 块），路径可为相对当前目录的路径或绝对路径",
+                        },
+                        "edits": {
+                            "type": "array",
+                            "description": "替换列表，每项的 old_text 必须在文件中唯一出现",
+                            "items": {
+                                "type": "object",
+                                "properties": {
+                                    "file_path": {"type": "string", "description": "文件路径"},
+                                    "old_text": {"type": "string", "description": "要被替换的原始文本"},
+                                    "new_text": {"type": "string", "description": "替换后的新文本"},
+                                },
+                                "required": ["file_path", "old_text", "new_text"],
+                            },
+                        },
+                        "encoding": {"type": "string", "description": "文件编码", "default": encoding},
+                    },
+                    "required": [],
+                },
+            },
+        },
+        {
+            "type": "function",
+            "function": {
+                "name": "bulk_replace",
+                "description": (
+                    "在匹配 glob 的所有文件中进行正则查找替换（遵循 .gitignore，跳过二进制文件），多进程并行处理，每个文件原子写入。"
+                    "建议先以 dry_run=true 预览匹配数与示例 diff，确认无误后再实际替换。"
+                ),
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "glob": {
+                            "type": "string",
+                            "description": "文件通配符，相对当前目录或绝对路径，支持 **（如 src/**/*.py）；不含 / 时匹配任意层级的文件名（如 *.py）",
+                        },
+                        "pattern": {"type": "string", "description": "Python 正则表达式"},
+                        "replacement": {"type": "string", "description": "替换文本，可用 \\1、\\g<name> 引用分组", "default": ""},
+                        "dry_run": {"type": "boolean", "description": "为 true 时只预览，不修改文件", "default": False},
+                        "ignore_case": {"type": "boolean", "description": "忽略大小写", "default": False},
+                        "multiline": {"type": "boolean", "description": "^ 与 $ 匹配每一行的行首行尾", "default": False},
+                        "encoding": {"type": "string", "description": "文件编码", "default": encoding},
+                    },
+                    "required": ["glob", "pattern"],
+                },
+            },
+        },
+        {
+            "type": "function",
+            "function": {
+                "name": "rollback",
+                "description": (
+                    "撤销最近几次由 edit_file / replace_file / apply_patch / bulk_replace 做出的文件修改，"
+                    "将文件恢复到修改前的内容（新建的文件会被删除）。终端命令对文件的修改不在此列。"
+                ),
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "steps": {"type": "integer", "description": "撤销的次数，默认 1；为 0 时只列出可撤销的修改", "default": 1},
+                    },
+                    "required": [],
+                },
+            },
+        },
+        {
+            "type": "function",
+            "function": {
+                "name": "read_file",
+                "description": (
+                    "读取并返回指定文件的完整内容。指定 start_line / end_line 时只返回该行范围"
+                    "（每次最多 1000 行、100 KB，不受文件大小限制），可配合 find_symbol 返回的行号使用。"
+                ),
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "file_path": {"type": "string", "description": "文件的绝对路径（含扩展名）"},
+                        "encoding": {"type": "string", "description": "文件编码", "default": encoding},
+                        "start_line": {"type": "integer", "description": "可选。起始行号（从 1 开始，含）"},
+                        "end_line": {"type": "integer", "description": "可选。结束行号（含），默认读取 1000 行"},
+                    },
+                    "required": ["file_path"],
+                },
+            },
+        },
+        {
+            "type": "function",
+            "function": {
+                "name": "search_workspace",
+                "description": (
+                    "在工作目录中全文搜索文本（基于持久化索引，比 grep/findstr 快得多，遵循 .gitignore）。"
+                    "返回按相关度排序的文件及匹配行（含行号与上下文）。"
+                ),
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "query": {"type": "string", "description": "要搜索的文本（默认按字面匹配）"},
+                        "path": {"type": "string", "description": "可选。只在该目录下搜索，默认为工作目录"},
+                        "regex": {"type": "boolean", "description": "是否将 query 作为正则表达式，默认 false", "default": False},
+                        "case_sensitive": {"type": "boolean", "description": "是否区分大小写，默认 false", "default": False},
+                        "max_results": {"type": "integer", "description": "最多返回的文件数，默认 20", "default": 20},
+                        "context": {"type": "integer", "description": "每个匹配行前后显示的上下文行数，默认 1", "default": 1},
+                    },
+                    "required": ["query"],
+                },
+            },
+        },
+        {
+            "type": "function",
+            "function": {
+                "name": "find_symbol",
+                "description": (
+                    "按名称查找代码符号（类、函数、方法、类型、模块级变量）的定义，返回 文件:起始行-结束行 及首行签名。"
+                    "支持 Python 及常见语言；可用 Class.method 限定所属类。"
+                    "定位后用 read_file 的 start_line / end_line 只读取该段，不必读取整个文件。"
+                ),
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "name": {"type": "string", "description": "符号名，如 run_turn 或 Bot.message"},
+                        "path": {"type": "string", "description": "可选。只在该目录下查找，默认为工作目录"},
+                        "kind": {"type": "string", "description": "可选。只返回该类型: class / function / method / type / variable 等"},
+                        "max_results": {"type": "integer", "description": "最多返回的定义数，默认 20", "default": 20},
+                    },
+                    "required": ["name"],
+                },
+            },
+        },
+        {
+            "type": "function",
+            "function": {
+                "name": "find_references",
+                "description": "查找名称（按完整单词匹配）在代码中出现的所有位置，返回 文件:行号 及该行内容，定义处标注 [定义]。",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "name": {"type": "string", "description": "要查找的名称"},
+                        "path": {"type": "string", "description": "可选。只在该目录下查找，默认为工作目录"},
+                        "max_results": {"type": "integer", "description": "最多返回的位置数，默认 50", "default": 50},
+                    },
+                    "required": ["name"],
+                },
+            },
+        },
+        {
+            "type": "function",
+            "function": {
+                "name": "project_map",
+                "description": (
+                    "概览目录结构：各子目录的文件数、大小与主要语言，被忽略的目录（.git、node_modules 等）折叠显示。"
+                    "目录树有缓存，重复调用很快。接手陌生项目时先用它了解结构，再用 path 下钻到感兴趣的子目录。"
+                ),
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "path": {"type": "string", "description": "可选。要概览的目录，默认为当前工作目录"},
+                        "depth": {"type": "integer", "description": "展开的目录层数，默认 2，最大 6", "default": 2},
+                        "max_entries": {"type": "integer", "description": "每个目录最多列出的条目数，默认 15", "default": 15},
+                    },
+                },
+            },
+        },
+        {
+            "type": "function",
+            "function": {
+                "name": "change_directory",
+                "description": "切换当前工作目录（支持相对路径或绝对路径）。",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "path": {"type": "string", "description": "目标目录路径"},
+                    },
+                    "required": ["path"],
+                },
+            },
+        },
+        {
+            "type": "function",
+            "function": {
+                "name": "ask_user",
+                "description": "在有问题时向用户提问，等待用户回复后继续。",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "question": {"type": "string", "description": "向用户提出的问题"},
+                    },
+                    "required": ["question"],
+                },
+            },
+        },
+        {
+            "type": "function",
+            "function": {
+                "name": "set_wait",
+                "description": "设置操作的最大超时时长（秒）。默认为 10 秒。",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "seconds": {"type": "integer", "description": "超时时长（秒）"},
+                    },
+                    "required": ["seconds"],
+                },
+            },
+        },
+        {
+            "type": "function",
+            "function": {
+                "name": "get_skill",
+                "description": (
+                    "在需要时加载 Agent Skills 标准格式的skill文件（SKILL.md）或skill内的脚本/资源文件。"
+                    "skill目录结构: <name>/SKILL.md、scripts/（可执行脚本）、"
+                    "references/（参考文档）、assets/（模板及二进制资源）。"
+                    "需要执行脚本或读取额外文档时，用 resource='scripts/xxx.py' 等再次调用。"
+                ),
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "skill_name": {
+                            "type": "string",
+                            "description": "skill目录名称",
+                        },
+                        "resource": {
+                            "type": "string",
+                            "description": (
+                                "可选。skill目录内的相对路径。"
+                            ),
+                        },
+                    },
+                    "required": ["skill_name"],
+                },
+            },
+        },
+        {
+            "type": "function",
+            "function": {
+                "name": "search_skills",
+                "description": (
+                    "按关键词在技能库中检索skill，返回最相关的skill名称与描述。"
+                    "每条用户消息后附带的 <相关skill> 只包含少数几个，需要其他skill时用本工具检索，再用 get_skill 加载。"
+                ),
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "query": {"type": "string", "description": "检索关键词（中英文均可）；为空时按名称列出skill"},
+                        "top_k": {"type": "integer", "description": "最多返回的skill数", "default": 10},
+                    },
+                    "required": ["query"],
+                },
+            },
+        },
+        {
+            "type": "function",
+            "function": {
+                "name": "delegate",
+                "description": (
+                    "将相互独立的子任务派给子助手并发执行（如分别查询多个城市的数据）。"
+                    "每个子助手拥有独立的对话历史、工作目录副本与浏览器页面，不能向用户提问，"
+                    "完成后只返回简短的结果摘要。子任务之间有依赖、或需要与用户确认时不要使用。"
+                ),
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "tasks": {
+                            "type": "array",
+                            "description": "子任务列表，每项是一个可独立完成、描述完整的子任务",
+                            "items": {
+                                "type": "object",
+                                "properties": {
+                                    "task": {"type": "string", "description": "子任务描述，需包含完成所需的全部上下文及期望的输出"},
+                                    "tools": {
+                                        "type": "array",
+                                        "items": {"type": "string"},
+                                        "description": "可选。子助手可用的工具名列表，缺省为除 delegate、ask_user、enable_tools 外的全部工具",
+                                    },
+                                },
+                                "required": ["task"],
+                            },
+                        },
+                    },
+                    "required": ["tasks"],
+                },
+            },
+        },
+        {
+            "type": "function",
+            "function": {
+                "name": "enable_tools",
+                "description": (
+                    "启用更多的工具分组。当前请求只包含部分工具，需要下列分组中的工具时先调用本工具启用: "
+                    + "；".join(f"{name}（{desc}）" for name, desc in GROUP_DESCRIPTIONS.items())
+                ),
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "groups": {
+                            "type": "array",
+                            "items": {"type": "string", "enum": list(GROUP_DESCRIPTIONS)},
+                            "description": "要启用的分组名",
+                        },
+                    },
+                    "required": ["groups"],
+                },
+            },
+        },
+        {
+            "type": "function",
+            "function": {
+                "name": "finish",
+                "description": "完成所有工作，向用户交付成果并结束自动执行阶段。",
+                "parameters": {
+                    "type": "object",
+                    "properties": {},
+                    "required": [],
+                },
+            },
+        },
+        # ── 浏览器指令 ────────────────────────────────────────────────────────
+        {
+            "type": "function",
+            "function": {
+                "name": "browse_open",
+                "description": "打开指定网页。静态页面直接通过 HTTP 获取，依赖 JavaScript 的页面自动使用 Chromium 浏览器打开。",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "url": {"type": "string", "description": "要打开的完整 URL"},
+                        "max_age": {
+                            "type": "integer",
+                            "description": "可选。缓存有效期（秒），在此时间内抓取过的页面直接使用缓存；传 0 强制重新获取最新内容",
+                        },
+                    },
+                    "required": ["url"],
+                },
+            },
+        },
+        {
+            "type": "function",
+            "function": {
+                "name": "browse_search",
+                "description": "使用搜索引擎搜索关键词，直接跳转到搜索结果页。支持 google、bing、baidu、duckduckgo，默认 google。",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "query": {"type": "string", "description": "搜索关键词"},
+                        "engine": {
+                            "type": "string",
+                            "enum": ["google", "bing", "baidu", "duckduckgo"],
+                            "description": "搜索引擎，默认 google",
+                            "default": "google",
+                        },
+                    },
+                    "required": ["query"],
+                },
+            },
+        },
+        {
+            "type": "function",
+            "function": {
+                "name": "browse_read",
+                "description": "读取当前浏览器页面的文字内容及可交互元素列表。建议在每次浏览器操作后调用以确认结果。",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "max_chars": {
+                            "type": "integer",
+                            "description": "返回内容的最大字符数，默认 4000",
+                            "default": 4000,
+                        },
+                    },
+                    "required": [],
+                },
+            },
+        },
+        {
+            "type": "function",
+            "function": {
+                "name": "browse_find",
+                "description": "在当前页面中搜索包含指定文字的可见元素，返回匹配元素的选择器和文字片段。",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "text": {"type": "string", "description": "要搜索的文字"},
+                        "max_results": {
+                            "type": "integer",
+                            "description": "最多返回的结果数，默认 10",
+                            "default": 10,
+                        },
+                    },
+                    "required": ["text"],
+                },
+            },
+        },
+        {
+            "type": "function",
+            "function": {
+                "name": "browse_layout",
+                "description": (
+                    "返回当前页面可见区块的布局摘要：每行一个区块，包含角色、包围盒 (x,y 宽×高)、选择器和截断文字，"
+                    "按层级缩进。用于了解页面结构或定位区域，比 browse_read 返回的内容少得多。"
+                    "可配合 region 只查看页面的某个区域。"
+                ),
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "region": {
+                            "type": "array",
+                            "items": {"type": "integer"},
+                            "description": "可选。只返回与该区域相交的区块，格式为 [x, y, width, height]（页面坐标）",
+                        },
+                        "viewport_only": {
+                            "type": "boolean",
+                            "description": "未指定 region 时是否只返回当前视口内的区块，默认 true；false 时返回整页",
+                            "default": True,
+                        },
+                        "max_blocks": {
+                            "type": "integer",
+                            "description": "最多返回的区块数，默认 60",
+                            "default": 60,
+                        },
+                    },
+                    "required": [],
+                },
+            },
+        },
+        {
+            "type": "function",
+            "function": {
+                "name": "browse_extract_tables",
+                "description": (
+                    "提取当前页面中的表格（<table> 及 role=table/grid 的表格），展开合并单元格、规范化表头与数字"
+                    "（去千位分隔符、货币符号、脚注标记），直接写入 CSV / JSON 文件，只返回各表格的行列数与几行样例。"
+                    "收集网页表格数据时优先使用，不要通过 browse_read 阅读后手动抄写。"
+                ),
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "save_dir": {"type": "string", "description": "保存目录，默认为工作目录"},
+                        "name": {"type": "string", "description": "可选。文件名（不含扩展名），多个表格时自动加序号，默认取页面标题"},
+                        "format": {
+                            "type": "string",
+                            "enum": ["csv", "json", "both"],
+                            "description": "输出格式，默认 csv",
+                            "default": "csv",
+                        },
+                        "tables": {
+                            "type": "array",
+                            "items": {"type": "integer"},
+                            "description": "可选。只保存这些序号（从 1 开始）的表格，默认保存全部",
+                        },
+                        "sample_rows": {"type": "integer", "description": "每个表格返回的样例行数，默认 3", "default": 3},
+                    },
+                    "required": [],
+                },
+            },
+        },
+        {
+            "type": "function",
+            "function": {
+                "name": "browse_download",
+                "description": (
+                    "下载文件（携带浏览器登录态 Cookie），保存到工作目录或指定目录。"
+                    "大文件流式写入磁盘，中断后再次下载同一 URL 会自动续传；可一次并发下载多个 URL。"
+                ),
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "url": {"type": "string", "description": "文件下载 URL"},
+                        "urls": {
+                            "type": "array",
+                            "items": {"type": "string"},
+                            "description": "可选。需要并发下载的多个 URL，提供时忽略 url",
+                        },
+                        "save_dir": {
+                            "type": "string",
+                            "description": "保存目录，默认为工作目录",
+                        },
+                        "checksum": {
+                            "type": "string",
+                            "description": "可选。单个文件的哈希校验值，格式为 'sha256:<hex>' 或 'md5:<hex>'，也可直接传 sha256 值",
+                        },
+                    },
+                    "required": [],
+                },
+            },
+        },
+        {
+            "type": "function",
+            "function": {
+                "name": "browse_upload",
+                "description": "向页面的文件输入框上传本地文件。",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "selector": {"type": "string", "description": "文件输入框的 CSS 选择器"},
+                        "file_path": {"type": "string", "description": "本地文件的绝对路径"},
+                    },
+                    "required": ["selector", "file_path"],
+                },
+            },
+        },
+        {
+            "type": "function",
+            "function": {
+                "name": "browse_pdf",
+                "description": "将当前浏览器页面导出为 PDF 文件。",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "save_dir": {
+                            "type": "string",
+                            "description": "PDF 保存目录，默认为工作目录",
+                        },
+                    },
+                    "required": [],
+                },
+            },
+        },
+        {
+            "type": "function",
+            "function": {
+                "name": "browse_eval",
+                "description": "在当前浏览器页面中执行 JavaScript 表达式，返回执行结果。",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "script": {"type": "string", "description": "要执行的 JavaScript 表达式"},
+                    },
+                    "required": ["script"],
+                },
+            },
+        },
+        {
+            "type": "function",
+            "function": {
+                "name": "browse_wait_for_navigation",
+                "description": "等待当前页面导航完成（例如点击链接、提交表单或执行了可能跳转的 JavaScript 后）。\n建议在调用可能触发页面跳转的 browse_eval 之后调用此工具，以确保新页面完全加载后再进行读取或其他操作。",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "timeout": {
+                            "type": "integer",
+                            "description": "最大等待时间（秒）",
+                            "default": get_config()['wait'],
+                        },
+                        "state": {
+                            "type": "string",
+                            "enum": ["load", "domcontentloaded", "networkidle"],
+                            "description": "等待的加载状态，'load' 等待 load 事件，'domcontentloaded' 等待 DOM 解析完成，'networkidle' 等待网络空闲",
+                            "default": "networkidle"
+                        }
+                    },
+                    "required": []
+                },
+            },
+        },
+        {
+            "type": "function",
+            "function": {
+                "name": "browse_switch",
+                "description": "切换到指定编号的标签页。标签页编号可在 browse_read 返回的标签页列表中查看。",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "index": {"type": "integer", "description": "目标标签页的编号"},
+                    },
+                    "required": ["index"],
+                },
+            },
+        },
+        {
+            "type": "function",
+            "function": {
+                "name": "browse_close",
+                "description": "关闭浏览器及 Playwright 实例。",
+                "parameters": {
+                    "type": "object",
+                    "properties": {},
+                    "required": [],
+                },
+            },
+        },
+    ]
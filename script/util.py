@@ -16,6 +16,8 @@ SLASH_HELP = (
     "  /usage          — 显示当前 token 用量\n"
     "  /config         — 显示 config.json 配置\n"
     "  /working_config — 显示 working_config 配置\n"
+    "  /undo [n]       — 撤销最近 n 次（默认 1）文件修改\n"
+    "  /checkpoints    — 列出可撤销的文件修改\n"
     "  /skill_name     — 加载并执行指定skill\n"
     "  /help           — 显示帮助\n"
 )
@@ -74,6 +76,17 @@ def handle_slash(cmd: str, input_tokens: int, output_tokens: int,
             print(f'读取 working_config 失败: {e}\n')
         return True, None
 
+    m = re.fullmatch(r'/undo(?:\s+(\d+))?', cmd)
+    if m:
+        from script.checkpoint import rollback
+        print(rollback(int(m.group(1) or 1)), end='\n\n')
+        return True, None
+
+    if cmd == '/checkpoints':
+        from script.checkpoint import list_checkpoints
+        print(list_checkpoints(), end='\n\n')
+        return True, None
+
     if cmd == '/help':
         print(SLASH_HELP)
         return True, None
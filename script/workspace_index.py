@@ -0,0 +1,410 @@
+"""
+workspace_index.py —— 工作区全文检索索引（search_workspace 工具的后端）。
+
+索引结构：
+    每个文件保存一个三元组（trigram）签名：文件内容（小写）的所有 3 字符子串经 crc32
+    散列到一个位图中（位数随文件规模取 2 的幂）。查询时先用查询串的三元组位图过滤候选文件，
+    再只读取候选文件逐行确认并返回带上下文的匹配行。
+    相比逐词倒排表，签名位图的内存与磁盘占用与文件数线性相关且很小，
+    单次过滤对 10 万文件也只是若干毫秒的整数运算；增量更新只需替换单个文件的签名。
+
+生命周期：
+    - 首次查询时在后台线程构建索引，构建期间的查询使用已完成的部分并提示结果可能不完整；
+    - 索引持久化到 cache/index/，下次启动按 mtime / size 增量更新；
+    - 查询时若距上次刷新超过 REFRESH_INTERVAL 秒，先增量刷新（按 mtime / size 只重算变化的文件）
+      再检索，使工具之外修改的文件也能被检索到；刷新在 wait 秒内未完成时照常检索并提示结果可能不完整；
+    - 工具写入文件后调用 notify_changed() 立即更新对应文件的签名。
+"""
+
+from __future__ import annotations
+
+import hashlib
+import math
+import os
+import pickle
+import re
+import threading
+import time
+import zlib
+
+from script.ignore import walk_files
+from script.logger import log
+
+_BASE = os.path.dirname(os.path.abspath(__file__))
+_INDEX_DIR = os.path.join(_BASE, '..', 'cache', 'index')
+_VERSION = 1
+
+MAX_FILE_BYTES = 1024 * 1024
+MAX_FILES = 200_000
+REFRESH_INTERVAL = 10.0
+_MIN_BITS = 256
+_MAX_BITS = 1 << 16
+
+
+def _cfg() -> dict:
+    try:
+        from config import get_config
+        return get_config()
+    except Exception:
+        return {}
+
+
+# ── 三元组签名 ────────────────────────────────────────────────────────────
+
+def _trigrams(text: str) -> set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _bits_for(count: int) -> int:
+    bits = _MIN_BITS
+    while bits < count * 2 and bits < _MAX_BITS:
+        bits <<= 1
+    return bits
+
+
+def _mask(trigrams, bits: int) -> int:
+    buf = bytearray(bits // 8)
+    for tri in trigrams:
+        h = zlib.crc32(tri.encode('utf-8')) & (bits - 1)
+        buf[h >> 3] |= 1 << (h & 7)
+    return int.from_bytes(buf, 'little')
+
+
+def _signature(text: str) -> tuple[int, int]:
+    tris = _trigrams(text.lower())
+    bits = _bits_for(len(tris))
+    return bits, _mask(tris, bits)
+
+
+def _regex_literals(pattern: str) -> list[str]:
+    """从正则中提取必然出现的字面量片段，用于预筛候选文件。
+
+    只保留顶层、后面不跟 ? / * / { 量词的连续普通字符：分组内的内容（可能被整体量化或分支）、
+    被量词修饰的片段一律丢弃。含顶层 | 或 verbose 标志时无法保证，返回空列表（不过滤）。
+    """
+    if re.match(r'\(\?[a-zA-Z]*x', pattern):
+        return []
+    literals, buf = [], []
+    depth, i, n = 0, 0, len(pattern)
+
+    def flush():
+        if depth == 0 and len(buf) >= 3:
+            literals.append(''.join(buf))
+        buf.clear()
+
+    while i < n:
+        c = pattern[i]
+        if c == '\\':
+            flush()
+            i += 2
+            continue
+        if c == '[':
+            flush()
+            # 跳过字符类（首个 ] 与转义的 ] 属于类内）
+            j = i + 1
+            if j < n and pattern[j] == '^':
+                j += 1
+            if j < n and pattern[j] == ']':
+                j += 1
+            while j < n and pattern[j] != ']':
+                j += 2 if pattern[j] == '\\' else 1
+            i = j + 1
+            continue
+        if c == '{':
+            buf.clear()          # {m,n} 可能为 0 次，连同量词内容一起跳过
+            close = pattern.find('}', i)
+            i = n if close < 0 else close + 1
+            continue
+        if c in '?*':
+            buf.clear()          # 被量词修饰的字面量不一定出现
+        elif c == '+':
+            flush()              # 前一个字符至少出现一次，但之后不再连续
+        elif c == '(':
+            flush()
+            depth += 1
+        elif c == ')':
+            buf.clear()
+            depth = max(depth - 1, 0)
+        elif c == '|':
+            if depth == 0:
+                return []
+            buf.clear()
+        elif c in '.^$':
+            flush()
+        else:
+            buf.append(c)
+        i += 1
+    flush()
+    return literals
+
+
+def _read_text(path: str, encoding: str) -> str | None:
+    """读取文本文件；二进制文件（前 8KB 含 NUL）返回 None。"""
+    try:
+        with open(path, 'rb') as f:
+            data = f.read(MAX_FILE_BYTES + 1)
+    except OSError:
+        return None
+    if len(data) > MAX_FILE_BYTES or b'\0' in data[:8192]:
+        return None
+    return data.decode(encoding, errors='replace')
+
+
+# ── 索引 ─────────────────────────────────────────────────────────────────
+
+class WorkspaceIndex:
+    """单个根目录的三元组签名索引。"""
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+        self.encoding = _cfg().get('encoding', 'utf-8')
+        # {相对路径: (mtime_ns, size, bits, signature)}，signature 为 0 表示二进制/过大文件
+        self.files: dict[str, tuple[int, int, int, int]] = {}
+        self.ready = threading.Event()
+        self.building = False
+        self.last_refresh = 0.0
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._path = os.path.join(
+            _INDEX_DIR, hashlib.sha1(self.root.encode('utf-8')).hexdigest() + '.pkl'
+        )
+        self._load()
+
+    # ── 持久化 ──
+    def _load(self):
+        try:
+            with open(self._path, 'rb') as f:
+                data = pickle.load(f)
+            if data.get('version') == _VERSION and data.get('root') == self.root:
+                self.files = data['files']
+                self.ready.set()
+                log(f'workspace_index | loaded {len(self.files)} files for {self.root}')
+        except (OSError, pickle.UnpicklingError, EOFError, KeyError, AttributeError):
+            pass
+
+    def _save(self):
+        os.makedirs(_INDEX_DIR, exist_ok=True)
+        with self._lock:
+            data = {'version': _VERSION, 'root': self.root, 'files': dict(self.files)}
+        tmp = f'{self._path}.{threading.get_ident()}.tmp'
+        with open(tmp, 'wb') as f:
+            pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, self._path)
+
+    # ── 构建与增量刷新 ──
+    def _index_file(self, rel: str, mtime_ns: int, size: int):
+        text = _read_text(os.path.join(self.root, rel), self.encoding)
+        bits, sig = _signature(text) if text is not None else (0, 0)
+        with self._lock:
+            self.files[rel] = (mtime_ns, size, bits, sig)
+
+    def refresh(self):
+        """遍历根目录，按 mtime / size 增量更新签名，移除已删除文件。"""
+        if not self._refresh_lock.acquire(blocking=False):
+            return
+        self.building = True
+        started = time.time()
+        try:
+            seen = set()
+            changed = 0
+            for rel, entry in walk_files(self.root, MAX_FILES):
+                seen.add(rel)
+                try:
+                    st = entry.stat(follow_symlinks=False)
+                except OSError:
+                    continue
+                old = self.files.get(rel)
+                if old is None or old[0] != st.st_mtime_ns or old[1] != st.st_size:
+                    self._index_file(rel, st.st_mtime_ns, st.st_size)
+                    changed += 1
+            with self._lock:
+                removed = [rel for rel in self.files if rel not in seen]
+                for rel in removed:
+                    del self.files[rel]
+            self.last_refresh = time.time()
+            self.building = False
+            self.ready.set()
+            if changed or removed:
+                self._save()
+            log(f'workspace_index | refresh {self.root}: {len(seen)} files, '
+                f'{changed} changed, {len(removed)} removed ({time.time() - started:.2f}s)')
+        except Exception as e:
+            log(f'workspace_index | refresh error: {e}')
+        finally:
+            self.building = False
+            self._refresh_lock.release()
+
+    def refresh_async(self) -> threading.Thread:
+        thread = threading.Thread(target=self.refresh, daemon=True, name='momoka-index')
+        thread.start()
+        return thread
+
+    def update_file(self, abs_path: str):
+        """单个文件被修改后立即更新其签名。"""
+        rel = os.path.relpath(abs_path, self.root).replace(os.sep, '/')
+        try:
+            st = os.stat(abs_path)
+        except OSError:
+            with self._lock:
+                self.files.pop(rel, None)
+            return
+        self._index_file(rel, st.st_mtime_ns, st.st_size)
+
+    # ── 查询 ──
+    def candidates(self, literals: list[str], prefix: str = '') -> list[str]:
+        """返回签名包含所有字面量三元组的文件（相对路径）。"""
+        tris = set()
+        for lit in literals:
+            tris |= _trigrams(lit.lower())
+        masks: dict[int, int] = {}
+        with self._lock:
+            items = list(self.files.items())
+        out = []
+        for rel, (_, _, bits, sig) in items:
+            if not bits or (prefix and not rel.startswith(prefix)):
+                continue
+            if tris:
+                m = masks.get(bits)
+                if m is None:
+                    m = masks[bits] = _mask(tris, bits)
+                if sig & m != m:
+                    continue
+            out.append(rel)
+        return out
+
+    def search(self, query: str, regex: bool = False, case_sensitive: bool = False,
+               prefix: str = '', max_results: int = 20, max_lines: int = 5,
+               context: int = 1) -> tuple[list[dict], int]:
+        """检索并返回 (按相关度排序的文件结果, 匹配文件总数)。"""
+        flags = 0 if case_sensitive else re.IGNORECASE
+        pattern = re.compile(query if regex else re.escape(query), flags)
+        literals = _regex_literals(query) if regex else ([query] if len(query) >= 3 else [])
+
+        results = []
+        for rel in self.candidates(literals, prefix):
+            text = _read_text(os.path.join(self.root, rel), self.encoding)
+            if text is None:
+                continue
+            lines = text.splitlines()
+            hit_lines = [i for i, line in enumerate(lines) if pattern.search(line)]
+            if not hit_lines:
+                continue
+            name_hit = bool(pattern.search(os.path.basename(rel)))
+            score = math.log1p(len(hit_lines)) + (3 if name_hit else 0) - rel.count('/') * 0.05
+            snippets = []
+            for i in hit_lines[:max_lines]:
+                lo, hi = max(0, i - context), min(len(lines), i + context + 1)
+                snippets.append([(j + 1, lines[j], j == i) for j in range(lo, hi)])
+            results.append({'path': rel, 'hits': len(hit_lines), 'score': score, 'snippets': snippets})
+        results.sort(key=lambda r: (-r['score'], r['path']))
+        return results[:max_results], len(results)
+
+
+# ── 模块级注册表 ──────────────────────────────────────────────────────────
+
+_indexes: dict[str, WorkspaceIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_index(root: str) -> WorkspaceIndex:
+    """获取（必要时创建并在后台构建）root 的索引。"""
+    root = os.path.abspath(root)
+    with _indexes_lock:
+        idx = _indexes.get(root)
+        if idx is None:
+            idx = _indexes[root] = WorkspaceIndex(root)
+            idx.refresh_async()
+    return idx
+
+
+_listeners: list = []
+_change_count = 0
+
+
+def add_change_listener(func):
+    """注册文件变更回调 func(abs_path)，notify_changed 时调用（供其他按文件增量更新的索引使用）。"""
+    _listeners.append(func)
+
+
+def change_count() -> int:
+    """进程启动以来 notify_changed 被调用的次数（供晚于首次写入才导入的模块判断工作区是否已变化）。"""
+    return _change_count
+
+
+def notify_changed(path: str):
+    """文件被工具写入后调用，更新包含该文件的已加载索引。"""
+    global _change_count
+    _change_count += 1
+    abs_path = os.path.abspath(path)
+    with _indexes_lock:
+        targets = [idx for root, idx in _indexes.items()
+                   if abs_path.startswith(root + os.sep)]
+    for idx in targets:
+        try:
+            idx.update_file(abs_path)
+        except Exception as e:
+            log(f'workspace_index | update error {abs_path}: {e}')
+    for func in _listeners:
+        try:
+            func(abs_path)
+        except Exception as e:
+            log(f'workspace_index | listener error {abs_path}: {e}')
+
+
+def resolve_root(path: str | None) -> tuple[str, str, str]:
+    """解析检索范围，返回 (目标目录, 索引根目录, 相对前缀)。
+
+    相对路径相对于当前工作目录（get_cwd）解析。
+    work_dir 内的目录复用 work_dir 的索引，只按前缀过滤；其他目录以自身为根。
+    """
+    from script.system import get_cwd
+    work_dir = os.path.abspath(_cfg().get('work_dir', '.'))
+    target = os.path.abspath(os.path.join(get_cwd(), path)) if path else work_dir
+    if target == work_dir or target.startswith(work_dir + os.sep):
+        prefix = os.path.relpath(target, work_dir).replace(os.sep, '/')
+        return target, work_dir, '' if prefix == '.' else prefix + '/'
+    return target, target, ''
+
+
+def search_workspace(query: str, path: str | None = None, regex: bool = False,
+                     case_sensitive: bool = False, max_results: int = 20, context: int = 1) -> str:
+    """search_workspace 工具入口：返回格式化的检索结果文本。"""
+    cfg = _cfg()
+    target, root, prefix = resolve_root(path)
+    if not os.path.isdir(target):
+        return f'目录不存在: {target}'
+    if regex:
+        try:
+            re.compile(query)
+        except re.error as e:
+            return f'正则表达式无效: {e}'
+
+    idx = get_index(root)
+    if not idx.ready.is_set():
+        idx.ready.wait(timeout=float(cfg.get('wait', 10)))
+    elif not idx.building and time.time() - idx.last_refresh > REFRESH_INTERVAL:
+        # 工具之外（终端命令、编辑器等）修改的文件要刷新后才进入签名，过期时先增量刷新再检索；
+        # 超时未完成时照常检索，并在结果中注明可能不完整
+        idx.refresh_async().join(timeout=float(cfg.get('wait', 10)))
+
+    started = time.time()
+    results, total = idx.search(query, regex=regex, case_sensitive=case_sensitive,
+                                prefix=prefix, max_results=max_results, context=context)
+    elapsed_ms = (time.time() - started) * 1000
+
+    note = '' if idx.ready.is_set() and not idx.building else \
+        f'\n<提示: 索引仍在构建/刷新中（已索引 {len(idx.files)} 个文件），结果可能不完整>'
+    if not results:
+        return f'在 {target} 中未找到 {query!r}（{elapsed_ms:.0f} ms）。{note}'
+
+    shown = f'，显示前 {len(results)} 个' if total > len(results) else ''
+    lines = [f'在 {target} 中找到 {total} 个文件包含 {query!r}（{elapsed_ms:.0f} ms{shown}）:{note}']
+    for r in results:
+        lines.append(f'{os.path.join(root, r["path"])}  ({r["hits"]} 处)')
+        for snippet in r['snippets']:
+            for lineno, text, is_hit in snippet:
+                mark = ':' if is_hit else '-'
+                lines.append(f'  {lineno}{mark} {text[:200]}')
+            lines.append('  --')
+    log(f'workspace_index | search {query!r} in {target} → {total} files ({elapsed_ms:.0f} ms)')
+    return '\n'.join(lines)
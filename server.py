@@ -0,0 +1,276 @@
+"""
+server.py —— 多会话服务入口：在一个进程内同时承载多个对话，通过本地 HTTP 接口收发消息。
+
+每个会话（script/session.py 的 Session）拥有自己的 Bot、工作目录、环境变量、运行时配置
+与浏览器页面（独立的 BrowserContext）；进程内共享已导入的模块、OpenAI 客户端连接池、
+Chromium 进程、skill 索引与网页缓存，新会话无需重新启动或重新导入。
+同一会话的消息串行处理，不同会话的消息在各自的请求线程中并发处理。
+运行时配置只保存在会话内存中，不写回 working_config.json。
+
+接口（JSON）:
+    POST   /sessions                  {"cwd": 可选, "env": 可选}          → {"id", ...}
+    GET    /sessions                                                    → [{"id", ...}]
+    GET    /sessions/<id>                                               → {"id", ...}
+    POST   /sessions/<id>/messages    {"message", "answers": 可选, "max_turns": 可选}
+                                      → {"reply", "finished", "input_tokens", "output_tokens", "rounds", "elapsed"}
+    DELETE /sessions/<id>             结束会话，终止其后台任务并释放其浏览器页面
+
+ask_user 由请求中的 answers 依次回答，用完后使用默认回复（同 batch.py 的 --ask-policy）。
+超过 server_idle_timeout 秒（默认 3600，0 表示不回收）未收到消息的会话会被自动结束。
+
+服务只监听本机地址，不做鉴权，请勿暴露到公网。为防止网页通过 DNS 重绑定或跨站请求访问本服务：
+    - Host 请求头必须是 127.0.0.1 / localhost / [::1]（或 --host 指定的地址）加监听端口，否则返回 403；
+    - POST 请求必须声明 Content-Type: application/json，否则返回 415。
+
+用法:
+    python server.py [--host 127.0.0.1] [--port 8765]
+"""
+
+import argparse
+import json
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from config import get_config, init_working_config, new_working_config
+from script.logger import log
+import script.bot as bot
+from script.agent import AskPolicy, DEFAULT_ASK_POLICY, run_turn
+from script.prompt_builder import build_system_prompt, build_skill_hint
+from script.session import Session, use_session
+
+DEFAULT_PORT = 8765
+DEFAULT_IDLE_TIMEOUT = 3600
+_LOOPBACK_HOSTS = ('127.0.0.1', 'localhost', '[::1]')
+
+_sessions: dict[str, Session] = {}
+_sessions_lock = threading.Lock()
+
+_SESSION_PATH = re.compile(r'^/sessions/([0-9a-zA-Z_-]+)(/messages)?/?$')
+
+
+class _HttpError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def create_session(cwd: str | None = None, env: dict | None = None) -> Session:
+    session = Session(new_working_config(cwd), env=env)
+    with use_session(session):
+        session.bot = bot.Bot(bot_name=f'Momoka[{session.id}]')
+        session.bot.set_system(build_system_prompt())
+    with _sessions_lock:
+        _sessions[session.id] = session
+    log(f'server | 新建会话 {session.id}: {session.working["where"]}')
+    return session
+
+
+def get_session(session_id: str) -> Session:
+    with _sessions_lock:
+        session = _sessions.get(session_id)
+    if session is None:
+        raise _HttpError(404, f'会话不存在: {session_id}')
+    return session
+
+
+def close_session(session_id: str):
+    with _sessions_lock:
+        session = _sessions.pop(session_id, None)
+    if session is None:
+        raise _HttpError(404, f'会话不存在: {session_id}')
+    with session.lock, use_session(session):
+        if session.jobs is not None:
+            from script.jobs import release_jobs
+            release_jobs()
+        if session.kernel is not None:
+            from script.kernel import release_kernel
+            release_kernel()
+        if session.checkpoints is not None:
+            from script.checkpoint import release_checkpoints
+            release_checkpoints()
+        if session.browser is not None:
+            from script.browser import browser_release
+            browser_release()
+    log(f'server | 结束会话 {session_id}')
+
+
+def send_message(session: Session, message: str, answers: list[str] | None = None,
+                 max_turns: int = 0) -> dict:
+    """在会话中处理一条用户消息，直到 finish 或 Bot 以纯文本交还控制权。"""
+    if not session.lock.acquire(blocking=False):
+        raise _HttpError(409, f'会话 {session.id} 正在处理上一条消息')
+    started = time.time()
+    try:
+        with use_session(session):
+            log(f'user: {message}')
+            turn = run_turn(session.bot, message, hint=build_skill_hint(message),
+                            input_func=AskPolicy(answers, DEFAULT_ASK_POLICY), max_turns=max_turns)
+            if turn['finished']:
+                session.bot.clear_skills()
+    finally:
+        session.last_used = time.time()
+        session.lock.release()
+    session.input_tokens += turn['input_tokens']
+    session.output_tokens += turn['output_tokens']
+    session.rounds += turn['rounds']
+    return {
+        'reply': turn['reply'], 'finished': turn['finished'],
+        'input_tokens': turn['input_tokens'], 'output_tokens': turn['output_tokens'],
+        'rounds': turn['rounds'], 'elapsed': round(time.time() - started, 3),
+    }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, fmt, *args):
+        log('server | ' + fmt % args)
+
+    def _reply(self, status: int, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _body(self) -> dict:
+        length = int(self.headers.get('Content-Length') or 0)
+        if not length:
+            return {}
+        try:
+            data = json.loads(self.rfile.read(length).decode('utf-8'))
+        except (UnicodeDecodeError, json.JSONDecodeError) as e:
+            raise _HttpError(400, f'请求体不是合法的 JSON: {e}')
+        if not isinstance(data, dict):
+            raise _HttpError(400, '请求体必须是 JSON 对象')
+        return data
+
+    def _check_origin(self, method: str):
+        """拒绝 Host 不是本服务地址的请求（DNS 重绑定）与非 JSON 的 POST（跨站表单）。"""
+        host = (self.headers.get('Host') or '').strip().lower()
+        if host not in self.server.allowed_hosts:
+            raise _HttpError(403, f'不允许的 Host: {host or "(空)"}')
+        if method == 'POST':
+            content_type = (self.headers.get('Content-Type') or '').split(';', 1)[0].strip().lower()
+            if content_type != 'application/json':
+                raise _HttpError(415, 'POST 请求必须使用 Content-Type: application/json')
+
+    def _dispatch(self, method: str):
+        try:
+            self._check_origin(method)
+            self._reply(200, self._route(method))
+        except _HttpError as e:
+            self._reply(e.status, {'error': str(e)})
+        except Exception as e:
+            log(f'server | {method} {self.path} 出错: {type(e).__name__}: {e}')
+            self._reply(500, {'error': f'{type(e).__name__}: {e}'})
+
+    def _route(self, method: str):
+        path = self.path.split('?', 1)[0]
+        if path.rstrip('/') == '/sessions':
+            if method == 'GET':
+                with _sessions_lock:
+                    return [s.info() for s in _sessions.values()]
+            if method == 'POST':
+                body = self._body()
+                return create_session(body.get('cwd'), body.get('env')).info()
+            raise _HttpError(405, f'不支持的方法: {method}')
+
+        m = _SESSION_PATH.match(path)
+        if m is None:
+            raise _HttpError(404, f'未知路径: {path}')
+        session_id, messages = m.groups()
+        if messages:
+            if method != 'POST':
+                raise _HttpError(405, f'不支持的方法: {method}')
+            body = self._body()
+            if not isinstance(body.get('message'), str) or not body['message'].strip():
+                raise _HttpError(400, '缺少 message')
+            return send_message(get_session(session_id), body['message'],
+                                body.get('answers'), int(body.get('max_turns', 0)))
+        if method == 'GET':
+            return get_session(session_id).info()
+        if method == 'DELETE':
+            close_session(session_id)
+            return {'id': session_id, 'closed': True}
+        raise _HttpError(405, f'不支持的方法: {method}')
+
+    def do_GET(self):
+        self._dispatch('GET')
+
+    def do_POST(self):
+        self._dispatch('POST')
+
+    def do_DELETE(self):
+        self._dispatch('DELETE')
+
+
+def _allowed_hosts(host: str, port: int) -> set[str]:
+    hosts = set(_LOOPBACK_HOSTS)
+    if host not in ('', '0.0.0.0', '::'):
+        hosts.add(f'[{host}]' if ':' in host else host)
+    return {f'{h.lower()}:{port}' for h in hosts}
+
+
+def _reap_idle_sessions(timeout: float, stop: threading.Event):
+    """定期结束超过 timeout 秒未收到消息的会话，释放其后台任务、Python 工作进程与浏览器页面。"""
+    while not stop.wait(min(60.0, timeout)):
+        now = time.time()
+        with _sessions_lock:
+            idle = [s.id for s in _sessions.values() if not s.lock.locked() and now - s.last_used > timeout]
+        for session_id in idle:
+            log(f'server | 会话 {session_id} 空闲超过 {timeout:g} 秒，自动结束')
+            try:
+                close_session(session_id)
+            except _HttpError:
+                pass
+            except Exception as e:
+                log(f'server | 结束空闲会话 {session_id} 出错: {type(e).__name__}: {e}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Momoka 多会话服务')
+    parser.add_argument('--host', default='127.0.0.1', help='监听地址（默认 127.0.0.1）')
+    parser.add_argument('--port', type=int, help=f'监听端口（默认 config.json 的 server_port 或 {DEFAULT_PORT}）')
+    args = parser.parse_args()
+
+    init_working_config(persist=False)
+    bot.Spinner._enabled = False
+    port = args.port or get_config().get('server_port', DEFAULT_PORT)
+    server = ThreadingHTTPServer((args.host, port), _Handler)
+    server.daemon_threads = True
+    server.allowed_hosts = _allowed_hosts(args.host, port)
+    stop = threading.Event()
+    idle_timeout = float(get_config().get('server_idle_timeout', DEFAULT_IDLE_TIMEOUT) or 0)
+    if idle_timeout > 0:
+        threading.Thread(target=_reap_idle_sessions, args=(idle_timeout, stop),
+                         name='server-reaper', daemon=True).start()
+    print(f'Momoka 服务已启动: http://{args.host}:{port}（Ctrl+C 退出）')
+    log(f'server | start {args.host}:{port}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        server.server_close()
+        with _sessions_lock:
+            sessions = list(_sessions.values())
+        for session in sessions:
+            if session.jobs is not None:
+                session.jobs.shutdown()
+            if session.kernel is not None:
+                session.kernel.shutdown()
+            if session.checkpoints is not None:
+                session.checkpoints.clear()
+        if 'script.browser' in sys.modules:
+            sys.modules['script.browser'].browser_shutdown()
+        log('server | end')
+
+
+if __name__ == '__main__':
+    main()
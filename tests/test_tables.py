@@ -0,0 +1,33 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from script.tables import normalize  # noqa: E402
+
+
+def _table(grid, head_rows=1):
+    return normalize({'grid': grid, 'headRows': head_rows})
+
+
+def test_leading_zero_codes_stay_text():
+    table = _table([
+        ['代码', '名称', '收盘价'],
+        ['000001', '平安银行', '11.52'],
+        ['002594', '比亚迪', '245.10'],
+        ['600519', '贵州茅台', '1,688.00'],
+    ])
+    assert table['numeric'] == ['收盘价']
+    assert [r[0] for r in table['rows']] == ['000001', '002594', '600519']
+    assert [r[2] for r in table['rows']] == [11.52, 245.1, 1688.0]
+
+
+def test_zero_and_decimal_fractions_are_numeric():
+    table = _table([
+        ['名称', '权重'],
+        ['a', '0'],
+        ['b', '0.25'],
+        ['c', '10'],
+    ])
+    assert table['numeric'] == ['权重']
+    assert [r[1] for r in table['rows']] == [0, 0.25, 10]